@@ -1,10 +1,52 @@
 from dash import Dash, dcc, html, Input, Output, State, ctx, no_update
+import logging
 import time
+import flask
 import plotly.graph_objs as go
-from data import cached_get_stock_data, get_pe_ratio, get_beta, load_tickers, save_tickers, load_preferences, save_preferences, normalize_ticker, get_company_name, add_ticker_to_list, delete_ticker_from_list, search_tickers, get_ticker_info
-from plotting import plot_trends, plot_bollinger_bands, plot_macd, plot_breakout
+from data import cache_stats, ticker_registry, load_tickers, load_preferences, save_preferences, normalize_ticker, get_company_name, add_ticker_to_list, delete_ticker_from_list, search_tickers, get_ticker_info
+from plotting import SIGNAL_AXIS, line_trace, use_webgl, plot_trends, plot_bollinger_bands, plot_macd, plot_breakout, plot_signal_overlay
+from downsample import BAR_PIXELS, ohlc_buckets, points_for_width
 import numpy as np
 import pandas as pd
+from logger import get_logger
+from metrics import registry, render_prometheus, timed
+from payload import compact_figure, compress_response
+from viewmodel import VIEW_TTL, figures, views, prepare_view, get_view, view_reference, close_line, volume_bars
+
+log = get_logger(__name__)
+
+GRAPH_IDS = ('stock-graph', 'volume-graph', 'macd-graph')
+
+# Tema og legend lægges på en færdig figur. Samme farver i Python (ny figur fra serveren)
+# og JavaScript (skift i browseren uden server-kald).
+def figure_style(theme, legend_toggle):
+    light = theme == 'light'
+    return {
+        'paper_bgcolor': 'white' if light else 'rgb(30,30,30)',
+        'plot_bgcolor': 'white' if light else 'rgb(30,30,30)',
+        'font': {'color': 'black' if light else 'white'},
+        'showlegend': 'show_legends' in (legend_toggle or []),
+    }
+
+def styled_figure(figure, theme, legend_toggle):
+    """Den cachede figur med tema/legend; layoutet kopieres fladt, så cachen ikke ændres."""
+    return {'data': figure['data'], 'layout': dict(figure['layout'], **figure_style(theme, legend_toggle))}
+
+style_figure_js = """
+function(theme, legendToggle, figure) {
+    if (!figure || !figure.layout) {
+        return window.dash_clientside.no_update;
+    }
+    var light = theme === 'light';
+    var layout = Object.assign({}, figure.layout, {
+        paper_bgcolor: light ? 'white' : 'rgb(30,30,30)',
+        plot_bgcolor: light ? 'white' : 'rgb(30,30,30)',
+        font: {color: light ? 'black' : 'white'},
+        showlegend: (legendToggle || []).indexOf('show_legends') >= 0
+    });
+    return Object.assign({}, figure, {layout: layout});
+}
+"""
 
 def create_app():
     app = Dash(__name__)
@@ -14,12 +56,15 @@ def create_app():
     valid_trend_days = [5, 10, 20, 50, 100, 200]
     tickers = load_tickers()
 
-    print(f"Debug: Præferencer ved opstart: {preferences}")
+    log.debug("Præferencer ved opstart: %s", preferences)
 
     app.layout = html.Div([
         html.H1("Stock Analysis"),
         dcc.Store(id='theme-store'),
         dcc.Store(id='init-store', data={'load': True}),  # Trigger til sideload
+        dcc.Store(id='dataset-store'),  # Reference til det forberedte view (data ligger på serveren)
+        dcc.Store(id='viewport-store'),  # Vinduesbredde i pixels; bestemmer hvor mange punkter graferne får
+        dcc.Store(id='legend-store', storage_type='local'),  # Legend-valget i browserens localStorage
         html.Script('''
             function updateTheme() {
                 var theme = window.matchMedia('(prefers-color-scheme: dark)').matches ? 'dark' : 'light';
@@ -144,46 +189,107 @@ def create_app():
         html.Div([dcc.Graph(id='macd-graph', config={'responsive': True}, style={'width': '100%', 'min-height': '400px'})], style={'width': '100%'})
     ])
 
+    # Bredden måles i browseren ved sideload; uden den bruges downsample.DEFAULT_POINTS
+    app.clientside_callback(
+        "function(_) { return window.innerWidth; }",
+        Output('viewport-store', 'data'),
+        Input('init-store', 'data')
+    )
+
+    # Tema- og legend-skift tegner ikke figurerne igen på serveren, men retter layoutet i browseren
+    for graph_id in GRAPH_IDS:
+        app.clientside_callback(
+            style_figure_js,
+            Output(graph_id, 'figure', allow_duplicate=True),
+            Input('theme-store', 'data'),
+            Input('legend-checkbox', 'value'),
+            State(graph_id, 'figure'),
+            prevent_initial_call=True
+        )
+
+    # Et legend-klik gemmes kun i browseren (intet server-kald); user_preferences.json får
+    # valget med ved næste præference-skrivning i update_graph
+    app.clientside_callback(
+        "function(legendToggle) { return (legendToggle || []).indexOf('show_legends') >= 0; }",
+        Output('legend-store', 'data'),
+        Input('legend-checkbox', 'value'),
+        prevent_initial_call=True
+    )
+
+    # Ved sideload vinder browserens gemte valg over præferencefilen
+    app.clientside_callback(
+        """
+        function(_, showLegends) {
+            if (showLegends === null || showLegends === undefined) {
+                return window.dash_clientside.no_update;
+            }
+            return showLegends ? ['show_legends'] : [];
+        }
+        """,
+        Output('legend-checkbox', 'value'),
+        Input('init-store', 'data'),
+        State('legend-store', 'data')
+    )
+
     @app.callback(
         Output('ticker-dropdown', 'value'),
         Input('init-store', 'data'),
         prevent_initial_call=False
     )
+    @timed("callback.initialize_ticker")
     def initialize_ticker(data):
         preferences = load_preferences()
         tickers = load_tickers()
         last_ticker = preferences.get("last_ticker")
         if not last_ticker or last_ticker not in tickers:
             last_ticker = next(iter(tickers), "TSLA")
-            print(f"Debug: last_ticker fra præferencer ugyldig eller mangler ({preferences.get('last_ticker')}). Bruger fallback: {last_ticker}")
+            log.debug("last_ticker fra præferencer ugyldig eller mangler (%s). Bruger fallback: %s", preferences.get('last_ticker'), last_ticker)
         else:
-            print(f"Debug: Hentet last_ticker fra præferencer ved sideload: {last_ticker}")
+            log.debug("Hentet last_ticker fra præferencer ved sideload: %s", last_ticker)
 
         if last_ticker not in tickers:
-            print(f"Debug: last_ticker {last_ticker} ikke i tickers. Tilføjer til tickers.json.")
-            company_name = get_company_name(last_ticker)
-            tickers[last_ticker] = company_name
-            save_tickers(tickers)
+            log.debug("last_ticker %s ikke i tickers. Tilføjer til tickers.json.", last_ticker)
+            ticker_registry.add(last_ticker, get_company_name(last_ticker))
 
-        print(f"Debug: Initialiserer ticker-dropdown med last_ticker: {last_ticker}")
+        log.debug("Initialiserer ticker-dropdown med last_ticker: %s", last_ticker)
         return last_ticker
 
     @app.callback(
-        Output('stock-graph', 'figure'),
+        Output('dataset-store', 'data'),
         [
             Input('ticker-dropdown', 'value'),
-            Input('timespan-dropdown', 'value'),
+            Input('timespan-dropdown', 'value')
+        ]
+    )
+    @timed("callback.prepare_dataset")
+    def prepare_dataset(ticker, timespan):
+        # Én dataforberedelse pr. ticker/timespan; de tre grafer læser samme view via referencen
+        log.debug("prepare_dataset kaldt med ticker: %s, timespan: %s", ticker, timespan)
+        if not ticker:
+            return None
+        return view_reference(prepare_view(ticker, timespan))
+
+    @app.callback(
+        Output('stock-graph', 'figure'),
+        [
+            Input('dataset-store', 'data'),
             Input('trend-checkbox', 'value'),
             Input('bollinger-checkbox', 'value'),
-            Input('legend-checkbox', 'value'),
-            Input('candlestick-checkbox', 'value'),
-            Input('theme-store', 'data')
+            Input('candlestick-checkbox', 'value')
+        ],
+        # Tema og legend skiftes i browseren (se style_figure_js); her bruges de kun ved ny figur
+        [
+            State('legend-checkbox', 'value'),
+            State('theme-store', 'data'),
+            State('viewport-store', 'data')
         ]
     )
-    def update_graph(ticker, timespan, trend_days_list, bollinger_option, legend_toggle, candlestick_option, theme):
-        print(f"Debug: update_graph kaldt med ticker: {ticker}, timespan: {timespan}, trend_days: {trend_days_list}, tema: {theme}")
-        if not ticker:
-            print("Debug: Ingen ticker valgt i update_graph. Returnerer tom graf.")
+    @timed("callback.update_graph")
+    def update_graph(dataset, trend_days_list, bollinger_option, candlestick_option, legend_toggle, theme, width):
+        view = get_view(dataset)
+        log.debug("update_graph kaldt med dataset: %s, trend_days: %s, tema: %s", dataset, trend_days_list, theme)
+        if view is None:
+            log.debug("Ingen ticker valgt i update_graph. Returnerer tom graf.")
             return {
                 'data': [],
                 'layout': go.Layout(title='No Ticker Selected')
@@ -194,480 +300,302 @@ def create_app():
         trend_days_list = [int(day) for day in trend_days_list if str(day).isdigit() and int(day) in valid_trend_days]
         if not trend_days_list:
             trend_days_list = valid_trend_days
-            print(f"Debug: trend_days_list tom eller ugyldig. Bruger standard: {trend_days_list}")
+            log.debug("trend_days_list tom eller ugyldig. Bruger standard: %s", trend_days_list)
 
         # Opdater præferencer
         preferences = load_preferences()
+        # Øvrige nøgler (webgl, use_breakout ...) beholdes, så de kan sættes i user_preferences.json
         updated_preferences = {
+            **preferences,
             "trend_days": trend_days_list,
             "bollinger": 'bollinger' in bollinger_option,
-            "timespan": timespan,
+            "timespan": view.timespan,
             "show_legends": 'show_legends' in legend_toggle,
             "candlestick": 'candlestick' in candlestick_option,
-            "last_ticker": normalize_ticker(ticker),
+            "last_ticker": view.ticker,
             "language": preferences.get("language", "en")
         }
-        print(f"Debug: Opdaterer præferencer i update_graph for ticker {ticker}: {updated_preferences}")
+        log.debug("Opdaterer præferencer i update_graph for ticker %s: %s", view.ticker, updated_preferences)
         save_preferences(updated_preferences)
 
-        data, ticker_long = cached_get_stock_data(ticker, timespan)
+        data, ticker_long = view.data, view.ticker_long
 
-        if data.empty or 'Close' not in data:
-            print(f"Debug: Kunne ikke hente eller behandle data for {ticker_long} i update_graph.")
+        if view.empty:
+            log.warning("Kunne ikke hente eller behandle data for %s i update_graph.", ticker_long)
             return {
                 'data': [],
                 'layout': go.Layout(title=f'Kunne ikke hente data for {ticker_long}')
             }
 
-        traces = []
-
-        if 'candlestick' in candlestick_option:
-            traces.append(go.Candlestick(
-                x=data.index,
-                open=data['Open'],
-                high=data['High'],
-                low=data['Low'],
-                close=data['Close'],
-                name=f'{ticker_long} Close'
-            ))
-        else:
-            initial_price = data['Close'].iloc[0]
-            data['percent_change'] = ((data['Close'] - initial_price) / initial_price) * 100
-            traces.append(go.Scatter(
-                x=data.index,
-                y=data['Close'],
-                mode='lines',
-                name=f'{ticker_long} Close',
-                text=data['percent_change'].apply(lambda x: f'{x:.2f}%'),
-                hoverinfo='text+x+y'
-            ))
-
-        trends = plot_trends(data, trend_days_list)
-        traces.extend(trends)
-
-        if 'bollinger' in bollinger_option:
-            upper_band, lower_band = plot_bollinger_bands(data)
-            traces.extend([upper_band, lower_band])
-
+        # Figuren afhænger kun af data og indikator-valg; tema og legend lægges på bagefter
+        # Lange perioder nedsamples til omtrent ét punkt pr. pixel; markører tegnes altid fuldt
         use_breakout = preferences.get('use_breakout', False)
-        if use_breakout:
-            breakout_trace, breakout_annotations, has_breakout = plot_breakout(data)
-            traces.append(breakout_trace)
-        else:
-            has_breakout = False
-            breakout_annotations = []
-
-        # Tilføj handels-signaler (køb/sælg) som markører på grafen
-        try:
-            if 'signal' in data:
-                sig = data['signal']
-                # find steder hvor signal ændrer sig
-                changes = sig[sig != sig.shift(1)]
-                buys = changes[changes == 1]
-                cautious_buys = changes[changes == 2]
-                cautious_sells = changes[changes == -2]
-                sells = changes[changes == -1]
-
-                shapes = []
-                extra_annotations = []
-
-                if not buys.empty:
-                    buy_trace = go.Scatter(
-                        x=buys.index,
-                        y=data.loc[buys.index, 'Close'],
-                        mode='markers',
-                        name='Buy Signal',
-                        marker=dict(symbol='triangle-up', size=12, color='green'),
-                        hovertemplate='Buy<br>Date: %{x}<br>Price: %{y:,.2f}<extra></extra>'
-                    )
-                    traces.append(buy_trace)
-
-                    # Add vertical lines and arrow annotation for buys
-                    for d in buys.index:
-                        shapes.append({
-                            'type': 'line',
-                            'xref': 'x', 'x0': d, 'x1': d,
-                            'yref': 'paper', 'y0': 0, 'y1': 1,
-                            'line': {'color': 'green', 'width': 2, 'dash': 'dot'}
-                        })
-                        extra_annotations.append({
-                            'x': d, 'xref': 'x', 'y': 0.98, 'yref': 'paper',
-                            'text': '▲', 'showarrow': False,
-                            'font': {'size': 14, 'color': 'green'}
-                        })
-
-                if not cautious_buys.empty:
-                    cautious_buy_trace = go.Scatter(
-                        x=cautious_buys.index,
-                        y=data.loc[cautious_buys.index, 'Close'],
-                        mode='markers',
-                        name='Cautious Buy',
-                        marker=dict(symbol='triangle-up', size=10, color='orange'),
-                        hovertemplate='Cautious Buy<br>Date: %{x}<br>Price: %{y:,.2f}<extra></extra>'
-                    )
-                    traces.append(cautious_buy_trace)
-
-                    # Add vertical lines and arrow annotation for cautious buys
-                    for d in cautious_buys.index:
-                        shapes.append({
-                            'type': 'line',
-                            'xref': 'x', 'x0': d, 'x1': d,
-                            'yref': 'paper', 'y0': 0, 'y1': 1,
-                            'line': {'color': 'orange', 'width': 1, 'dash': 'dot'}
-                        })
-                        extra_annotations.append({
-                            'x': d, 'xref': 'x', 'y': 0.95, 'yref': 'paper',
-                            'text': '▲', 'showarrow': False,
-                            'font': {'size': 12, 'color': 'orange'}
-                        })
-
-                if not cautious_sells.empty:
-                    cautious_sell_trace = go.Scatter(
-                        x=cautious_sells.index,
-                        y=data.loc[cautious_sells.index, 'Close'],
-                        mode='markers',
-                        name='Cautious Sell',
-                        marker=dict(symbol='triangle-down', size=10, color='darkorange'),
-                        hovertemplate='Cautious Sell<br>Date: %{x}<br>Price: %{y:,.2f}<extra></extra>'
-                    )
-                    traces.append(cautious_sell_trace)
-
-                    # Add vertical lines and arrow annotation for cautious sells
-                    for d in cautious_sells.index:
-                        shapes.append({
-                            'type': 'line',
-                            'xref': 'x', 'x0': d, 'x1': d,
-                            'yref': 'paper', 'y0': 0, 'y1': 1,
-                            'line': {'color': 'darkorange', 'width': 1, 'dash': 'dot'}
-                        })
-                        extra_annotations.append({
-                            'x': d, 'xref': 'x', 'y': 0.05, 'yref': 'paper',
-                            'text': '▼', 'showarrow': False,
-                            'font': {'size': 12, 'color': 'darkorange'}
-                        })
-
-                if not sells.empty:
-                    sell_trace = go.Scatter(
-                        x=sells.index,
-                        y=data.loc[sells.index, 'Close'],
-                        mode='markers',
-                        name='Sell Signal',
-                        marker=dict(symbol='triangle-down', size=12, color='red'),
-                        hovertemplate='Sell<br>Date: %{x}<br>Price: %{y:,.2f}<extra></extra>'
-                    )
-                    traces.append(sell_trace)
-
-                    # Add vertical lines and arrow annotation for sells
-                    for d in sells.index:
-                        shapes.append({
-                            'type': 'line',
-                            'xref': 'x', 'x0': d, 'x1': d,
-                            'yref': 'paper', 'y0': 0, 'y1': 1,
-                            'line': {'color': 'red', 'width': 2, 'dash': 'dot'}
-                        })
-                        extra_annotations.append({
-                            'x': d, 'xref': 'x', 'y': 0.02, 'yref': 'paper',
-                            'text': '▼', 'showarrow': False,
-                            'font': {'size': 14, 'color': 'red'}
-                        })
-
-                # Merge shapes/annotations into breakout_annotations (used in layout)
-                try:
-                    if isinstance(breakout_annotations, list):
-                        breakout_annotations.extend(extra_annotations)
-                    else:
-                        breakout_annotations = extra_annotations
-                except Exception:
-                    breakout_annotations = extra_annotations
-
-                # Save shapes to data for later inclusion in layout
-                data['_signal_shapes'] = shapes
-
-                # Print besked ved ny ændring i sidste række
-                try:
-                    last_row = data.iloc[-1]
-                    prev_row = data.iloc[-2]
-                    if int(last_row['signal']) == 1 and int(prev_row['signal']) != 1:
-                        print(f"🚀 NYT KØB: Trenden er nu i Perfect Order for {ticker_long}!")
-                    elif int(last_row['signal']) == 2 and int(prev_row['signal']) != 2:
-                        print(f"⚠️ NYT FORSIGTIGT KØB: Pris over SMA50 for {ticker_long}.")
-                    elif int(last_row['signal']) == -2 and int(prev_row['signal']) != -2:
-                        print(f"⚠️ NYT FORSIGTIGT SALG: Pris under SMA 5/10 for {ticker_long}.")
-                    elif int(last_row['signal']) == -1 and int(prev_row['signal']) != -1:
-                        print(f"⚠️ SÆLG/ADVARSEL: Trenden er brudt for {ticker_long}.")
-                except Exception:
-                    pass
-        except Exception as e:
-            print(f"Debug: Fejl ved tilføjelse af trade-signaler til grafen: {e}")
-
-        pe_ratio = get_pe_ratio(ticker)
-        beta = get_beta(ticker)
-
-        title = f'{ticker_long} Stock Analysis'
-        if has_breakout:
-            title += ' | Breakout Detected'
-        if pe_ratio:
-            title += f' | PE: {pe_ratio:.2f}'
-        if beta is not None:
-            title += f' | Beta: {beta:.2f}'
-
-        x_range = [data.index.min(), data.index.max()]
-        bg_color = 'white' if theme == 'light' else 'rgb(30,30,30)'
-        font_color = 'black' if theme == 'light' else 'white'
-
-        figure = {
-            'data': traces,
-            'layout': go.Layout(
-                title=title,
-                xaxis={
-                    'rangeslider': {'visible': False},
-                    'showgrid': True,
-                    'fixedrange': True,
-                    'range': x_range
-                },
-                yaxis={'title': 'Price'},
-                showlegend='show_legends' in legend_toggle,
-                legend=dict(
-                    orientation='v',
-                    yanchor='top',
-                    y=1,
-                    xanchor='left',
-                    x=0,
-                    bgcolor='rgba(255,255,255,0.5)'
-                ),
-                annotations=breakout_annotations,
-                shapes=(data.pop('_signal_shapes') if '_signal_shapes' in data else []),
-                paper_bgcolor=bg_color,
-                plot_bgcolor=bg_color,
-                font=dict(color=font_color),
-                margin=dict(l=60, r=40, t=40, b=40),
-                autosize=True
-            )
-        }
+        max_points = points_for_width(width)
+        webgl = use_webgl(min(len(data), max_points), preferences.get('webgl', 'auto'))
+        figure_key = (view.key, 'stock', tuple(trend_days_list), 'bollinger' in bollinger_option,
+                      'candlestick' in candlestick_option, use_breakout, max_points, webgl)
+        figure = figures.get(figure_key, None)
+        if figure is None:
+            traces = []
+
+            if 'candlestick' in candlestick_option:
+                candles = ohlc_buckets(data, points_for_width(width, BAR_PIXELS))
+                traces.append(go.Candlestick(
+                    x=candles.index,
+                    open=candles['Open'],
+                    high=candles['High'],
+                    low=candles['Low'],
+                    close=candles['Close'],
+                    name=f'{ticker_long} Close'
+                ))
+            else:
+                x, close, percent_text = close_line(view, max_points)
+                traces.append(line_trace(
+                    webgl,
+                    x=x,
+                    y=close,
+                    mode='lines',
+                    name=f'{ticker_long} Close',
+                    text=percent_text,
+                    hoverinfo='text+x+y'
+                ))
+
+            trends = plot_trends(data, trend_days_list, max_points, webgl)
+            traces.extend(trends)
+
+            if 'bollinger' in bollinger_option:
+                upper_band, lower_band = plot_bollinger_bands(data, max_points, webgl)
+                traces.extend([upper_band, lower_band])
+
+            if use_breakout:
+                breakout_trace, breakout_annotations, has_breakout = plot_breakout(data)
+                traces.append(breakout_trace)
+            else:
+                has_breakout = False
+                breakout_annotations = []
+
+            # Handels-signaler (køb/sælg) som markører plus lodrette linjer og pile
+            # som få samlede traces; skift er forberedt i viewet
+            traces.extend(plot_signal_overlay(view.signal_lines, view.signal_arrows))
+            for (code, name, label, symbol, size, color, *_), dates, prices in view.signals:
+                traces.append(go.Scatter(
+                    x=dates,
+                    y=prices,
+                    mode='markers',
+                    name=name,
+                    marker=dict(symbol=symbol, size=size, color=color),
+                    hovertemplate=f'{label}<br>Date: %{{x}}<br>Price: %{{y:,.2f}}<extra></extra>'
+                ))
+
+            title = f'{ticker_long} Stock Analysis'
+            if has_breakout:
+                title += ' | Breakout Detected'
+            if view.pe_ratio:
+                title += f' | PE: {view.pe_ratio:.2f}'
+            if view.beta is not None:
+                title += f' | Beta: {view.beta:.2f}'
+
+            figure = {
+                'data': traces,
+                'layout': go.Layout(
+                    title=title,
+                    xaxis={
+                        'rangeslider': {'visible': False},
+                        'showgrid': True,
+                        'fixedrange': True,
+                        'range': view.x_range
+                    },
+                    yaxis={'title': 'Price'},
+                    yaxis2=SIGNAL_AXIS,
+                    legend=dict(
+                        orientation='v',
+                        yanchor='top',
+                        y=1,
+                        xanchor='left',
+                        x=0,
+                        bgcolor='rgba(255,255,255,0.5)'
+                    ),
+                    annotations=breakout_annotations,
+                    margin=dict(l=60, r=40, t=40, b=40),
+                    autosize=True
+                ).to_plotly_json()
+            }
 
-        print(f"Debug: Stock-graf genereret succesfuldt for {ticker_long}, autosize=True, tema: {theme}")
-        return figure
+            figure = compact_figure(figure)
+            figures.set(figure_key, figure, VIEW_TTL)
+        log.debug("Stock-graf genereret succesfuldt for %s, autosize=True, tema: %s", ticker_long, theme)
+        return styled_figure(figure, theme, legend_toggle)
 
     @app.callback(
         Output('macd-graph', 'figure'),
         [
-            Input('ticker-dropdown', 'value'),
-            Input('timespan-dropdown', 'value'),
-            Input('legend-checkbox', 'value'),
-            Input('theme-store', 'data')
+            Input('dataset-store', 'data')
+        ],
+        [
+            State('legend-checkbox', 'value'),
+            State('theme-store', 'data'),
+            State('viewport-store', 'data')
         ]
     )
-    def update_macd_graph(ticker, timespan, legend_toggle, theme):
-        print(f"Debug: update_macd_graph kaldt med ticker: {ticker}, timespan: {timespan}, tema: {theme}")
-        if not ticker:
-            print("Debug: Ingen ticker valgt i update_macd_graph. Returnerer tom graf.")
+    @timed("callback.update_macd_graph")
+    def update_macd_graph(dataset, legend_toggle, theme, width):
+        view = get_view(dataset)
+        log.debug("update_macd_graph kaldt med dataset: %s, tema: %s", dataset, theme)
+        if view is None:
+            log.debug("Ingen ticker valgt i update_macd_graph. Returnerer tom graf.")
             return {'data': [], 'layout': go.Layout(title='No Ticker Selected for MACD')}
 
-        data, ticker_long = cached_get_stock_data(ticker, timespan)
+        data, ticker_long = view.data, view.ticker_long
 
-        if data.empty or 'Close' not in data:
-            print(f"Debug: Kunne ikke hente eller behandle data for {ticker_long} i update_macd_graph.")
+        if view.empty:
+            log.warning("Kunne ikke hente eller behandle data for %s i update_macd_graph.", ticker_long)
             return {
                 'data': [],
                 'layout': go.Layout(title=f'Kunne ikke hente data for {ticker_long} MACD')
             }
 
-        try:
-            macd_traces = plot_macd(data)
-        except Exception as e:
-            print(f"Debug: Fejl ved generering af MACD-graf for {ticker_long}: {e}")
-            return {
-                'data': [],
-                'layout': go.Layout(title=f'Fejl ved generering af MACD-graf for {ticker_long}')
+        max_points = points_for_width(width)
+        webgl = use_webgl(min(len(data), max_points), load_preferences().get('webgl', 'auto'))
+        figure_key = (view.key, 'macd', max_points, webgl)
+        macd_figure = figures.get(figure_key, None)
+        if macd_figure is None:
+            try:
+                macd_traces = plot_macd(data, max_points, webgl)
+            except Exception as e:
+                log.warning("Fejl ved generering af MACD-graf for %s: %s", ticker_long, e)
+                return {
+                    'data': [],
+                    'layout': go.Layout(title=f'Fejl ved generering af MACD-graf for {ticker_long}')
+                }
+
+            macd_figure = {
+                'data': macd_traces,
+                'layout': go.Layout(
+                    title=f'{ticker_long} MACD',
+                    xaxis={
+                        'rangeslider': {'visible': False},
+                        'showgrid': True,
+                        'matches': 'x',
+                        'range': view.x_range
+                    },
+                    yaxis={'title': 'MACD'},
+                    legend=dict(
+                        x=0,
+                        y=1,
+                        xanchor='left',
+                        yanchor='top',
+                        bgcolor='rgba(255,255,255,0.5)'
+                    ),
+                    margin=dict(l=60, r=40, t=40, b=40),
+                    autosize=True
+                ).to_plotly_json()
             }
 
-        x_range = [data.index.min(), data.index.max()]
-        bg_color = 'white' if theme == 'light' else 'rgb(30,30,30)'
-        font_color = 'black' if theme == 'light' else 'white'
-
-        macd_figure = {
-            'data': macd_traces,
-            'layout': go.Layout(
-                title=f'{ticker_long} MACD',
-                xaxis={
-                    'rangeslider': {'visible': False},
-                    'showgrid': True,
-                    'matches': 'x',
-                    'range': x_range
-                },
-                yaxis={'title': 'MACD'},
-                showlegend='show_legends' in legend_toggle,
-                legend=dict(
-                    x=0,
-                    y=1,
-                    xanchor='left',
-                    yanchor='top',
-                    bgcolor='rgba(255,255,255,0.5)'
-                ),
-                paper_bgcolor=bg_color,
-                plot_bgcolor=bg_color,
-                font=dict(color=font_color),
-                margin=dict(l=60, r=40, t=40, b=40),
-                autosize=True
-            )
-        }
+            macd_figure = compact_figure(macd_figure)
+            figures.set(figure_key, macd_figure, VIEW_TTL)
 
-        print(f"Debug: MACD-graf genereret succesfuldt for {ticker_long}, autosize=True, tema: {theme}")
-        return macd_figure
+        log.debug("MACD-graf genereret succesfuldt for %s, autosize=True, tema: %s", ticker_long, theme)
+        return styled_figure(macd_figure, theme, legend_toggle)
 
     @app.callback(
         Output('volume-graph', 'figure'),
         [
-            Input('ticker-dropdown', 'value'),
-            Input('timespan-dropdown', 'value'),
-            Input('legend-checkbox', 'value'),
-            Input('theme-store', 'data')
+            Input('dataset-store', 'data')
+        ],
+        [
+            State('legend-checkbox', 'value'),
+            State('theme-store', 'data'),
+            State('viewport-store', 'data')
         ]
     )
-    def update_volume_graph(ticker, timespan, legend_toggle, theme):
-        print(f"Debug: update_volume_graph kaldt med ticker: {ticker}, timespan: {timespan}, tema: {theme}")
-        if not ticker:
-            print("Debug: Ingen ticker valgt i update_volume_graph. Returnerer tom graf.")
+    @timed("callback.update_volume_graph")
+    def update_volume_graph(dataset, legend_toggle, theme, width):
+        view = get_view(dataset)
+        log.debug("update_volume_graph kaldt med dataset: %s, tema: %s", dataset, theme)
+        if view is None:
+            log.debug("Ingen ticker valgt i update_volume_graph. Returnerer tom graf.")
             return {
                 'data': [],
                 'layout': go.Layout(title='No Ticker Selected for Volume')
             }
 
-        data, ticker_long = cached_get_stock_data(ticker, timespan)
-
-        if data.empty or 'Volume' not in data or 'Close' not in data:
-            print(f"Debug: Kunne ikke hente eller behandle data for {ticker_long} i update_volume_graph.")
+        ticker_long = view.ticker_long
+        if view.empty:
+            log.warning("Kunne ikke hente eller behandle data for %s i update_volume_graph.", ticker_long)
             return {
                 'data': [],
                 'layout': go.Layout(title=f'Kunne ikke hente data for {ticker_long} Volume')
             }
+        if view.volume is None:
+            return {
+                'data': [],
+                'layout': go.Layout(title=view.volume_error)
+            }
 
-        try:
-            # Valider volumen-data
-            volume_data = data['Volume'].dropna()
-            # Tillad nul-værdier i volumen (nogle tickers/intervals bruger 0 ved ingen aktivitet).
-            # Afvis kun, hvis der findes negative værdier eller datasættet er tomt.
-            if volume_data.empty or (volume_data < 0).any():
-                print(f"Debug: Ugyldige volumen-data for {ticker_long}: Tomt eller negative værdier")
-                return {
-                    'data': [],
-                    'layout': go.Layout(title=f'Ugyldige volumen-data for {ticker_long}')
-                }
-
-            # Tjek for NaN eller manglende værdier
-            if data['Volume'].isna().any() or data['Close'].isna().any():
-                print(f"Debug: NaN-værdier fundet i volumen- eller Close-data for {ticker_long}. Fjerner NaN.")
-                data = data.dropna(subset=['Volume', 'Close'])
-
-            # Sørg for, at vi har nok data
-            if len(data) < 1:
-                print(f"Debug: Utilstrækkelige data for {ticker_long}: Mindst 1 datapunkt kræves")
-                return {
-                    'data': [],
-                    'layout': go.Layout(title=f'Utilstrækkelige data for {ticker_long} Volume')
-                }
-
-            # Log data for at tjekke rækkevidde og værdier
-            mid_point = len(data) // 2
-            print(f"Debug: Volumen-data for {ticker_long}: Startdato={data.index.min()}, Slutdato={data.index.max()}, Længde={len(data)}")
-            print(f"Debug: Volumen-værdier: Min={data['Volume'].min()}, Max={data['Volume'].max()}")
-            print(f"Debug: Volumen-data før midtpunkt: {data['Volume'].iloc[:mid_point].tail(5).to_dict()}")
-            print(f"Debug: Volumen-data efter midtpunkt: {data['Volume'].iloc[mid_point:].head(5).to_dict()}")
-
-            # Beregn farver for alle datapunkter
-            volume_colors = ['green']  # Første punkt får standardfarve
-            for i in range(1, len(data)):
-                color = 'green' if data['Close'].iloc[i] > data['Close'].iloc[i-1] else 'red'
-                volume_colors.append(color)
-
-            # Tegn nul-volumen som en meget lille epsilon (usynlig effekt på skala),
-            # men behold original værdi i hover via `customdata`. Sæt lav opacity for nul.
-            original_vol = data['Volume'].copy()
-            max_vol = original_vol.max() if original_vol.max() > 0 else 1
-            eps = max(1, int(max_vol * 1e-6))
-            plot_vol = original_vol.copy()
-            plot_vol[plot_vol == 0] = eps
-
-            # Lav per-bar opacity: lavere for oprindelige 0-værdier
-            opacities = [0.35 if v == 0 else 1.0 for v in original_vol]
-
-            # Opret volumen-trace med alle datapunkter, brug customdata til hover
+        max_bars = points_for_width(width, BAR_PIXELS)
+        figure_key = (view.key, 'volume', max_bars)
+        volume_figure = figures.get(figure_key, None)
+        if volume_figure is None:
+            # Volumen er forberedt i viewet: summeret i spande for lange perioder, farver,
+            # epsilon for nul-volumen og opacity pr. bar
+            volume = volume_bars(view, max_bars)
             volume_trace = go.Bar(
-                x=data.index,
-                y=plot_vol,
+                x=volume['x'],
+                y=volume['y'],
                 name='Volume',
-                marker=dict(color=volume_colors, opacity=opacities),
-                customdata=original_vol,
+                marker=dict(color=volume['colors'], opacity=volume['opacities']),
+                customdata=volume['original'],
                 hovertemplate='Date: %{x}<br>Volume: %{customdata:,.0f}<extra></extra>'
             )
-        except Exception as e:
-            print(f"Debug: Fejl ved generering af volume-graf for {ticker_long}: {e}")
-            return {
-                'data': [],
-                'layout': go.Layout(title=f'Fejl ved generering af volume-graf for {ticker_long}')
-            }
 
-        x_range = [data.index.min(), data.index.max()]
-        bg_color = 'white' if theme == 'light' else 'rgb(30,30,30)'
-        font_color = 'black' if theme == 'light' else 'white'
-
-        volume_figure = {
-            'data': [volume_trace],
-            'layout': go.Layout(
-                title=f'{ticker_long} Volume',
-                xaxis={
-                    'rangeslider': {'visible': False},
-                    'showgrid': True,
-                    'matches': 'x',
-                    'range': x_range,
-                    'tickfont': {'size': 10}
-                },
-                yaxis={
-                    'title': 'Volume',
-                    'rangemode': 'tozero',
-                    'autorange': True,
-                    'zeroline': True,
-                    'tickformat': ',.0f',
-                    'showgrid': True
-                },
-                # Bevar brugerens zoom/axis state på opdateringer for at undgå
-                # at grafikalen skifter og skjuler små eller nul-højder.
-                uirevision='volume-graph',
-                showlegend='show_legends' in legend_toggle,
-                legend=dict(
-                    x=0,
-                    y=1,
-                    xanchor='left',
-                    yanchor='top',
-                    bgcolor='rgba(255,255,255,0.5)'
-                ),
-                paper_bgcolor=bg_color,
-                plot_bgcolor=bg_color,
-                font=dict(color=font_color),
-                margin=dict(l=60, r=40, t=40, b=40),
-                autosize=True
-            )
-        }
+            # Samme signal-linjer som på kursgrafen (uden pile)
+            volume_figure = {
+                'data': [volume_trace] + plot_signal_overlay(view.signal_lines, None, arrows=False),
+                'layout': go.Layout(
+                    title=f'{ticker_long} Volume',
+                    xaxis={
+                        'rangeslider': {'visible': False},
+                        'showgrid': True,
+                        'matches': 'x',
+                        'range': view.volume['x_range'],
+                        'tickfont': {'size': 10}
+                    },
+                    yaxis={
+                        'title': 'Volume',
+                        'rangemode': 'tozero',
+                        'autorange': True,
+                        'zeroline': True,
+                        'tickformat': ',.0f',
+                        'showgrid': True
+                    },
+                    yaxis2=SIGNAL_AXIS,
+                    # Bevar brugerens zoom/axis state på opdateringer for at undgå
+                    # at grafikalen skifter og skjuler små eller nul-højder.
+                    uirevision='volume-graph',
+                    legend=dict(
+                        x=0,
+                        y=1,
+                        xanchor='left',
+                        yanchor='top',
+                        bgcolor='rgba(255,255,255,0.5)'
+                    ),
+                    margin=dict(l=60, r=40, t=40, b=40),
+                    autosize=True
+                ).to_plotly_json()
+            }
 
-        # Hvis vi har genereret signal-shapes tidligere, inkluder dem i hoved-figurens layout
-        try:
-            shapes = []
-            if '_signal_shapes' in data:
-                shapes = data.pop('_signal_shapes')
-            if shapes:
-                # Inkluder shapes i både volume_figure og hoved-figure via global scope
-                volume_figure['layout']['shapes'] = shapes
-        except Exception:
-            pass
+            volume_figure = compact_figure(volume_figure)
+            figures.set(figure_key, volume_figure, VIEW_TTL)
 
-        print(f"Debug: Volume-graf genereret succesfuldt for {ticker_long}, autosize=True, tema: {theme}")
-        return volume_figure
+        log.debug("Volume-graf genereret succesfuldt for %s, autosize=True, tema: %s", ticker_long, theme)
+        return styled_figure(volume_figure, theme, legend_toggle)
 
     @app.callback(
         Output('new-ticker-input', 'options'),
         Input('new-ticker-input', 'search_value'),
         State('new-ticker-input', 'value')
     )
+    @timed("callback.update_search_options")
     def update_search_options(search_value, current_value):
         if not search_value:
             # FIX: Hvis der er valgt en værdi, så behold den i listen,
@@ -681,6 +609,7 @@ def create_app():
         Output('ticker-preview-output', 'children'),
         Input('new-ticker-input', 'value')
     )
+    @timed("callback.update_ticker_preview")
     def update_ticker_preview(ticker):
         if not ticker:
             return None
@@ -707,6 +636,7 @@ def create_app():
         Input('delete-ticker-button', 'n_clicks'),
         prevent_initial_call=True
     )
+    @timed("callback.display_confirm_delete")
     def display_confirm_delete(n_clicks):
         if n_clicks:
             return True
@@ -722,9 +652,10 @@ def create_app():
         [State('new-ticker-input', 'search_value'), State('ticker-dropdown', 'value')],
         prevent_initial_call=True
     )
+    @timed("callback.manage_tickers")
     def manage_tickers(add_clicks, delete_clicks, refresh_clicks, new_ticker_value, new_ticker_search, current_ticker):
         trigger = ctx.triggered_id
-        print(f"Debug: manage_tickers kaldt af {trigger}")
+        log.debug("manage_tickers kaldt af %s", trigger)
 
         message_text = ""
         message_style = {'margin-top': '5px', 'font-weight': 'bold'}
@@ -752,12 +683,10 @@ def create_app():
 
         # Udfør tilføjelse hvis vi har en ticker
         if ticker_to_add:
-            print(f"Debug: Forsøger at tilføje: '{ticker_to_add}'")
+            log.debug("Forsøger at tilføje: '%s'", ticker_to_add)
             success, message, added_ticker, added_name = add_ticker_to_list(ticker_to_add)
             if success:
-                print(f"Debug: Succes - {message}")
-                # Giv filsystemet et øjeblik til at synkronisere (vigtigt i Docker)
-                time.sleep(0.1)
+                log.debug("Succes - %s", message)
                 current_ticker = added_ticker
                 # Opdater præferencer
                 preferences = load_preferences()
@@ -766,7 +695,7 @@ def create_app():
                 message_text = message
                 message_style['color'] = 'green'
             else:
-                print(f"Debug: Fejl ved tilføjelse - {message}")
+                log.warning("Fejl ved tilføjelse - %s", message)
                 message_text = message
                 message_style['color'] = 'red'
                 # Hvis den findes, vælg den alligevel
@@ -775,11 +704,11 @@ def create_app():
 
         # Scenarie 3: Sletning
         elif trigger == 'confirm-delete':
-            print(f"Debug: Forsøger at slette current_ticker: '{current_ticker}'")
+            log.debug("Forsøger at slette current_ticker: '%s'", current_ticker)
             if current_ticker:
                 success, message = delete_ticker_from_list(current_ticker)
                 if success:
-                    print(f"Debug: Slettet - {message}")
+                    log.debug("Slettet - %s", message)
                     # Vælg en ny ticker (den første i listen) eller None hvis listen er tom
                     tickers = load_tickers()
                     current_ticker = next(iter(tickers)) if tickers else None
@@ -790,7 +719,7 @@ def create_app():
                     message_text = message
                     message_style['color'] = '#ff4d4d'
                 else:
-                    print(f"Debug: Sletning fejlede - {message}")
+                    log.warning("Sletning fejlede - %s", message)
                     message_text = f"Fejl: {message}"
                     message_style['color'] = 'red'
             else:
@@ -798,14 +727,14 @@ def create_app():
                 message_style['color'] = 'red'
 
         elif trigger == 'refresh-ticker-button':
-            print("Debug: Manuel opdatering af ticker-liste.")
+            log.debug("Manuel opdatering af ticker-liste.")
             # Vi gør ingenting her, koden fortsætter bare ned og genindlæser tickers
 
         tickers = load_tickers()
 
         # FIX: Ultimate safety check - Sørg for at den valgte aktie ALTID er i listen
         if current_ticker and current_ticker not in tickers:
-             print(f"Debug: current_ticker '{current_ticker}' mangler i listen! Tvinger den ind.")
+             log.debug("current_ticker '%s' mangler i listen! Tvinger den ind.", current_ticker)
              # Brug added_name hvis vi har det (fra tilføjelsen), ellers brug tickeren som navn
              tickers[current_ticker] = added_name if added_name else current_ticker
 
@@ -814,7 +743,7 @@ def create_app():
 
         # Debug: Tjek om den valgte ticker faktisk er i den liste vi sender tilbage
         found = any(opt['value'] == current_ticker for opt in options)
-        print(f"Debug: Options count: {len(options)}. current_ticker '{current_ticker}' fundet i options: {found}")
+        log.debug("Options count: %s. current_ticker '%s' fundet i options: %s", len(options), current_ticker, found)
 
         return options, current_ticker, None, message_text, message_style
 
@@ -823,23 +752,48 @@ def create_app():
         Input('ticker-dropdown', 'value'),
         prevent_initial_call=True
     )
+    @timed("callback.update_ticker_preference")
     def update_ticker_preference(ticker):
-        print(f"Debug: Callback aktiveret i update_ticker_preference med ticker: {ticker}")
+        log.debug("Callback aktiveret i update_ticker_preference med ticker: %s", ticker)
         if ticker:
             preferences = load_preferences()
             normalized_ticker = normalize_ticker(ticker)
             preferences["last_ticker"] = normalized_ticker
-            print(f"Debug: Gemmer præferencer i update_ticker_preference: {preferences}")
+            log.debug("Gemmer præferencer i update_ticker_preference: %s", preferences)
             save_preferences(preferences)
         else:
-            print("Debug: Ingen ticker valgt i update_ticker_preference. Sætter til standard TSLA.")
+            log.debug("Ingen ticker valgt i update_ticker_preference. Sætter til standard TSLA.")
             preferences = load_preferences()
             preferences["last_ticker"] = "TSLA"
             save_preferences(preferences)
             ticker = "TSLA"
-        print(f"Debug: Returnerer ticker til dropdown: {ticker}")
+        log.debug("Returnerer ticker til dropdown: %s", ticker)
         return ticker
 
+    server = app.server
+
+    @server.before_request
+    def start_request_timer():
+        flask.g.request_start = time.perf_counter()
+
+    @server.after_request
+    def record_request_time(response):
+        # Hele callback-requestet: callback, JSON-serialisering af figuren og Flask
+        start = getattr(flask.g, 'request_start', None)
+        if start is not None and flask.request.path.endswith('/_dash-update-component'):
+            registry.observe('http.dash_update', time.perf_counter() - start)
+        return response
+
+    # Registreret efter tidsmålingen, så den køres før (Flask kører after_request i omvendt rækkefølge)
+    # og komprimeringen tæller med i http.dash_update
+    @server.after_request
+    def compress(response):
+        return compress_response(response, flask.request.accept_encodings)
+
+    @server.route('/metrics')
+    def metrics_endpoint():
+        return flask.Response(render_prometheus(cache_stats() + [views.stats(), figures.stats()]), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
     return app
 
 if __name__ == '__main__':
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Tråd-sikker LRU-cache med udløbstid pr. element.
+
+Erstatter functools.lru_cache i data.py, så et dashboard der kører i dagevis
+ikke serverer gamle kurser. Levetiden kan være et tal eller en funktion af
+argumenterne (f.eks. market_hours.market_ttl), og cachen tæller hits, misses
+og evictions.
+
+Samtidige misses på samme nøgle samles med SingleFlight, så når Dash fyrer
+tre callbacks for samme ticker på én gang, hentes og beregnes data kun én gang.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, maxsize=128, name=None):
+        self.maxsize = maxsize
+        self.name = name
+        self._data = OrderedDict()  # key -> (udløber, værdi)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=_MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.evictions += 1
+            self.misses += 1
+            return default
+
+    def peek(self, key, default=_MISSING):
+        """Som get, men uden at tælle hits/misses eller flytte elementet i LRU-rækkefølgen."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            return default
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Fjerner ét element. Returnerer True hvis det fandtes."""
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def invalidate_where(self, predicate):
+        """Fjerner alle elementer hvis nøgle opfylder predicate. Returnerer antal fjernede."""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+            }
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Samler samtidige kald med samme nøgle: det første kald udføres, de øvrige
+    venter på det og får samme resultat (eller samme undtagelse).
+    """
+    def __init__(self):
+        self._calls = {}  # key -> _Call
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn(*args)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+
+def ttl_cache(ttl, maxsize=128, cache_if=None, key=None):
+    """
+    Dekorator som functools.lru_cache, men med udløbstid.
+
+    ttl: sekunder, eller en funktion der kaldes med de samme argumenter som
+         den dekorerede funktion og returnerer sekunder.
+    cache_if: valgfri funktion(resultat) -> bool. Resultater der afvises
+         (f.eks. tomme datasæt efter en fejl) gemmes ikke.
+    key: valgfri funktion(*args) -> cache-nøgle, f.eks. normalize_ticker, så
+         'novo-b.co' og 'NOVO-B.CO' deler én post. Standard er argument-tuplen.
+
+    Samtidige kald med samme argumenter og tom cache kører funktionen én gang;
+    de andre tråde venter og deler resultatet (tælles som 'coalesced').
+
+    Den dekorerede funktion får .invalidate(*args), .cache_clear(),
+    .cache_info() og .cache (selve TTLCache-objektet).
+    """
+    def decorator(func):
+        cache = TTLCache(maxsize=maxsize, name=func.__name__)
+        flight = SingleFlight()
+
+        def make_key(args):
+            return args if key is None else key(*args)
+
+        def load(cache_key, args):
+            # En anden tråd kan have fyldt cachen mellem vores miss og SingleFlight
+            value = cache.peek(cache_key)
+            if value is not _MISSING:
+                return value
+            value = func(*args)
+            # Gemmes før SingleFlight slipper nøglen, så nye kald rammer cachen
+            if cache_if is None or cache_if(value):
+                seconds = ttl(*args) if callable(ttl) else ttl
+                cache.set(cache_key, value, seconds)
+            return value
+
+        @wraps(func)
+        def wrapper(*args):
+            cache_key = make_key(args)
+            value = cache.get(cache_key)
+            if value is not _MISSING:
+                return value
+            return flight.do(cache_key, load, cache_key, args)
+
+        wrapper.cache = cache
+        wrapper.invalidate = lambda *args: cache.invalidate(make_key(args))
+        wrapper.cache_clear = cache.clear
+        wrapper.cache_info = lambda: {**cache.stats(), 'coalesced': flight.shared}
+        return wrapper
+
+    return decorator
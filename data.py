@@ -1,82 +1,207 @@
-import yfinance as yf
-import requests
 import numpy as np
 import pandas as pd
 import pandas_ta as ta
 import json
+import logging
 import os
 import re
 import time
-from functools import lru_cache
-from yfinance.exceptions import YFRateLimitError
+import sys
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from history_store import (load_history, save_history, merge_history, history_is_consistent,
+                           load_indicator_state, save_indicator_state)
+from fundamentals import load_fundamentals, save_fundamentals
+from cache import ttl_cache, TTLCache
+from shared_cache import SharedCache
+from market_hours import market_ttl, exchange_for
+from indicators import add_sma, add_macd, SMA_WINDOWS, IndicatorState
+from providers import get_provider, set_provider, create_provider, RateLimitExceeded
+from logger import get_logger, log_every
+from metrics import span, timed, inc
+from preferences import PreferencesStore
+from ticker_registry import TickerRegistry
+
+log = get_logger(__name__)
+
+# Cachede datasæt fryses (freeze_frame). main.py og server.py slår pandas' copy-on-write til
+# (enable_copy_on_write), så udsnit deler data med cachen og først en skrivning laver en kopi.
+
+def enable_copy_on_write():
+    """Slår pandas' copy-on-write til for hele processen; kaldes én gang fra indgangspunkterne."""
+    pd.set_option('mode.copy_on_write', True)
 
 ticker_file = "tickers.json"
 preferences_file = "user_preferences.json"
 
-@lru_cache(maxsize=100)
+# Levetider for cachede værdier. Kurser lever kort mens markedet er åbent og
+# ellers til næste åbning (se market_hours.market_ttl); navne ændrer sig sjældent.
+PRICE_TTL_OPEN = 5 * 60
+# Nøgletal (Ticker.info) hentes én gang i døgnet; hukommelses-cachen genlæser disk-posten hver time
+FUNDAMENTALS_TTL = 24 * 60 * 60
+FUNDAMENTALS_MEMORY_TTL = 60 * 60
+# Med delt cache genlæser hver proces disk-posten så ofte, så en genhentning i én worker ses af alle
+SHARED_MEMORY_TTL = 60
+
+# Senest berigede datasæt pr. ticker. Når pris-cachen udløber, beriges kun de nye bars oven i dette
+recent_frames = TTLCache(maxsize=100, name='recent_frames')
+# Delt disk-cache bag pris-cachen, når flere processer serverer dashboardet (se enable_shared_cache)
+shared_cache = None
+
+def provider_call(method, *args, cost=1, **kwargs):
+    """
+    Kalder en metode på den aktive udbyder gennem dens rate limiter (deles af
+    scannerens tråde og Dash-callbacks). cost er antal requests kaldet laver hos
+    udbyderen (f.eks. én pr. ticker i et download). Ved rate limit sættes alle
+    tråde på pause (adaptiv backoff), og RateLimitExceeded sendes videre til kalderen.
+    """
+    provider = get_provider()
+    limiter = provider.limiter
+    if limiter is not None:
+        limiter.acquire(cost)
+    try:
+        result = getattr(provider, method)(*args, **kwargs)
+    except provider.rate_limit_errors as e:
+        if limiter is not None:
+            pause = limiter.backoff()
+            log_every(log, 5, logging.WARNING, "Rate limit nået hos %s. Pauser alle kald i %.0f sekunder (rate nu %.2f/s)", provider.name, pause, limiter.rate)
+        raise RateLimitExceeded(str(e), partial=getattr(e, 'partial', None), failed=getattr(e, 'failed', ())) from e
+    if limiter is not None:
+        limiter.success()
+    return result
+
+def _has_data(result):
+    # Gem ikke tomme datasæt (fejl/rate limit) - de skal prøves igen ved næste kald
+    return not result[0].empty
+
+def _price_memory_ttl(ticker):
+    ttl = market_ttl(ticker, PRICE_TTL_OPEN)
+    return ttl if shared_cache is None else min(ttl, SHARED_MEMORY_TTL)
+
+@ttl_cache(ttl=_price_memory_ttl, maxsize=100, cache_if=_has_data)
+def cached_get_full_stock_data(ticker):
+    """Ét beriget datasæt pr. ticker - alle timespans skæres ud af det samme."""
+    log.debug("cached_get_full_stock_data kaldt med ticker: %s", ticker)
+    if shared_cache is None:
+        return get_full_stock_data(ticker)
+    # Har en anden worker allerede hentet og beriget ticker, læses resultatet fra disken
+    full_data, ticker_long = shared_cache.get_or_compute(
+        ('full_stock_data', ticker), lambda: get_full_stock_data(ticker),
+        market_ttl(ticker, PRICE_TTL_OPEN), cache_if=_has_data)
+    return freeze_frame(full_data), ticker_long
+
+def enable_shared_cache(directory=None):
+    """Slår den delte disk-cache til for denne proces og de processer, der forkes fra den."""
+    global shared_cache
+    shared_cache = SharedCache(directory) if directory else SharedCache()
+    log.info("Delt cache slået til i %s", shared_cache.directory)
+    return shared_cache
+
+def invalidate_prices(ticker):
+    """Smider de cachede kurser for ticker væk (også den delte cache); recent_frames beholdes."""
+    removed = cached_get_full_stock_data.invalidate(ticker)
+    if shared_cache is not None:
+        removed = shared_cache.invalidate(('full_stock_data', ticker)) or removed
+    return removed
+
+@timed("data.cached_get_stock_data")
 def cached_get_stock_data(ticker, timespan):
-    print(f"Debug: cached_get_stock_data kaldt med ticker: {ticker}, timespan: {timespan}")
-    return get_stock_data(ticker, timespan)
+    """
+    Returnerer (data, ticker_long) for timespan som et udsnit af det cachede datasæt.
+    Udsnittet deler (skrivebeskyttede) data med cachen; med copy-on-write får en
+    kalder der skriver i det sin egen kopi, så cachen aldrig ændres.
+    """
+    log.debug("cached_get_stock_data kaldt med ticker: %s, timespan: %s", ticker, timespan)
+    full_data, ticker_long = cached_get_full_stock_data(normalize_ticker(ticker))
+    return slice_timespan(full_data, timespan), ticker_long
 
 def normalize_ticker(ticker):
-    print(f"Debug: normalize_ticker kaldt med input: {ticker}")
+    log.debug("normalize_ticker kaldt med input: %s", ticker)
     if not ticker or not isinstance(ticker, str):
-        print(f"Debug: normalize_ticker modtog ugyldig ticker: {ticker}. Returnerer tom streng.")
+        log.debug("normalize_ticker modtog ugyldig ticker: %s. Returnerer tom streng.", ticker)
         return ''
     ticker = ticker.upper().strip()
-    print(f"Debug: normalize_ticker konverterede til: {ticker}")
+    log.debug("normalize_ticker konverterede til: %s", ticker)
     return ticker
 
-@lru_cache(maxsize=100)
-def get_company_name(ticker):
-    print(f"Debug: get_company_name kaldt med ticker: {ticker}")
+@ttl_cache(ttl=FUNDAMENTALS_MEMORY_TTL, maxsize=500, cache_if=bool, key=lambda ticker: normalize_ticker(ticker))
+def get_fundamentals(ticker):
+    """
+    Returnerer Ticker.info for ticker som dict (tom dict hvis den ikke kunne hentes).
+    Info hentes højst én gang pr. FUNDAMENTALS_TTL og gemmes på disk, så navn,
+    P/E, beta og preview deler samme opslag - også på tværs af genstarter.
+    """
+    ticker = normalize_ticker(ticker)
+    info, age = load_fundamentals(ticker)
+    if info is not None and age < FUNDAMENTALS_TTL:
+        return info
+
+    log.debug("get_fundamentals henter info for %s", ticker)
     try:
-        company = yf.Ticker(ticker)
-        info = company.info
-        name = info.get('longName', ticker)
-        print(f"Debug: get_company_name for {ticker} returnerede: {name}")
-        return name
+        fresh = provider_call('info', ticker)
     except Exception as e:
-        print(f"Debug: Fejl i get_company_name for {ticker}: {e}")
-        return ticker
+        log.warning("Fejl ved hentning af info for %s: %s", ticker, e)
+        # Hellere en forældet post end ingen
+        return info or {}
+    if not fresh:
+        return info or {}
+    save_fundamentals(ticker, fresh)
+    return fresh
+
+def prefetch_fundamentals(tickers, workers=4):
+    """Henter nøgletal for alle tickers der ikke allerede har en frisk post. Returnerer antal hentede."""
+    stale = []
+    for ticker in tickers:
+        info, age = load_fundamentals(normalize_ticker(ticker))
+        if info is None or age >= FUNDAMENTALS_TTL:
+            stale.append(ticker)
+    log.debug("prefetch_fundamentals: %s af %s tickers skal hentes", len(stale), len(tickers))
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        fetched = sum(1 for info in executor.map(get_fundamentals, stale) if info)
+    return fetched
+
+def get_company_name(ticker):
+    log.debug("get_company_name kaldt med ticker: %s", ticker)
+    name = get_fundamentals(ticker).get('longName', ticker)
+    log.debug("get_company_name for %s returnerede: %s", ticker, name)
+    return name
 
-@lru_cache(maxsize=100)
 def get_long_name(ticker):
-    print(f"Debug: get_long_name kaldt med ticker: {ticker}")
-    stock = yf.Ticker(ticker)
-    try:
-        name = stock.info['longName']
-        print(f"Debug: get_long_name for {ticker} returnerede: {name}")
-        return name
-    except KeyError:
-        print(f"Debug: get_long_name fandt ingen longName for {ticker}")
+    log.debug("get_long_name kaldt med ticker: %s", ticker)
+    name = get_fundamentals(ticker).get('longName')
+    if not name:
+        log.debug("get_long_name fandt ingen longName for %s", ticker)
         return ticker
+    return name
 
-@lru_cache(maxsize=100)
 def get_pe_ratio(ticker):
-    ticker = normalize_ticker(ticker)
-    print(f"Debug: get_pe_ratio kaldt med ticker: {ticker}")
-    stock = yf.Ticker(ticker)
-    try:
-        pe = stock.info['trailingPE']
-        print(f"Debug: get_pe_ratio for {ticker} returnerede: {pe}")
-        return pe
-    except KeyError:
-        print(f"Debug: get_pe_ratio fandt ingen trailingPE for {ticker}")
-        return None
+    pe = get_fundamentals(ticker).get('trailingPE')
+    log.debug("get_pe_ratio for %s returnerede: %s", ticker, pe)
+    return pe
 
-@lru_cache(maxsize=100)
 def get_beta(ticker):
+    beta = get_fundamentals(ticker).get('beta')
+    log.debug("get_beta for %s returnerede: %s", ticker, beta)
+    return beta
+
+def invalidate_ticker(ticker):
+    """Smider alle cachede værdier for ticker væk, så næste kald henter friske data."""
     ticker = normalize_ticker(ticker)
-    print(f"Debug: get_beta kaldt med ticker: {ticker}")
-    stock = yf.Ticker(ticker)
-    try:
-        beta = stock.info['beta']
-        print(f"Debug: get_beta for {ticker} returnerede: {beta}")
-        return beta
-    except KeyError:
-        print(f"Debug: get_beta fandt ingen beta for {ticker}")
-        return None
+    removed = 0
+    removed += cached_get_full_stock_data.cache.invalidate_where(lambda key: normalize_ticker(key[0]) == ticker)
+    removed += get_fundamentals.invalidate(ticker)
+    removed += recent_frames.invalidate(ticker)
+    if shared_cache is not None:
+        removed += shared_cache.invalidate(('full_stock_data', ticker))
+    log.debug("invalidate_ticker fjernede %s cachede værdier for %s", removed, ticker)
+    return removed
+
+def cache_stats():
+    """Hit/miss/eviction-tællere for alle caches i data.py."""
+    stats = [cached.cache_info() for cached in (cached_get_full_stock_data, get_fundamentals)] + [recent_frames.stats()]
+    if shared_cache is not None:
+        stats.append(shared_cache.stats())
+    return stats
 
 # --- NY FUNKTION: Tæl AFVENT dage ---
 def count_pending_days(df):
@@ -93,11 +218,12 @@ def count_pending_days(df):
             count += 1
         else:
             break
-    print(f"Debug: count_pending_days returnerede {count} dage")
+    log.debug("count_pending_days returnerede %s dage", count)
     return count
 
+@timed("data.check_perfect_order")
 def check_perfect_order(df):
-    print(f"Debug: check_perfect_order kaldt")
+    log.debug("check_perfect_order kaldt")
     """
     Analyserer om en aktie er i en 'Perfect Order' trend.
     Regler:
@@ -105,10 +231,10 @@ def check_perfect_order(df):
     2. Alle tre gennemsnit skal stige (nuværende værdi > forrige værdi)
     3. Valgfrit filter: Pris over SMA 200 for langsigtede trends.
     """
-    print(f"Debug: check_perfect_order kaldt")
+    log.debug("check_perfect_order kaldt")
     # Sørg for at vi har nok data til beregningerne
     if df is None or len(df) < 200:
-        print(f"Debug: check_perfect_order - for lidt data ({len(df) if df is not None else 0})")
+        log.debug("check_perfect_order - for lidt data (%s)", len(df) if df is not None else 0)
         return df
 
     # find close-series (støt både 'Close' og 'close')
@@ -119,32 +245,13 @@ def check_perfect_order(df):
     else:
         return df
 
-    # Genbrug allerede beregnede SMA200 hvis tilgængelig
-    if 'SMA200' in df:
-        sma200 = df['SMA200']
-    else:
-        try:
-            sma200 = ta.sma(close, length=200)
-        except Exception:
-            sma200 = close.rolling(window=200, min_periods=1).mean()
-        df['sma200'] = sma200
+    # SMA'er fra den fælles motor (allerede beregnede vinduer genbruges)
+    add_sma(df, (5, 10, 20, 50, 200), close=close)
+    return _perfect_order_rules(df, close)
 
-    # Beregn SMA værdier (brug pandas_ta hvis muligt)
-    try:
-        df['sma5'] = ta.sma(close, length=5)
-        df['sma10'] = ta.sma(close, length=10)
-        df['sma20'] = ta.sma(close, length=20)
-        df['sma50'] = ta.sma(close, length=50)
-        # hvis ikke allerede sat, sæt sma200 (laves ovenfor)
-        df['sma200'] = df.get('sma200', sma200)
-    except Exception as e:
-        print(f"Debug: Fejl i SMA beregning i check_perfect_order: {e}")
-        df['sma5'] = close.rolling(window=5, min_periods=1).mean()
-        df['sma10'] = close.rolling(window=10, min_periods=1).mean()
-        df['sma20'] = close.rolling(window=20, min_periods=1).mean()
-        df['sma50'] = close.rolling(window=50, min_periods=1).mean()
-        df['sma200'] = df.get('sma200', close.rolling(window=200, min_periods=1).mean())
 
+def _perfect_order_rules(df, close):
+    """Perfect Order-reglerne ud fra sma-kolonnerne. Bruger kun rækken selv og rækken før."""
     # Tjek rækkefølgen (The Stack)
     df['stack_ok'] = (df['sma5'] > df['sma10']) & (df['sma10'] > df['sma20'])
 
@@ -169,7 +276,7 @@ def get_trade_signals(df):
     Købs-logik: Perfect Order (sma5>sma10>sma20) + sma5 stigende + pris > sma200
     Salgs-logik: sma5 krydser under sma10 OR pris < sma20
     """
-    print(f"Debug: get_trade_signals kaldt")
+    log.debug("get_trade_signals kaldt")
     if df is None or len(df) < 20:
         return df
 
@@ -181,14 +288,8 @@ def get_trade_signals(df):
     else:
         return df
 
-    # Genbrug eksisterende SMA-kolonner hvis mulige, ellers beregn
-    for days in (5, 10, 20, 200):
-        col = f'sma{days}'
-        if col not in df:
-            try:
-                df[col] = ta.sma(close, length=days)
-            except Exception:
-                df[col] = close.rolling(window=days, min_periods=1).mean()
+    # Genbrug eksisterende SMA-kolonner, beregn kun de manglende
+    add_sma(df, (5, 10, 20, 200), close=close)
 
     # Bevar tidligere simple boolean-signal (hvis til stede)
     if 'signal' in df:
@@ -221,7 +322,7 @@ def get_trade_signals_with_stop(df):
     - Stop loss: sma20 - 0.5 * ATR
     - Sell: pris < stop_loss eller sma5 < sma10
     """
-    print(f"Debug: get_trade_signals_with_stop kaldt")
+    log.debug("get_trade_signals_with_stop kaldt")
 
     if df is None or len(df) < 20:
         return df
@@ -244,13 +345,7 @@ def get_trade_signals_with_stop(df):
         low = df.get('low', close)
 
     # Beregn SMA'er (genbrug hvis tilstede)
-    for days in (5, 10, 20, 200):
-        col = f'sma{days}'
-        if col not in df:
-            try:
-                df[col] = ta.sma(close, length=days)
-            except Exception:
-                df[col] = close.rolling(window=days, min_periods=1).mean()
+    add_sma(df, (5, 10, 20, 200), close=close)
 
     # Beregn ATR
     try:
@@ -285,12 +380,13 @@ def get_trade_signals_with_stop(df):
     return df
 
 # --- OPDATERET: Advanced Trade Signals med trafiklys ---
+@timed("data.get_advanced_trade_signals")
 def get_advanced_trade_signals(df, ticker_name="UKENDT"):
     """
     Opdateret med Breakout + Volumen filter.
     Køb kræver nu at volumen er højere end gennemsnittet for at bekræfte styrke.
     """
-    print(f"Debug: get_advanced_trade_signals med volumen-filter kaldt for {ticker_name}")
+    log.debug("get_advanced_trade_signals med volumen-filter kaldt for %s", ticker_name)
 
     if df is None or len(df) < 20:
         return df
@@ -304,21 +400,39 @@ def get_advanced_trade_signals(df, ticker_name="UKENDT"):
 
     # Kør de tekniske beregninger
     df = check_perfect_order(df)
+    _advanced_indicators(df, close, volume, high)
+    _advanced_signal_rules(df, close, volume)
+    _print_signal_status(df, ticker_name, close, volume)
+    return df
 
-    # Sikr at 'perfect_order' kolonnen findes (check_perfect_order laver 'perfect_trend')
-    if 'perfect_trend' in df:
-        df['perfect_order'] = df['perfect_trend']
-    else:
-        df['perfect_order'] = (df['sma5'] > df['sma10']) & (df['sma10'] > df['sma20'])
 
+def _advanced_indicators(df, close, volume, high):
+    """Rullende vinduer bag de avancerede signaler (IndicatorState.update giver de samme kolonner)."""
     # --- VOLUMEN FILTER ---
     # Vi beregner gennemsnitlig volumen over 20 dage
     df['vol_avg_20'] = volume.rolling(window=20).mean()
-    df['high_volume'] = volume > df['vol_avg_20']
 
     # Beregn 20-dages High (Breakout niveau)
     df['20d_high'] = high.rolling(window=20).max()
 
+    # Beregn om aktien har ligget lavt (under SMA200) i længere tid (bund-formation)
+    # Vi kigger 60 dage (ca. 3 måneder) tilbage. Hvis den har været under SMA200 i >80% af tiden,
+    # betragter vi det som en "langvarig bund/downtrend" vi nu bryder ud af.
+    df['below_sma200'] = close < df['sma200']
+    df['long_term_low'] = df['below_sma200'].rolling(window=60, min_periods=20).mean() > 0.8
+
+
+def _advanced_signal_rules(df, close, volume):
+    """Køb/salg-reglerne og den endelige signal-kolonne. Bruger kun rækken selv og rækken før."""
+    # Sikr at 'perfect_order' kolonnen findes (check_perfect_order laver 'perfect_trend')
+    if 'perfect_trend' in df:
+        df['perfect_order'] = df['perfect_trend']
+    else:
+        df['perfect_order'] = (df['sma5'] > df['sma10']) & (df['sma10'] > df['sma20'])
+
+    # Volumen over 20-dages gennemsnittet bekræfter styrke
+    df['high_volume'] = volume > df['vol_avg_20']
+
     # Beregn extension
     df['extension_pc'] = ((close - df['sma20']) / df['sma20']) * 100
     df['near_breakout'] = close >= (df['20d_high'] * 0.98)
@@ -327,12 +441,6 @@ def get_advanced_trade_signals(df, ticker_name="UKENDT"):
     df['long_term_ok'] = close > df['sma200']
     df['medium_term_ok'] = close > df['sma50']
 
-    # Beregn om aktien har ligget lavt (under SMA200) i længere tid (bund-formation)
-    # Vi kigger 60 dage (ca. 3 måneder) tilbage. Hvis den har været under SMA200 i >80% af tiden,
-    # betragter vi det som en "langvarig bund/downtrend" vi nu bryder ud af.
-    df['below_sma200'] = close < df['sma200']
-    df['long_term_low'] = df['below_sma200'].rolling(window=60, min_periods=20).mean() > 0.8
-
     # Købs-logik (Perfect Order + stigende + pris > sma200)
     buy_condition = (
         (df['sma5'] > df['sma10']) &
@@ -375,153 +483,361 @@ def get_advanced_trade_signals(df, ticker_name="UKENDT"):
 
     df['signal'] = np.select(conditions, choices, default=0)
 
-    # Debug print
+
+def _print_signal_status(df, ticker_name, close, volume):
+    # Status for sidste række; kun når debug-logning er slået til
+    if not log.isEnabledFor(logging.DEBUG):
+        return
     try:
         last = df.iloc[-1]
-        print(f"--- STATUS {ticker_name} (Sidste data) ---")
-        print(f"Pris: {last[close.name]:.2f} | Vol: {last[volume.name]:.0f} (Snit: {last['vol_avg_20']:.0f})")
-        print(f"Perfect Order: {last['perfect_order']} | Long Term: {last['long_term_ok']}")
-        print(f"Extension: {last['extension_pc']:.2f}% (Limit: 8.0%)")
-        print(f"Long Term Low (Bund): {last.get('long_term_low', False)}")
-        print(f"Breakout: {last['near_breakout']} (High: {last['20d_high']:.2f})")
-        print(f"High Volume: {last['high_volume']}")
+        log.debug("--- STATUS %s (Sidste data) ---", ticker_name)
+        log.debug("Pris: %.2f | Vol: %.0f (Snit: %.0f)", last[close.name], last[volume.name], last['vol_avg_20'])
+        log.debug("Perfect Order: %s | Long Term: %s", last['perfect_order'], last['long_term_ok'])
+        log.debug("Extension: %.2f%% (Limit: 8.0%%)", last['extension_pc'])
+        log.debug("Long Term Low (Bund): %s", last.get('long_term_low', False))
+        log.debug("Breakout: %s (High: %.2f)", last['near_breakout'], last['20d_high'])
+        log.debug("High Volume: %s", last['high_volume'])
         if last['signal'] == 1:
             extras = []
             if last['near_breakout']: extras.append("Breakout")
             if last['high_volume']: extras.append("Volumen")
-            print(f"🚀 KØB SIGNAL: Perfect Order OK. Ekstra styrke: {', '.join(extras) if extras else 'Ingen'}")
+            log.debug("🚀 KØB SIGNAL: Perfect Order OK. Ekstra styrke: %s", ', '.join(extras) if extras else 'Ingen')
         elif last['signal'] == 2:
             extras = []
             if last['near_breakout']: extras.append("Breakout")
             if last['high_volume']: extras.append("Volumen")
-            print(f"⚠️ FORSIGTIGT KØB (Early Entry): Pris over SMA50. Ekstra: {', '.join(extras) if extras else 'Ingen'}")
+            log.debug("⚠️ FORSIGTIGT KØB (Early Entry): Pris over SMA50. Ekstra: %s", ', '.join(extras) if extras else 'Ingen')
         elif last['signal'] == -1:
-            print("🛑 STÆRKT SALG: Pris under SMA20. Trend brudt.")
+            log.debug("🛑 STÆRKT SALG: Pris under SMA20. Trend brudt.")
         elif last['signal'] == -2:
-            print("⚠️ FORSIGTIGT SALG: Pris under SMA 5/10. Momentum svækket.")
+            log.debug("⚠️ FORSIGTIGT SALG: Pris under SMA 5/10. Momentum svækket.")
         else:
-            print("⚪ AFVENT: Mangler volumen, breakout eller perfect order.")
+            log.debug("⚪ AFVENT: Mangler volumen, breakout eller perfect order.")
     except Exception as e:
-        print(f"Debug: Kunne ikke printe status: {e}")
+        log.warning("Kunne ikke printe status: %s", e)
 
-    return df
 
+def fetch_full_history(ticker):
+    """
+    Henter fuld historik via det lokale lager.
+    Kun bars efter sidst gemte dag hentes fra udbyderen; første gang (eller efter
+    udbytte/split-justering) hentes 'max' og lageret genopbygges.
+    """
+    stored = load_history(ticker)
+    if stored is None or stored.empty or len(stored) < 2:
+        log.debug("Ingen gemt historik for %s. Henter 'max'", ticker)
+        full_data = provider_call('history', ticker, period="max")
+    else:
+        # Start ved næstsidste bar: den er garanteret færdig og bruges til at opdage justeringer,
+        # mens den sidste bar kan være en ufærdig dagsbar der skal overskrives.
+        start = stored.index[-2]
+        log.debug("Henter nye bars for %s fra %s (%s rækker gemt)", ticker, start.date(), len(stored))
+        new_data = provider_call('history', ticker, start=start.strftime('%Y-%m-%d'))
+        if history_is_consistent(stored, new_data):
+            full_data = merge_history(stored, new_data)
+        else:
+            log.debug("Historik for %s er justeret (udbytte/split). Henter 'max' igen", ticker)
+            full_data = provider_call('history', ticker, period="max")
 
+    if not full_data.empty:
+        save_history(ticker, full_data)
+    return full_data
 
-def get_stock_data(ticker, timespan):
-    ticker = normalize_ticker(ticker)
-    print(f"Debug: get_stock_data kaldt med ticker: {ticker}, timespan: {timespan}")
-    stock = yf.Ticker(ticker)
+def fetch_histories_batch(tickers):
+    """
+    Henter historik for mange tickers med få download-kald i stedet for ét kald pr. ticker.
+    Tickers med gemt historik hentes fra næstsidste gemte bar (ét kald pr. startdato,
+    så én forældet ticker ikke trækker hele gruppen med tilbage), resten får 'max'.
+    Returnerer {ticker: OHLCV-datasæt}; tickers der ikke kunne hentes er udeladt
+    (også ved rate limit - de hentes så enkeltvis, når limiteren tillader det).
+    """
+    stored = {t: load_history(t) for t in tickers}
+    incremental = [t for t in tickers if stored[t] is not None and len(stored[t]) >= 2]
+    full = [t for t in tickers if t not in incremental]
+    tz_like = {t: stored[t].index.tz for t in incremental}
+    for t in full:
+        exchange = exchange_for(t)
+        tz_like[t] = exchange[0] if exchange else 'UTC'
+
+    def download(group, **kwargs):
+        if not group:
+            return {}
+        log.debug("download for %s tickers (%s)", len(group), kwargs)
+        try:
+            # yf.download laver ét request pr. ticker; gruppen betaler for dem alle
+            frames = provider_call('download', group, cost=len(group), **kwargs)
+        except RateLimitExceeded as e:
+            # provider_call har sat limiteren på pause. Det der kom igennem bruges; de afviste
+            # tickers mangler i resultatet og hentes enkeltvis af _fetch_chunk efter pausen
+            log.debug("Rate limit i download; %s tickers prøves igen enkeltvis: %s", len(e.failed), e.failed)
+            frames = e.partial or {}
+        for ticker, df in frames.items():
+            # yf.download giver UTC-tidspunkter på tværs af børser; vis dem i samme tidszone som
+            # den gemte historik og Ticker.history, så samme handelsdag har samme tidsstempel
+            tz = tz_like.get(ticker)
+            if tz is None:
+                continue
+            frames[ticker] = df.tz_localize(tz) if df.index.tz is None else df.tz_convert(tz)
+        return frames
+
+    results = {}
+    starts = {}
+    for t in incremental:
+        starts.setdefault(stored[t].index[-2].strftime('%Y-%m-%d'), []).append(t)
+    for start, group in sorted(starts.items()):
+        new_frames = download(group, start=start)
+        for t in group:
+            new_data = new_frames.get(t)
+            if new_data is None:
+                continue
+            if history_is_consistent(stored[t], new_data):
+                results[t] = merge_history(stored[t], new_data)
+            else:
+                log.debug("Historik for %s er justeret (udbytte/split). Henter 'max' igen", t)
+                full.append(t)
+    results.update(download(full, period='max'))
 
-    period_map = {
-        "1d": "1d", "1w": "1wk", "1mo": "1mo", "3mo": "3mo",
-        "6mo": "6mo", "1y": "1y", "3y": "3y", "5y": "5y",
-        "10y": "10y", "max": "max"
-    }
+    for t, df in results.items():
+        save_history(t, df)
+    return results
+
+# Antal dage tilbage for hver timespan i dropdown'en (None = hele historikken)
+TIMESPAN_DAYS = {
+    "1d": 1, "1w": 7, "1mo": 30, "3mo": 90,
+    "6mo": 180, "1y": 365, "3y": 365 * 3, "5y": 365 * 5,
+    "10y": 365 * 10, "max": None
+}
+
+
+def compute_indicators(full_data, ticker_long):
+    """
+    Beregner alle tekniske indikatorer og signaler på et rå OHLCV-datasæt.
+    Returnerer et tomt DataFrame hvis påkrævede kolonner mangler.
+    """
+    required_columns = ['Close', 'Volume', 'Open', 'High', 'Low']
+    missing_columns = [col for col in required_columns if col not in full_data]
+    if missing_columns:
+        log.debug("Manglende kolonner i data for %s: %s", ticker_long, missing_columns)
+        return pd.DataFrame()
+
+    # Konverter index til DatetimeIndex hvis nødvendigt (slice_timespan kræver det)
+    if not isinstance(full_data.index, pd.DatetimeIndex):
+        full_data.index = pd.to_datetime(full_data.index)
+
+    # Beregn tekniske indikatorer på FULDT datasæt
+    log.debug("Beregner indikatorer på %s datapunkter", len(full_data))
+    # Alle SMA'er (signaler og trend-linjer i plot_trends) i ét gennemløb på hele historikken
+    add_sma(full_data, SMA_WINDOWS)
+    full_data['RSI'] = ta.rsi(full_data['Close'], length=14)
+    full_data['ATR'] = ta.atr(full_data['High'], full_data['Low'], full_data['Close'], length=14)
+    add_macd(full_data)
+
+    _basic_signal(full_data)
+
+    # Beregn check_perfect_order (Perfect Order) og tilføj kolonner til full_data
+    try:
+        full_data = check_perfect_order(full_data)
+    except Exception as e:
+        log.warning("Fejl ved beregning af check_perfect_order: %s", e)
 
-    # Altid hent max data (eller 10y som fallback) for at have nok data til alle indikatorer
-    print(f"Debug: Henter 'max' data for indikatorberegning")
+    # Beregn trade-signaler (køb/sælg/neutral) og overskriv 'signal' med -1/0/1
+    try:
+        # Brug den nye avancerede strategi (Perfect Order + Extension + Volumen)
+        full_data = get_advanced_trade_signals(full_data, ticker_name=ticker_long)
+    except Exception as e:
+        log.warning("Fejl ved beregning af trade-signaler: %s", e)
+
+    return full_data
+
+def _basic_signal(df):
+    # Logik for købssignal (behold som basic-signal)
+    df['signal'] = (df['Close'] > df['sma200']) & (df['RSI'] > 60)
+    df['signal_basic'] = df['signal']
+
+def save_indicator_checkpoint(ticker, frame):
+    """
+    Gemmer indikator-tilstanden efter næstsidste række i et beriget datasæt.
+    Den sidste bar kan være en ufærdig dagsbar og beregnes igen ved næste opdatering.
+    """
+    if frame is None or len(frame) <= max(SMA_WINDOWS) or 'below_sma200' not in frame:
+        return
+    state = IndicatorState.from_frame(frame.iloc[:-1])
+    if state is not None:
+        save_indicator_state(ticker, {'version': state.version, 'state': state, 'row': frame.iloc[[-2]]})
+
+def extend_indicators(ticker, history):
+    """
+    Beriger kun bars i history efter den gemte indikator-tilstand (konstant tid pr. bar).
+    Returnerer de nye berigede rækker, eller None hvis tilstanden mangler eller ikke
+    passer med historikken (f.eks. efter udbytte/split) - så skal alt beregnes forfra.
+    """
+    record = load_indicator_state(ticker)
+    if record is None or record.get('version') != IndicatorState.version:
+        return None
+    state, row = record['state'], record['row']
+    if history is None or state.as_of not in history.index:
+        return None
+    pos = history.index.get_loc(state.as_of)
+    last_close = state.closes[-1]
+    if abs(history['Close'].iloc[pos] - last_close) > 1e-6 * max(abs(last_close), 1.0):
+        return None
+    bars = history.iloc[pos + 1:]
+    values = bars[['High', 'Low', 'Close', 'Volume']].to_numpy(dtype=np.float64)
+    if bars.empty or np.isnan(values).any():
+        return None
+
+    committed = state
+    updates = []
+    for i, (timestamp, (high, low, close, volume)) in enumerate(zip(bars.index, values)):
+        if i == len(bars) - 1:
+            # Tilstanden før sidste bar gemmes; den sidste kan stadig ændre sig
+            committed = state.copy()
+        updates.append(state.update(timestamp, high, low, close, volume))
+
+    # Reglerne kigger højst én række tilbage, så den gemte række er nok som forgænger
+    frame = pd.concat([row, bars.join(pd.DataFrame(updates, index=bars.index))])
+    close = frame['Close']
+    _basic_signal(frame)
+    _perfect_order_rules(frame, close)
+    _advanced_signal_rules(frame, close, frame['Volume'])
+    rows = frame.iloc[1:]
+    # Gemt af en anden udgave af beregningen eller med andre rå-kolonner: nye kolonner
+    # mangler i den gemte række, og kolonner der ikke beregnes længere bliver ikke udfyldt
+    unfilled = rows.columns[rows.isna().all()].difference(bars.columns)
+    if len(frame.columns) != len(row.columns) or len(unfilled):
+        log.debug("Indikator-tilstanden for %s har andre kolonner end beregningen. Beregner forfra", ticker)
+        return None
+    rows = rows[list(row.columns)]
+
+    if len(rows) > 1:
+        save_indicator_state(ticker, {'version': committed.version, 'state': committed, 'row': rows.iloc[[-2]]})
+    log.debug("extend_indicators beregnede %s nye rækker for %s", len(rows), ticker)
+    return rows
+
+def enrich_history(ticker, history, ticker_long):
+    """
+    Returnerer history beriget med alle indikatorer og signaler.
+    Findes et tidligere resultat i recent_frames, og passer den gemte tilstand,
+    beriges kun de nye bars; ellers beregnes alt med compute_indicators.
+    """
+    previous = recent_frames.get(ticker, None)
+    rows = extend_indicators(ticker, history) if previous is not None else None
+    frame = None
+    if rows is not None:
+        # Genbrug kun færdige rækker (ikke den sidste, som kan have været en ufærdig bar),
+        # og kun hvis de dækker præcis de samme bars som history op til de nye rækker
+        keep = previous.index.searchsorted(rows.index[0])
+        if 0 < keep < len(previous) and keep == history.index.get_loc(rows.index[0]) \
+                and previous.index[keep - 1] == history.index[keep - 1]:
+            frame = pd.concat([previous.iloc[:keep], rows])
+            inc('indicators.extended')
+
+    if frame is None:
+        frame = compute_indicators(history, ticker_long)
+        save_indicator_checkpoint(ticker, frame)
+        inc('indicators.full')
+    if not frame.empty:
+        # Datasættet deles af alle callbacks og tråde fra nu af
+        frame = freeze_frame(frame)
+        recent_frames.set(ticker, frame, FUNDAMENTALS_TTL)
+    return frame
+
+def freeze_frame(df):
+    """
+    Returnerer en kopi af df, hvor alle NumPy-kolonner er skrivebeskyttede.
+    En skrivning direkte i et frosset datasæt fejler i stedet for at ændre data
+    som andre tråde læser; udsnit af det kopieres ved skrivning (copy-on-write).
+    """
+    columns = {}
+    for name in df.columns:
+        column = df[name]
+        if isinstance(column.dtype, np.dtype):
+            values = column.to_numpy(copy=True)
+            values.flags.writeable = False
+        else:
+            values = column.array  # Extension-typer (f.eks. Int64) har ingen writeable-flag
+        columns[name] = values
+    # copy=False: DataFrame'en bygges direkte på de skrivebeskyttede arrays
+    return prime_index(pd.DataFrame(columns, index=df.index, copy=False))
+
+def prime_index(df):
+    """
+    Bygger opslagstabellen for df's indeks nu og returnerer df. Pandas bygger den
+    først ved det første opslag (.loc med datoer) og uden lås, så to tråde der
+    slår op i et delt datasæt samtidig, kan få KeyError for datoer der findes.
+    """
+    if len(df.index):
+        df.index.get_indexer(df.index[:1])
+    return df
+
+def get_full_stock_data(ticker):
+    """
+    Henter fuld historik og beregner alle indikatorer én gang.
+    Returnerer (full_data, ticker_long); timespan-udsnit laves bagefter med slice_timespan.
+    """
+    ticker = normalize_ticker(ticker)
+    log.debug("get_full_stock_data kaldt med ticker: %s", ticker)
 
     for attempt in range(3):
         try:
-            # Hent altid max data for indikatorberegning
-            full_data = stock.history(period="max")
-            ticker_long = get_long_name(ticker)
+            # Altid brug fuld historik (lokalt lager + nye bars) for at have nok data til alle indikatorer
+            with span('data.fetch'):
+                full_data = fetch_full_history(ticker)
+            with span('data.name'):
+                ticker_long = get_long_name(ticker)
 
             if full_data.empty:
-                print(f"Debug: Tomt datasæt returneret for {ticker}")
-                return pd.DataFrame(), ticker_long
-
-            required_columns = ['Close', 'Volume', 'Open', 'High', 'Low']
-            missing_columns = [col for col in required_columns if col not in full_data]
-            if missing_columns:
-                print(f"Debug: Manglende kolonner i data for {ticker}: {missing_columns}")
+                log.debug("Tomt datasæt returneret for %s", ticker)
                 return pd.DataFrame(), ticker_long
 
-            # Beregn tekniske indikatorer på FULDT datasæt
-            print(f"Debug: Beregner indikatorer på {len(full_data)} datapunkter")
-            # Beregn SMA200 og genbrug som 'EMA200' for kompatibilitet med resten af koden.
-            # Dette undgår at beregne 200-dages glidende gennemsnit to gange (i plotting).
-            full_data['SMA200'] = full_data['Close'].rolling(window=200, min_periods=1).mean()
-            # Behold kolonnenavn 'EMA200' for bagudkompatibilitet (brug SMA200 værdi)
-            full_data['EMA200'] = full_data['SMA200']
-            full_data['RSI'] = ta.rsi(full_data['Close'], length=14)
-            full_data['ATR'] = ta.atr(full_data['High'], full_data['Low'], full_data['Close'], length=14)
-
-            # Logik for købssignal (behold som basic-signal)
-            full_data['signal'] = (full_data['Close'] > full_data['EMA200']) & (full_data['RSI'] > 60)
-            full_data['signal_basic'] = full_data['signal']
-
-            # Beregn check_perfect_order (Perfect Order) og tilføj kolonner til full_data
-            try:
-                full_data = check_perfect_order(full_data)
-            except Exception as e:
-                print(f"Debug: Fejl ved beregning af check_perfect_order: {e}")
-
-            # Beregn trade-signaler (køb/sælg/neutral) og overskriv 'signal' med -1/0/1
-            try:
-                # Brug den nye avancerede strategi (Perfect Order + Extension + Volumen)
-                full_data = get_advanced_trade_signals(full_data, ticker_name=ticker_long)
-            except Exception as e:
-                print(f"Debug: Fejl ved beregning af trade-signaler: {e}")
-
-            # Filtrer data baseret på valgt timespan
-            requested_period = period_map.get(timespan, "1y")
-            if requested_period != "max":
-                # Konverter index til DatetimeIndex hvis nødvendigt
-                if not isinstance(full_data.index, pd.DatetimeIndex):
-                    full_data.index = pd.to_datetime(full_data.index)
-
-                # Brug pandas Timestamp for konsistens — tilpas timezone hvis index er timezone-aware
-                if full_data.index.tz is not None:
-                    now = pd.Timestamp.now(tz=full_data.index.tz)
-                else:
-                    now = pd.Timestamp.now()
-
-                # Bestem cutoff ved hjælp af pandas DateOffset eller Timedelta
-                if requested_period == "1d":
-                    cutoff_date = now - pd.Timedelta(days=1)
-                elif requested_period == "1wk":
-                    cutoff_date = now - pd.Timedelta(weeks=1)
-                elif requested_period == "1mo":
-                    cutoff_date = now - pd.Timedelta(days=30)
-                elif requested_period == "3mo":
-                    cutoff_date = now - pd.Timedelta(days=90)
-                elif requested_period == "6mo":
-                    cutoff_date = now - pd.Timedelta(days=180)
-                elif requested_period == "1y":
-                    cutoff_date = now - pd.Timedelta(days=365)
-                elif requested_period == "3y":
-                    cutoff_date = now - pd.Timedelta(days=365*3)
-                elif requested_period == "5y":
-                    cutoff_date = now - pd.Timedelta(days=365*5)
-                elif requested_period == "10y":
-                    cutoff_date = now - pd.Timedelta(days=365*10)
-                else:
-                    cutoff_date = now - pd.Timedelta(days=180)
-
-                print(f"Debug: Filtrerer data fra {cutoff_date} til {now}")
-
-                # Filtrer data - brug .loc og copy for at undgå SettingWithCopyWarning
-                data = full_data.loc[full_data.index >= cutoff_date].copy()
-                print(f"Debug: Filtrerede data til {timespan} ({len(data)} datapunkter af {len(full_data)})")
-            else:
-                data = full_data.copy()
-                print(f"Debug: Bruger fuldt datasæt (max)")
-
-            print(f"Debug: get_stock_data returnerer {len(data)} datapunkter for {timespan}. Kolonner: {list(data.columns)}")
-            return data, ticker_long
+            with span('data.indicators'):
+                return enrich_history(ticker, full_data, ticker_long), ticker_long
 
-        except YFRateLimitError:
-            print(f"Debug: Rate limit nået for {ticker}: Venter {2 ** attempt} sekunder...")
-            time.sleep(2 ** attempt)
+        except RateLimitExceeded:
+            # provider_call har allerede sat udbyderens limiter på pause; næste forsøg venter på den
+            log_every(log, 10, logging.WARNING, "Rate limit nået for %s (forsøg %s/3)", ticker, attempt + 1)
         except Exception as e:
-            print(f"Debug: Fejl ved hentning af data for {ticker}: {e}")
+            log.warning("Fejl ved hentning af data for %s: %s", ticker, e)
             return pd.DataFrame(), ticker
 
-    print(f"Debug: Kunne ikke hente data for {ticker} efter flere forsøg.")
+    log.warning("Kunne ikke hente data for %s efter flere forsøg.", ticker)
     return pd.DataFrame(), ticker
 
+def slice_timespan(full_data, timespan):
+    """
+    Returnerer udsnittet af full_data for timespan uden at kopiere data.
+    Index er sorteret, så cutoff findes med binær søgning.
+    """
+    if full_data is None or full_data.empty:
+        return full_data
+
+    days = TIMESPAN_DAYS.get(timespan, TIMESPAN_DAYS["1y"])
+    if days is None:
+        return full_data.iloc[:]
+
+    # Brug pandas Timestamp for konsistens — tilpas timezone hvis index er timezone-aware
+    if full_data.index.tz is not None:
+        now = pd.Timestamp.now(tz=full_data.index.tz)
+    else:
+        now = pd.Timestamp.now()
+    cutoff_date = now - pd.Timedelta(days=days)
+
+    start = full_data.index.searchsorted(cutoff_date, side='left')
+    return full_data.iloc[start:]
+
+@timed("data.get_stock_data")
+def get_stock_data(ticker, timespan):
+    log.debug("get_stock_data kaldt med ticker: %s, timespan: %s", ticker, timespan)
+    full_data, ticker_long = get_full_stock_data(ticker)
+    if full_data.empty:
+        return full_data, ticker_long
+
+    # Kalderen må frit ændre i udsnittet: copy-on-write kopierer først ved skrivning
+    with span('data.slice'):
+        data = slice_timespan(full_data, timespan)
+    log.debug("get_stock_data returnerer %s datapunkter for %s (af %s)", len(data), timespan, len(full_data))
+    return data, ticker_long
+
 def validate_ticker(ticker):
     """
     Validerer om en ticker findes og henter firmanavn.
@@ -531,17 +847,15 @@ def validate_ticker(ticker):
     if not ticker:
         return False, ticker, "Ticker er tom"
 
-    print(f"Debug: Validerer ticker {ticker}...")
+    log.debug("Validerer ticker %s...", ticker)
     try:
-        stock = yf.Ticker(ticker)
-
         # Tjek historik først - det er den mest robuste måde at se om den handles
         # Vi henter 5 dages data for at være sikre på at ramme handelsdage
-        hist = stock.history(period="5d")
+        hist = provider_call('history', ticker, period="5d")
 
         if hist.empty:
             # Hvis historikken er tom, så led efter alternativer
-            print(f"Debug: Ingen data for {ticker}. Søger efter alternativ...")
+            log.debug("Ingen data for %s. Søger efter alternativ...", ticker)
 
             candidates = []
             # 1. Søg på det du skrev
@@ -551,7 +865,7 @@ def validate_ticker(ticker):
             if '.' in ticker:
                 root = ticker.split('.')[0]
                 if len(root) >= 2:
-                    print(f"Debug: Prøver udvidet søgning på '{root}'")
+                    log.debug("Prøver udvidet søgning på '%s'", root)
                     candidates.extend(search_tickers(root))
 
             # Filtrer dubletter
@@ -562,7 +876,8 @@ def validate_ticker(ticker):
                     seen.add(c['value'])
                     unique_candidates.append(c)
 
-            print(f"Debug: Kandidater til validering: {[c['value'] for c in unique_candidates]}")
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Kandidater til validering: %s", [c['value'] for c in unique_candidates])
 
             # Test hver kandidat indtil vi finder en med data
             for cand in unique_candidates:
@@ -572,32 +887,25 @@ def validate_ticker(ticker):
                 if normalize_ticker(alt_ticker) == ticker:
                     continue
 
-                print(f"Debug: Tester alternativ: {alt_ticker}")
-                stock_alt = yf.Ticker(alt_ticker)
-                hist_alt = stock_alt.history(period="5d")
+                log.debug("Tester alternativ: %s", alt_ticker)
+                hist_alt = provider_call('history', alt_ticker, period="5d")
 
                 if not hist_alt.empty:
-                    try:
-                        info = stock_alt.info
-                        name = info.get('longName') or info.get('shortName') or alt_ticker
-                    except Exception:
-                        name = alt_ticker
-                    print(f"Debug: Fandt gyldig alternativ: {alt_ticker}")
+                    info = get_fundamentals(alt_ticker)
+                    name = info.get('longName') or info.get('shortName') or alt_ticker
+                    log.debug("Fandt gyldig alternativ: %s", alt_ticker)
                     return True, normalize_ticker(alt_ticker), name
 
             return False, ticker, f"Ingen handelsdata fundet for '{ticker}' eller alternativer."
 
         # Hvis vi har data, prøv at hente et pænt navn
-        try:
-            info = stock.info
-            name = info.get('longName') or info.get('shortName') or ticker
-        except Exception:
-            name = ticker
+        info = get_fundamentals(ticker)
+        name = info.get('longName') or info.get('shortName') or ticker
 
         return True, ticker, name
 
-    except YFRateLimitError:
-        return False, ticker, "Rate limit nået hos Yahoo Finance. Prøv igen senere."
+    except RateLimitExceeded:
+        return False, ticker, "Rate limit nået hos dataudbyderen. Prøv igen senere."
     except Exception as e:
         return False, ticker, f"Fejl ved opslag: {str(e)}"
 
@@ -615,12 +923,9 @@ def add_ticker_to_list(ticker):
     company_name = result
     ticker_clean = valid_ticker
 
-    tickers = load_tickers()
-    if ticker_clean in tickers:
-        return False, f"Ticker {ticker_clean} findes allerede.", ticker_clean, tickers[ticker_clean]
+    if not ticker_registry.add(ticker_clean, company_name):
+        return False, f"Ticker {ticker_clean} findes allerede.", ticker_clean, ticker_registry.get(ticker_clean)
 
-    tickers[ticker_clean] = company_name
-    save_tickers(tickers)
     return True, f"Tilføjet: {company_name} ({ticker_clean})", ticker_clean, company_name
 
 def get_ticker_info(ticker):
@@ -628,17 +933,11 @@ def get_ticker_info(ticker):
     ticker = normalize_ticker(ticker)
     if not ticker:
         return None
-    try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
-        return info
-    except Exception as e:
-        print(f"Debug: Fejl ved hentning af info for {ticker}: {e}")
-        return None
+    return get_fundamentals(ticker) or None
 
 def search_tickers(query):
     """
-    Søger efter tickers via Yahoo Finance API.
+    Søger efter tickers hos den aktive udbyder (Yahoo Finance som standard).
     Returnerer en liste af dicts til Dash Dropdown.
     """
     if not query or len(query) < 2:
@@ -647,14 +946,9 @@ def search_tickers(query):
     # Hjælpefunktion til at udføre selve opslaget
     def do_search(q):
         try:
-            url = "https://query2.finance.yahoo.com/v1/finance/search"
-            headers = {'User-Agent': 'Mozilla/5.0'}
-            params = {'q': q, 'quotesCount': 10, 'newsCount': 0}
-
-            response = requests.get(url, headers=headers, params=params, timeout=5)
-            return response.json()
+            return {'quotes': provider_call('search', q)}
         except Exception as e:
-            print(f"Debug: Fejl ved tickersøgning for '{q}': {e}")
+            log.warning("Fejl ved tickersøgning for '%s': %s", q, e)
             return {}
 
     # Første forsøg: Søg præcis på det brugeren skrev
@@ -664,7 +958,7 @@ def search_tickers(query):
     if not data.get('quotes') and '.' in query:
         clean_query = query.split('.')[0]
         if len(clean_query) >= 2:
-            print(f"Debug: Ingen hits for '{query}', prøver fallback søgning på '{clean_query}'")
+            log.debug("Ingen hits for '%s', prøver fallback søgning på '%s'", query, clean_query)
             data = do_search(clean_query)
 
     results = []
@@ -684,81 +978,52 @@ def delete_ticker_from_list(ticker):
     Sletter en ticker fra tickers.json.
     """
     ticker = normalize_ticker(ticker)
-    tickers = load_tickers()
 
-    print(f"Debug: delete_ticker_from_list forsøger at slette '{ticker}'")
+    log.debug("delete_ticker_from_list forsøger at slette '%s'", ticker)
 
-    if ticker in tickers:
-        del tickers[ticker]
-        save_tickers(tickers)
+    if ticker_registry.remove(ticker):
+        invalidate_ticker(ticker)
         return True, f"Slettet: {ticker}"
     else:
-        print(f"Debug: Ticker '{ticker}' blev ikke fundet i listen. Tilgængelige: {list(tickers.keys())[:10]}...")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Ticker '%s' blev ikke fundet i listen. Tilgængelige: %s...", ticker, list(load_tickers())[:10])
         return False, f"Ticker {ticker} findes ikke i listen."
 
+# Watchlisten i hukommelsen; filen genlæses kun når den ændres udefra (se ticker_registry.py)
+ticker_registry = TickerRegistry(ticker_file, normalize=normalize_ticker)
+
 def load_tickers():
-    print(f"Debug: load_tickers kaldt")
-    if os.path.exists(ticker_file):
-        try:
-            with open(ticker_file, 'r') as file:
-                tickers = json.load(file)
-                if isinstance(tickers, list):
-                    tickers = {ticker[0]: ticker[1] for ticker in tickers}
-                print(f"Debug: Tickers indlæst fra {ticker_file}: {list(tickers.keys())}")
-                return tickers
-        except Exception as e:
-            print(f"Debug: Fejl ved indlæsning af {ticker_file}: {e}")
-    print(f"Debug: Ingen tickers fundet i {ticker_file}. Returnerer tomt dictionary.")
-    return {}
+    """Returnerer en kopi af watchlisten {ticker: navn}."""
+    return ticker_registry.all()
 
 def save_tickers(tickers):
-    print(f"Debug: save_tickers kaldt med tickers: {list(tickers.keys())}")
-    for attempt in range(3):
-        try:
-            with open(ticker_file, 'w') as file:
-                tickers = {normalize_ticker(ticker): company for ticker, company in tickers.items()}
-                json.dump(tickers, file, indent=4, sort_keys=True)
-                file.flush()
-                os.fsync(file.fileno()) # Tving skrivning til disk (vigtigt for Docker)
-            print(f"Debug: Tickers gemt i {ticker_file}: {list(tickers.keys())}")
-            return
-        except IOError as e:
-            print(f"Debug: Forsøg {attempt + 1}/3: Fejl ved gemning af tickers i {ticker_file}: {e}. Tjek tilladelser.")
-            time.sleep(1)
-    print(f"Debug: Kunne ikke gemme tickers i {ticker_file} efter flere forsøg.")
+    """Erstatter hele watchlisten. Skrives samlet og atomisk kort efter."""
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("save_tickers kaldt med %s tickers", len(tickers))
+    ticker_registry.replace(tickers)
+
+DEFAULT_PREFERENCES = {
+    "trend_days": [5, 10, 20, 50, 100, 200],
+    "bollinger": False,
+    "timespan": "1y",
+    "show_legends": False,
+    "language": "en",
+    "candlestick": True,
+    "last_ticker": "TSLA",
+    "webgl": "auto"  # "auto": WebGL-traces over plotting.WEBGL_POINTS punkter; true/false tvinger til/fra
+}
+
+# Præferencer i hukommelsen; skrives forsinket og kun ved ændringer (se preferences.py)
+preferences_store = PreferencesStore(preferences_file, DEFAULT_PREFERENCES)
 
 def load_preferences():
-    print(f"Debug: load_preferences kaldt")
-    default_preferences = {
-        "trend_days": [5, 10, 20, 50, 100, 200],
-        "bollinger": False,
-        "timespan": "1y",
-        "show_legends": False,
-        "language": "en",
-        "candlestick": True,
-        "last_ticker": "TSLA"
-    }
-
-    if os.path.exists(preferences_file):
-        try:
-            with open(preferences_file, 'r') as file:
-                preferences = json.load(file)
-                for key, value in default_preferences.items():
-                    preferences.setdefault(key, value)
-                preferences["last_ticker"] = normalize_ticker(preferences.get("last_ticker", "TSLA"))
-                print(f"Debug: Præferencer indlæst fra {preferences_file}: {preferences}")
-                return preferences
-        except (json.JSONDecodeError, ValueError, IOError) as e:
-            print(f"Debug: Fejl ved indlæsning af {preferences_file}: {e}. Opretter ny fil med standardpræferencer.")
-            save_preferences(default_preferences)
-            return default_preferences
-    else:
-        print(f"Debug: {preferences_file} findes ikke. Opretter ny fil med standardpræferencer.")
-        save_preferences(default_preferences)
-        return default_preferences
+    """Returnerer en kopi af præferencerne fra hukommelsen (filen læses kun første gang)."""
+    preferences = preferences_store.get()
+    preferences["last_ticker"] = normalize_ticker(preferences.get("last_ticker", "TSLA"))
+    return preferences
 
 def save_preferences(preferences):
-    print(f"Debug: save_preferences kaldt med præferencer: {preferences}")
+    """Validerer og gemmer præferencerne. Uændrede præferencer skrives ikke til disk."""
     validated_preferences = preferences.copy()
     valid_trend_days = [5, 10, 20, 50, 100, 200]
 
@@ -769,78 +1034,203 @@ def save_preferences(preferences):
     ]
     if not validated_preferences["trend_days"]:
         validated_preferences["trend_days"] = valid_trend_days
-        print(f"Debug: trend_days var tom eller ugyldig. Bruger standard: {valid_trend_days}")
+        log.debug("trend_days var tom eller ugyldig. Bruger standard: %s", valid_trend_days)
 
     # Valider last_ticker
     validated_preferences["last_ticker"] = normalize_ticker(validated_preferences.get("last_ticker", "TSLA"))
     if not validated_preferences["last_ticker"]:
         validated_preferences["last_ticker"] = "TSLA"
-        print(f"Debug: last_ticker var tom eller ugyldig. Bruger standard: TSLA")
+        log.debug("last_ticker var tom eller ugyldig. Bruger standard: TSLA")
+
+    # Valider webgl
+    if validated_preferences.get("webgl", "auto") not in ("auto", True, False):
+        log.debug("webgl var ugyldig (%s). Bruger standard: auto", validated_preferences["webgl"])
+        validated_preferences["webgl"] = "auto"
+
+    if preferences_store.update(validated_preferences):
+        log.debug("Præferencer ændret; gemmes i %s om %.0f sekunder: %s", preferences_file, preferences_store.delay, validated_preferences)
+
+def _scan_result(ticker, df):
+    """Returnerer et lille resultat-dict hvis sidste række har et købssignal, ellers None."""
+    if df is None or df.empty or 'signal' not in df:
+        return None
+
+    # Tjek sidste række for signal
+    last = df.iloc[-1]
 
-    print(f"Debug: Forsøger at gemme validerede præferencer i {preferences_file}: {validated_preferences}")
+    if last['signal'] == 1:
+        sig_type = 'STRONG'
+    elif last['signal'] == 2:
+        sig_type = 'CAUTIOUS'
+    else:
+        return None
+
+    # Rene Python-typer, så resultatet er billigt at sende tilbage fra en worker-proces
+    return {
+        'ticker': ticker,
+        'price': float(last['Close']),
+        'extension': float(last.get('extension_pc', 0)),
+        'breakout': bool(last.get('near_breakout', False)),
+        'volume': bool(last.get('high_volume', False)),
+        'type': sig_type
+    }
+
+def _evaluate_history(ticker, name, history):
+    """
+    Beregner indikatorer på rå historik og evaluerer sidste signal.
+    Returnerer (resultat, sekunder brugt på beregningen).
+    """
+    with span('scan.indicators') as timer:
+        try:
+            # Kun nye bars beriges, hvis der er en gemt indikator-tilstand; ellers beregnes alt
+            rows = extend_indicators(ticker, history)
+            if rows is None:
+                rows = compute_indicators(history.copy(), name)
+                save_indicator_checkpoint(ticker, rows)
+            result = _scan_result(ticker, rows)
+        except Exception as e:
+            log.warning("Fejl ved scanning af %s: %s", ticker, e)
+            result = None
+    return result, timer.seconds
+
+SCAN_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+def _history_to_arrays(history):
+    """Pakker OHLCV til NumPy-arrays (UTC-nanosekunder + float-matrix), som er billige at sende til en proces."""
+    index = history.index
+    tz = str(index.tz) if index.tz is not None else None
+    return index.asi8, tz, history[SCAN_COLUMNS].to_numpy(dtype=np.float64)
+
+def _evaluate_arrays(ticker, name, index_ns, tz, values):
+    """Kører i en worker-proces: genopbygger datasættet fra arrays og evaluerer sidste signal (som _evaluate_history)."""
+    index = pd.DatetimeIndex(index_ns.view('datetime64[ns]'))
+    if tz is not None:
+        index = index.tz_localize('UTC').tz_convert(tz)
+    history = pd.DataFrame(values, index=index, columns=SCAN_COLUMNS)
+    return _evaluate_history(ticker, name, history)
+
+def _fetch_single(ticker):
+    """Henter fuld historik for én ticker med samme retry-logik som get_full_stock_data."""
     for attempt in range(3):
         try:
-            with open(preferences_file, 'w') as file:
-                json.dump(validated_preferences, file, indent=4)
-            print(f"Debug: Præferencer gemt succesfuldt i {preferences_file}: {validated_preferences}")
-            return
-        except PermissionError as e:
-            print(f"Debug: Forsøg {attempt + 1}/3: Manglende tilladelser til at skrive til {preferences_file}: {e}")
-            time.sleep(1)
-        except IOError as e:
-            print(f"Debug: Forsøg {attempt + 1}/3: IOError ved gemning af præferencer i {preferences_file}: {e}")
-            time.sleep(1)
+            return fetch_full_history(ticker)
+        except RateLimitExceeded:
+            log_every(log, 10, logging.WARNING, "Rate limit nået for %s (forsøg %s/3)", ticker, attempt + 1)
+        except Exception as e:
+            log.warning("Fejl ved hentning af %s: %s", ticker, e)
+            return None
+    return None
+
+def _fetch_chunk(chunk, batch_size):
+    """Henter historik for én gruppe tickers. Tickers der mangler i batchen hentes enkeltvis."""
+    histories = {}
+    if batch_size > 1:
+        try:
+            histories = fetch_histories_batch(chunk)
         except Exception as e:
-            print(f"Debug: Forsøg {attempt + 1}/3: Uventet fejl ved gemning af præferencer: {e}")
-            time.sleep(1)
-    print(f"Debug: Kunne ikke gemme præferencer i {preferences_file} efter flere forsøg.")
+            log.warning("Batch-hentning fejlede for %s tickers: %s. Henter enkeltvis.", len(chunk), e)
 
-def scan_for_buy_signals():
+    for ticker in chunk:
+        if ticker not in histories:
+            history = _fetch_single(ticker)
+            if history is not None and not history.empty:
+                histories[ticker] = history
+    return histories
+
+def _timed_fetch_chunk(chunk, batch_size):
+    """
+    Som _fetch_chunk, men returnerer også hentetiden pr. ticker. Ved batch-hentning
+    er det gruppens samlede tid delt ligeligt mellem dens tickers.
+    """
+    with span('scan.fetch') as timer:
+        histories = _fetch_chunk(chunk, batch_size)
+    return histories, timer.seconds / max(len(chunk), 1)
+
+def _scan_chunk(chunk, tickers_map, batch_size):
+    """
+    Henter og evaluerer én gruppe tickers i den aktuelle tråd.
+    Returnerer (ticker, resultat, hentetid, beregningstid) i samme rækkefølge som chunk.
+    """
+    histories, fetch_seconds = _timed_fetch_chunk(chunk, batch_size)
+    # Navnet kommer fra tickers_map, så der spares et info-kald pr. ticker
+    scanned = []
+    for ticker in chunk:
+        if ticker in histories:
+            result, seconds = _evaluate_history(ticker, tickers_map[ticker], histories[ticker])
+            scanned.append((ticker, result, fetch_seconds, seconds))
+    return scanned
+
+def _process_context():
+    """forkserver hvor den findes (Linux/macOS), ellers spawn (Windows)."""
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+def _init_scan_worker(provider_name, provider_root):
+    """
+    Kører ved start af hver worker-proces. forkserver/spawn arver ikke set_provider(),
+    så workeren sætter samme udbyder (og dermed samme cache-mapper) som hovedprocessen.
+    """
+    set_provider(create_provider(provider_name, root=provider_root))
+
+def scan_for_buy_signals(batch_size=50, workers=4, processes=0, timing_rows=20):
     """
     Scanner alle tickers i tickers.json for aktive købssignaler.
-    Udskriver en pæn liste til terminalen.
+    Historik hentes i grupper af batch_size tickers med ét download-kald;
+    batch_size=1 henter én ticker ad gangen som før. Grupperne hentes af
+    workers tråde, som alle går gennem udbyderens fælles rate limiter.
+    Med processes > 1 sendes indikator-beregningen (CPU-tung) til en
+    ProcessPoolExecutor, så alle kerner bruges. Resultatet er altid i ticker-rækkefølge.
+    Udskriver en pæn liste til terminalen, efterfulgt af de timing_rows langsomste
+    tickers (0 = ingen tidstabel).
     """
     print("\n" + "="*60)
     print("STARTER MARKEDS-SCANNING FOR KØBSSIGNALER")
     print("="*60 + "\n")
 
     tickers_map = load_tickers()
-    results = []
-
-    for ticker in tickers_map:
-        try:
-            # Hent data (bruger 6mo for at være sikker på nok data til beregning)
-            # Vi ignorerer navnet her, da vi har det fra tickers_map
-            df, _ = get_stock_data(ticker, "6mo")
+    tickers = list(tickers_map)
+    batch_size = max(batch_size, 1)
+    chunks = [tickers[i:i + batch_size] for i in range(0, len(tickers), batch_size)]
+    scanned = []
+
+    if processes > 1:
+        # Processerne startes først ved første submit, hvor hente-trådene kører og kan holde
+        # låse (rate limiter, logging, HTTP); fork kan så give dødlås. forkserver/spawn arver ingen låse.
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as fetch_pool, \
+                ProcessPoolExecutor(max_workers=processes, mp_context=_process_context(), initializer=_init_scan_worker,
+                                    initargs=(get_provider().name, getattr(get_provider(), 'root', None))) as compute_pool:
+            pending = []
+            # Hentning kører i tråde; hver færdig gruppe sendes straks videre til processerne
+            fetched = fetch_pool.map(lambda chunk: _timed_fetch_chunk(chunk, batch_size), chunks)
+            for chunk, (histories, fetch_seconds) in zip(chunks, fetched):
+                for ticker in chunk:
+                    if ticker in histories:
+                        arrays = _history_to_arrays(histories[ticker])
+                        future = compute_pool.submit(_evaluate_arrays, ticker, tickers_map[ticker], *arrays)
+                        pending.append((ticker, fetch_seconds, future))
+            for ticker, fetch_seconds, future in pending:
+                result, seconds = future.result()
+                scanned.append((ticker, result, fetch_seconds, seconds))
+    elif workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # map bevarer rækkefølgen, så resultatlisten er deterministisk
+            for chunk_results in executor.map(lambda chunk: _scan_chunk(chunk, tickers_map, batch_size), chunks):
+                scanned.extend(chunk_results)
+    else:
+        for chunk in chunks:
+            scanned.extend(_scan_chunk(chunk, tickers_map, batch_size))
 
-            if df is None or df.empty or 'signal' not in df:
-                continue
+    results = [result for _, result, _, _ in scanned if result]
+    for res in results:
+        if res['type'] == 'STRONG':
+            print(f">>> MATCH: {res['ticker']} har et aktivt KØB signal!")
+        else:
+            print(f">>> MATCH: {res['ticker']} har et FORSIGTIGT KØB signal!")
 
-            # Tjek sidste række for signal
-            last = df.iloc[-1]
-
-            if last['signal'] == 1:
-                print(f">>> MATCH: {ticker} har et aktivt KØB signal!")
-                results.append({
-                    'ticker': ticker,
-                    'price': last['Close'],
-                    'extension': last.get('extension_pc', 0),
-                    'breakout': last.get('near_breakout', False),
-                    'volume': last.get('high_volume', False),
-                    'type': 'STRONG'
-                })
-            elif last['signal'] == 2:
-                print(f">>> MATCH: {ticker} har et FORSIGTIGT KØB signal!")
-                results.append({
-                    'ticker': ticker,
-                    'price': last['Close'],
-                    'extension': last.get('extension_pc', 0),
-                    'breakout': last.get('near_breakout', False),
-                    'volume': last.get('high_volume', False),
-                    'type': 'CAUTIOUS'
-                })
-        except Exception as e:
-            print(f"Fejl ved scanning af {ticker}: {e}")
+    provider = get_provider()
+    if provider.limiter is not None:
+        limiter = provider.limiter.stats()
+        log.debug("Kald til %s: %s, rate limits: %s, ventetid: %.1fs", provider.name, limiter['requests'], limiter['throttled'], limiter['waited'])
 
     print("\n" + "="*60)
     print(f"SCANNING RESULTAT: {len(results)} AKTIER MED KØBSSIGNAL")
@@ -855,4 +1245,22 @@ def scan_for_buy_signals():
         print(f"{res['ticker']:<10} {type_str:<10} {res['price']:<10.2f} {res['extension']:<10.2f} {brk:<10} {vol:<10}")
     print("="*60 + "\n")
 
-    return results
\ No newline at end of file
+    if timing_rows:
+        _print_scan_timings(scanned, timing_rows)
+
+    return results
+
+def _print_scan_timings(scanned, rows):
+    """Tidstabel for de langsomste tickers i scanningen (hentning + indikatorer)."""
+    slowest = sorted(scanned, key=lambda entry: entry[2] + entry[3], reverse=True)[:rows]
+    fetch_total = sum(entry[2] for entry in scanned)
+    compute_total = sum(entry[3] for entry in scanned)
+    print(f"TIDSFORBRUG: {len(slowest)} LANGSOMSTE AF {len(scanned)} TICKERS")
+    print("-" * 60)
+    print(f"{'TICKER':<10} {'HENT (s)':<12} {'INDIKATORER (s)':<16} {'I ALT (s)':<10}")
+    print("-" * 60)
+    for ticker, _, fetch_seconds, compute_seconds in slowest:
+        print(f"{ticker:<10} {fetch_seconds:<12.3f} {compute_seconds:<16.3f} {fetch_seconds + compute_seconds:<10.3f}")
+    print("-" * 60)
+    print(f"{'SUM':<10} {fetch_total:<12.3f} {compute_total:<16.3f} {fetch_total + compute_total:<10.3f}")
+    print("="*60 + "\n")
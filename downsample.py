@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Visuel nedsampling af lange tidsserier før de sendes til browseren.
+
+En graf kan ikke vise flere punkter end den har pixels, så for 'max' og '10y'
+sendes højst ét punkt pr. pixel: linjer med LTTB (Largest-Triangle-Three-Buckets,
+som bevarer toppe og bunde), candles som OHLC-spande og volumen som summer pr.
+spand. Markører (signaler, breakouts) nedsamples aldrig.
+"""
+import numpy as np
+
+# Punkter når viewport-bredden ikke kendes, og grænser for hvad bredden kan give
+DEFAULT_POINTS = 1500
+MIN_POINTS = 300
+MAX_POINTS = 4000
+# Pixels pr. candle/volumen-søjle, så søjlerne stadig kan ses
+BAR_PIXELS = 3
+
+
+def points_for_width(width, pixels_per_point=1):
+    """Højst antal punkter pr. trace for en graf der er width pixels bred."""
+    if not width:
+        return DEFAULT_POINTS // pixels_per_point
+    return int(min(max(int(width) // pixels_per_point, MIN_POINTS // pixels_per_point), MAX_POINTS))
+
+
+def lttb_indices(y, threshold, keep=None):
+    """
+    Positioner (sorteret) for de threshold punkter LTTB vælger af y.
+    NaN (f.eks. opvarmningen af et glidende gennemsnit) springes over.
+    keep: positioner der altid skal med (f.eks. datoer med signal-markører).
+    """
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(np.isfinite(y))
+    n = len(valid)
+    if threshold < 3 or n <= threshold:
+        selected = valid
+    else:
+        values = y[valid]
+        # Spande for punkterne mellem første og sidste; x er positionen i serien
+        edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+        picked = np.empty(threshold, dtype=np.int64)
+        picked[0], picked[-1] = 0, n - 1
+        # Gennemsnit af hver spand (til "næste spand" i trekanten), via kumulative summer
+        sums = np.concatenate(([0.0], np.cumsum(values)))
+        bounds = np.append(edges, n)
+        avg_x = (bounds[1:] - 1 + bounds[:-1]) / 2.0
+        avg_y = (sums[bounds[1:]] - sums[bounds[:-1]]) / (bounds[1:] - bounds[:-1])
+        # Spandene er små (n / threshold punkter), så en ren Python-løkke er hurtigere end NumPy pr. spand
+        ys, edges_list, next_x, next_y = values.tolist(), edges.tolist(), avg_x.tolist(), avg_y.tolist()
+        a = 0
+        for i in range(threshold - 2):
+            ay = ys[a]
+            dx, dy = a - next_x[i + 1], next_y[i + 1] - ay
+            best_area = -1.0
+            for j in range(edges_list[i], edges_list[i + 1]):
+                area = abs(dx * (ys[j] - ay) - (a - j) * dy)
+                if area > best_area:
+                    best_area, best = area, j
+            a = best
+            picked[i + 1] = a
+        selected = valid[picked]
+    if keep is not None and len(keep):
+        selected = np.union1d(selected, np.asarray(keep, dtype=np.int64))
+    return selected
+
+
+def bucket_starts(n, buckets):
+    """Startpositioner for buckets lige store spande af n punkter."""
+    buckets = max(min(buckets, n), 1)
+    return np.unique(np.linspace(0, n, buckets + 1).astype(np.int64)[:-1])
+
+
+def ohlc_buckets(data, buckets):
+    """
+    OHLC(+Volume) samlet i spande: første Open, højeste High, laveste Low, sidste Close
+    og summen af Volume. Index er første dato i hver spand. Returnerer data uændret
+    hvis der allerede er få nok rækker.
+    """
+    n = len(data)
+    if n <= buckets:
+        return data
+    starts = bucket_starts(n, buckets)
+    ends = np.append(starts[1:], n) - 1
+    columns = {
+        'Open': data['Open'].to_numpy()[starts],
+        'High': np.maximum.reduceat(data['High'].to_numpy(dtype=np.float64), starts),
+        'Low': np.minimum.reduceat(data['Low'].to_numpy(dtype=np.float64), starts),
+        'Close': data['Close'].to_numpy()[ends],
+    }
+    if 'Volume' in data:
+        columns['Volume'] = np.add.reduceat(data['Volume'].to_numpy(dtype=np.float64), starts)
+    return data.iloc[starts][[]].assign(**columns)
+
+
+def sum_buckets(values, buckets):
+    """(startpositioner, summer) for values samlet i spande."""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) <= buckets:
+        return np.arange(len(values)), values
+    starts = bucket_starts(len(values), buckets)
+    return starts, np.add.reduceat(values, starts)
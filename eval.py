@@ -1,14 +1,20 @@
-import yfinance as yf
 import json
 import pandas as pd
 import argparse
+from data import provider_call
+from providers import set_provider, create_provider
+from indicators import rolling_means
 
 # Opsæt kommandolinjeparametre
 parser = argparse.ArgumentParser(description="Analysér aktier og giv køb/hold/salg-anbefalinger.")
 parser.add_argument("--debug", action="store_true", help="Vis detaljeret debug-information.")
 parser.add_argument("--lang", choices=["da", "en"], default="da", help="Sprog for output (da: dansk, en: engelsk).")
+parser.add_argument("--provider", choices=["yahoo", "local"], help="Dataudbyder (local: offline fixtures/syntetiske data).")
 args = parser.parse_args()
 
+if args.provider:
+    set_provider(create_provider(args.provider))
+
 # Oversættelse af scores til tekst
 SCORE_TEXT = {
     "da": {5: "Stærk Køb", 4: "Køb", 3: "Hold", 2: "Sælg", 1: "Stærk Sælg"},
@@ -34,8 +40,8 @@ if args.debug:
 
 def analyze_stock(ticker):
     try:
-        # Download data med auto_adjust=True for at matche stocks.py
-        df = yf.download(ticker, period="6mo", interval="1d", progress=False, auto_adjust=True)
+        # Dagsdata (auto-justeret som i stocks.py) fra den aktive udbyder, gennem dens rate limiter
+        df = provider_call('history', ticker, period="6mo")
         
         # Valider data
         if df.empty:
@@ -65,7 +71,7 @@ def analyze_stock(ticker):
             return None
 
         # Beregn 50-dages glidende gennemsnit med min_periods=1 for at matche stocks.py
-        df['MA50'] = df['Close'].rolling(window=50, min_periods=1).mean()
+        df['MA50'] = rolling_means(df['Close'].to_numpy(dtype=float), (50,), min_periods=1)[50]
 
         # Tjek for NaN
         if df[['Close', 'MA50']].iloc[-2:].isna().any().any():
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Lokalt lager for nøgletal (Ticker.info) med én JSON-fil pr. ticker.
+
+data.get_fundamentals henter info én gang pr. ticker og dag og gemmer den her,
+så navn, P/E, beta og preview alle læser fra samme post.
+"""
+import json
+import os
+import threading
+import time
+
+from logger import get_logger
+from providers import get_provider
+
+log = get_logger(__name__)
+
+fundamentals_dir = "fundamentals_cache"
+
+
+def _fundamentals_path(ticker):
+    # Én mappe pr. udbyder, så offline-nøgletal aldrig vises som Yahoo's
+    return os.path.join(fundamentals_dir, get_provider().cache_namespace, f"{ticker}.json")
+
+
+def load_fundamentals(ticker):
+    """Returnerer (info, alder i sekunder) for ticker eller (None, None), hvis intet er gemt."""
+    path = _fundamentals_path(ticker)
+    if not os.path.exists(path):
+        return None, None
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            record = json.load(file)
+        return record['info'], time.time() - record['fetched_at']
+    except Exception as e:
+        log.warning("Fejl ved indlæsning af nøgletal for %s fra %s: %s", ticker, path, e)
+        return None, None
+
+
+def save_fundamentals(ticker, info):
+    """Gemmer info atomisk (temp-fil + rename) sammen med hentetidspunktet."""
+    path = _fundamentals_path(ticker)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # Pr. proces og tråd: prefetch og web-workers gemmer samtidig
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            # default=str: enkelte info-felter kan være typer som json ikke kender
+            json.dump({'fetched_at': time.time(), 'info': info}, file, default=str)
+        os.replace(tmp_path, path)
+        log.debug("save_fundamentals gemte %s felter for %s i %s", len(info), ticker, path)
+    except Exception as e:
+        log.warning("Fejl ved gemning af nøgletal for %s i %s: %s", ticker, path, e)
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Lokalt OHLCV-lager med én fil pr. ticker.
+
+get_stock_data læser herfra først og henter kun de bars fra Yahoo, der er
+kommet til siden sidst, i stedet for at hente hele 'max'-historikken hver gang.
+Ved siden af historikken gemmes indikator-tilstanden (indicators.IndicatorState),
+så nye bars kan beriges uden at genberegne alt. Hver udbyder har sin egen
+undermappe (providers.MarketDataProvider.cache_namespace); Yahoo bruger roden.
+"""
+import os
+import pickle
+import threading
+import pandas as pd
+
+from logger import get_logger
+from providers import get_provider
+
+log = get_logger(__name__)
+
+history_dir = "history_cache"
+
+
+def _cache_dir():
+    # Én mappe pr. udbyder, så f.eks. syntetiske offline-kurser aldrig læses som Yahoo-historik
+    return os.path.join(history_dir, get_provider().cache_namespace)
+
+
+def _history_path(ticker):
+    return os.path.join(_cache_dir(), f"{ticker}.pkl")
+
+
+def load_history(ticker):
+    """Returnerer gemt OHLCV-historik for ticker eller None, hvis intet er gemt."""
+    path = _history_path(ticker)
+    if not os.path.exists(path):
+        return None
+    try:
+        df = pd.read_pickle(path)
+        log.debug("load_history indlæste %s rækker for %s fra %s", len(df), ticker, path)
+        return df
+    except Exception as e:
+        log.warning("Fejl ved indlæsning af historik for %s fra %s: %s", ticker, path, e)
+        return None
+
+
+def save_history(ticker, df):
+    """Gemmer historikken atomisk (temp-fil + rename), så en afbrudt skrivning ikke efterlader en halv fil."""
+    if df is None or df.empty:
+        return
+    path = _history_path(ticker)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # Pr. proces og tråd: scan-workers gemmer samtidig
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+        log.debug("save_history gemte %s rækker for %s i %s", len(df), ticker, path)
+    except Exception as e:
+        log.warning("Fejl ved gemning af historik for %s i %s: %s", ticker, path, e)
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def _state_path(ticker):
+    return os.path.join(_cache_dir(), f"{ticker}.state.pkl")
+
+
+def load_indicator_state(ticker):
+    """Returnerer den gemte indikator-tilstand for ticker eller None."""
+    path = _state_path(ticker)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+    except Exception as e:
+        log.warning("Fejl ved indlæsning af indikator-tilstand for %s fra %s: %s", ticker, path, e)
+        return None
+
+
+def save_indicator_state(ticker, record):
+    """Gemmer indikator-tilstanden atomisk (temp-fil + rename)."""
+    path = _state_path(ticker)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(record, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        log.warning("Fejl ved gemning af indikator-tilstand for %s i %s: %s", ticker, path, e)
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def _as_tz(df, tz):
+    """df med indekset i tidszonen tz (None = naive datoer i df's egen lokaltid)."""
+    if df.index.tz is None:
+        return df if tz is None else df.tz_localize(tz)
+    return df.tz_localize(None) if tz is None else df.tz_convert(tz)
+
+
+def merge_history(stored, new):
+    """
+    Lægger nye bars oven i de gemte. Ved overlap vinder de nye (f.eks. en ufærdig dagsbar).
+    Bars er daglige, så overlap afgøres på kalenderdatoen i de gemte bars' tidszone;
+    et batch-download og et enkelt-kald med forskelligt tidsstempel for samme dag giver én bar.
+    """
+    if stored is None or stored.empty:
+        return new
+    if new is None or new.empty:
+        return stored
+    merged = pd.concat([stored, _as_tz(new, stored.index.tz)])
+    merged = merged[~merged.index.normalize().duplicated(keep='last')]
+    return merged.sort_index()
+
+
+def history_is_consistent(stored, new):
+    """
+    Tjekker at den første overlappende bar er uændret.
+    Yahoo justerer hele historikken ved udbytte og splits, og så passer
+    de gemte kurser ikke længere med de nye - så skal alt hentes forfra.
+    """
+    if stored is None or stored.empty or new is None or new.empty:
+        return True
+    new = _as_tz(new, stored.index.tz)
+    # Udbytte/split på en bar vi ikke har set før betyder at ældre kurser er justeret
+    fresh = new.loc[~new.index.isin(stored.index)]
+    for col in ('Stock Splits', 'Dividends'):
+        if col in fresh and (fresh[col].fillna(0) != 0).any():
+            return False
+    overlap = new.index.intersection(stored.index)
+    if len(overlap) == 0:
+        return True
+    first = overlap[0]
+    old_close = stored.at[first, 'Close']
+    new_close = new.at[first, 'Close']
+    if pd.isna(old_close) or pd.isna(new_close):
+        return True
+    return abs(old_close - new_close) <= 1e-6 * max(abs(old_close), 1.0)
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Fælles motor for glidende gennemsnit.
+
+Alle SMA'er ligger i kolonnerne sma<n> (f.eks. sma5, sma200) med fuldt vindue
+og NaN i opvarmningen, som ta.sma. Alle manglende vinduer beregnes i ét
+gennemløb med kumulative summer, og et vindue der allerede findes, beregnes
+aldrig igen.
+
+MACD (EMA 12/26, signal 9) ligger i macd, macd_signal og macd_hist.
+
+IndicatorState holder den løbende tilstand (vinduessummer, EMA'er, Wilder-
+gennemsnit for RSI/ATR, 20-dages top osv.), så nye bars kan lægges til i
+konstant tid i stedet for at genberegne hele historikken.
+"""
+import math
+from collections import deque
+
+import numpy as np
+
+# Vinduer som signaler og trend-linjer i UI'et bruger
+SMA_WINDOWS = (5, 10, 20, 50, 100, 200)
+
+
+def sma_column(window):
+    return f"sma{window}"
+
+
+def rolling_means(values, windows, min_periods=None):
+    """
+    Glidende gennemsnit for alle vinduer i ét kumulativ-sum-gennemløb.
+    Som pandas rolling(vindue, min_periods).mean(): et vindue med færre end min_periods
+    gyldige værdier (standard: hele vinduet) giver NaN. Returnerer {vindue: ndarray}.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    # Centrering holder de kumulative summer små og dermed afrundingsfejlen lav
+    offset = values[valid].mean() if valid.any() else 0.0
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values - offset, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+
+    means = {}
+    ends = np.arange(1, len(values) + 1)
+    for window in windows:
+        starts = np.maximum(ends - window, 0)
+        window_sums = sums[ends] - sums[starts]
+        window_counts = counts[ends] - counts[starts]
+        required = max(window if min_periods is None else min_periods, 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means[window] = np.where(window_counts >= required, window_sums / window_counts + offset, np.nan)
+    return means
+
+
+def add_sma(df, windows=SMA_WINDOWS, close=None):
+    """
+    Tilføjer de sma<n>-kolonner der mangler i df (på stedet) og returnerer df.
+    close: serie at beregne på; som standard df['Close'] (eller df['close']).
+    """
+    missing = [w for w in dict.fromkeys(windows) if sma_column(w) not in df]
+    if not missing:
+        return df
+    if close is None:
+        close = df['Close'] if 'Close' in df else df['close']
+    for window, values in rolling_means(close.to_numpy(dtype=np.float64), missing).items():
+        df[sma_column(window)] = values
+    return df
+
+
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+
+
+def macd(close):
+    """Returnerer (macd, signal, histogram) for close-serien."""
+    line = close.ewm(span=MACD_FAST, adjust=False).mean() - close.ewm(span=MACD_SLOW, adjust=False).mean()
+    signal = line.ewm(span=MACD_SIGNAL, adjust=False).mean()
+    return line, signal, line - signal
+
+
+def add_macd(df, close=None):
+    """Tilføjer macd, macd_signal og macd_hist til df, hvis de mangler. Returnerer df."""
+    if 'macd' in df:
+        return df
+    if close is None:
+        close = df['Close'] if 'Close' in df else df['close']
+    df['macd'], df['macd_signal'], df['macd_hist'] = macd(close)
+    return df
+
+
+def _ema_alpha(span):
+    return 2.0 / (span + 1)
+
+
+RSI_LENGTH = 14
+ATR_LENGTH = 14
+VOLUME_WINDOW = 20
+HIGH_WINDOW = 20
+# long_term_low: andel af de sidste 60 dage under sma200 (mindst 20 dage)
+LOW_WINDOW = 60
+LOW_MIN_PERIODS = 20
+
+
+class IndicatorState:
+    """
+    Løbende tilstand for de numeriske indikatorer efter baren as_of.
+    update() lægger én bar til i konstant tid og returnerer bar-værdierne med
+    samme kolonnenavne som den fulde beregning (sma<n>, RSI, ATR, macd*,
+    vol_avg_20, 20d_high, below_sma200, long_term_low).
+    """
+    # Øges når tilstanden får nye felter, så gamle gemte tilstande kasseres
+    version = 2
+
+    def __init__(self, windows=SMA_WINDOWS):
+        self.windows = tuple(windows)
+        self.as_of = None
+        self.closes = deque(maxlen=max(self.windows))
+        self.sums = {window: 0.0 for window in self.windows}
+        self.volumes = deque(maxlen=VOLUME_WINDOW)
+        self.volume_sum = 0.0
+        self.highs = deque(maxlen=HIGH_WINDOW)
+        self.below = deque(maxlen=LOW_WINDOW)
+        self.gain_avg = None
+        self.loss_avg = None
+        self.atr = None
+        self.ema_fast = None
+        self.ema_slow = None
+        self.macd_signal = None
+
+    @classmethod
+    def from_frame(cls, frame, windows=SMA_WINDOWS):
+        """
+        Tilstand efter sidste række i et beriget datasæt (OHLCV + ATR, macd_signal og below_sma200).
+        Returnerer None hvis halen indeholder huller (NaN), så tilstanden ikke kan bruges.
+        """
+        state = cls(windows)
+        close = frame['Close']
+        closes = close.to_numpy(dtype=np.float64)[-state.closes.maxlen:]
+        volumes = frame['Volume'].to_numpy(dtype=np.float64)[-VOLUME_WINDOW:]
+        highs = frame['High'].to_numpy(dtype=np.float64)[-HIGH_WINDOW:]
+        atr = float(frame['ATR'].iloc[-1])
+        if np.isnan(closes).any() or np.isnan(volumes).any() or np.isnan(highs).any() or math.isnan(atr):
+            return None
+
+        state.as_of = frame.index[-1]
+        state.closes.extend(closes.tolist())
+        for window in state.windows:
+            state.sums[window] = float(closes[-window:].sum())
+        state.volumes.extend(volumes.tolist())
+        state.volume_sum = float(volumes.sum())
+        state.highs.extend(highs.tolist())
+        state.below.extend(frame['below_sma200'].to_numpy(dtype=bool)[-LOW_WINDOW:].tolist())
+        # Samme Wilder-gennemsnit (RMA) som ta.rsi: ewm(alpha=1/n, adjust=False) af op/ned-bevægelser
+        diff = close.diff()
+        alpha = 1.0 / RSI_LENGTH
+        state.gain_avg = float(diff.clip(lower=0).ewm(alpha=alpha, adjust=False).mean().iloc[-1])
+        state.loss_avg = float(diff.clip(upper=0).ewm(alpha=alpha, adjust=False).mean().iloc[-1])
+        state.atr = atr
+        state.ema_fast = float(close.ewm(span=MACD_FAST, adjust=False).mean().iloc[-1])
+        state.ema_slow = float(close.ewm(span=MACD_SLOW, adjust=False).mean().iloc[-1])
+        state.macd_signal = float(frame['macd_signal'].iloc[-1])
+        return state
+
+    def copy(self):
+        clone = IndicatorState.__new__(IndicatorState)
+        clone.__dict__.update(self.__dict__)
+        for name in ('closes', 'volumes', 'highs', 'below'):
+            setattr(clone, name, deque(getattr(self, name), maxlen=getattr(self, name).maxlen))
+        clone.sums = dict(self.sums)
+        return clone
+
+    def update(self, timestamp, high, low, close, volume):
+        """Lægger én bar til og returnerer dens indikatorværdier som dict."""
+        high, low, close, volume = float(high), float(low), float(close), float(volume)
+        values = {}
+        prev_close = self.closes[-1]
+        for window in self.windows:
+            if len(self.closes) >= window:
+                self.sums[window] -= self.closes[-window]
+            self.sums[window] += close
+        self.closes.append(close)
+        for window in self.windows:
+            values[sma_column(window)] = self.sums[window] / window if len(self.closes) >= window else math.nan
+
+        diff = close - prev_close
+        self.gain_avg += (max(diff, 0.0) - self.gain_avg) / RSI_LENGTH
+        self.loss_avg += (min(diff, 0.0) - self.loss_avg) / RSI_LENGTH
+        total = self.gain_avg + abs(self.loss_avg)
+        values['RSI'] = 100 * self.gain_avg / total if total else math.nan
+
+        true_range = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        self.atr += (true_range - self.atr) / ATR_LENGTH
+        values['ATR'] = self.atr
+
+        self.ema_fast += (close - self.ema_fast) * _ema_alpha(MACD_FAST)
+        self.ema_slow += (close - self.ema_slow) * _ema_alpha(MACD_SLOW)
+        line = self.ema_fast - self.ema_slow
+        self.macd_signal += (line - self.macd_signal) * _ema_alpha(MACD_SIGNAL)
+        values['macd'] = line
+        values['macd_signal'] = self.macd_signal
+        values['macd_hist'] = line - self.macd_signal
+
+        if len(self.volumes) == VOLUME_WINDOW:
+            self.volume_sum -= self.volumes[0]
+        self.volumes.append(volume)
+        self.volume_sum += volume
+        values['vol_avg_20'] = self.volume_sum / VOLUME_WINDOW if len(self.volumes) == VOLUME_WINDOW else math.nan
+
+        self.highs.append(high)
+        values['20d_high'] = max(self.highs) if len(self.highs) == HIGH_WINDOW else math.nan
+
+        # close < NaN er False, som i den vektoriserede beregning
+        below = bool(close < values['sma200']) if 'sma200' in values else False
+        self.below.append(below)
+        values['below_sma200'] = below
+        values['long_term_low'] = len(self.below) >= LOW_MIN_PERIODS and sum(self.below) / len(self.below) > 0.8
+
+        self.as_of = timestamp
+        return values
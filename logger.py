@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Logging for dashboardet og scanneren.
+
+Hvert modul henter sin egen logger med get_logger(__name__), og main.py sætter
+niveauet én gang med setup_logging (--debug giver DEBUG, ellers INFO). Beskeder
+formateres dovent ("%s"-argumenter), så en slået-fra debug-linje kun koster et
+niveau-tjek. Dyre argumenter (lister, DataFrame-udsnit) pakkes ind i
+log.isEnabledFor(logging.DEBUG), og beskeder fra varme stier kan begrænses med
+log_every.
+"""
+import logging
+import sys
+import threading
+import time
+
+ROOT_LOGGER = "stocksdash"
+
+
+def get_logger(name):
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def setup_logging(debug=False):
+    """Sender log til stderr; DEBUG med --debug, ellers INFO."""
+    root = logging.getLogger(ROOT_LOGGER)
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s", "%H:%M:%S"))
+        root.addHandler(handler)
+        root.propagate = False
+    root.setLevel(logging.DEBUG if debug else logging.INFO)
+    return root
+
+
+_last_logged = {}
+_last_logged_lock = threading.Lock()
+
+
+def log_every(logger, interval, level, msg, *args):
+    """
+    Logger msg højst én gang pr. interval sekunder (pr. logger og besked-skabelon).
+    Bruges til beskeder der ellers ville gentages for hver ticker eller hvert callback.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    key = (logger.name, msg)
+    now = time.monotonic()
+    with _last_logged_lock:
+        if now - _last_logged.get(key, float('-inf')) < interval:
+            return
+        _last_logged[key] = now
+    logger.log(level, msg, *args)
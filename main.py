@@ -3,10 +3,15 @@
 
 
 import argparse
+import os
 import sys
 import requests
 from app import create_app
-from data import scan_for_buy_signals
+from data import scan_for_buy_signals, prefetch_fundamentals, load_tickers, enable_copy_on_write
+from providers import get_provider, set_provider, create_provider
+from logger import setup_logging
+from warmer import CacheWarmer
+from server import run_production, DEFAULT_THREADS
 
 class Tee:
     """Hjælpe-klasse der skriver til både terminal og fil samtidig"""
@@ -77,11 +82,35 @@ def send_notification(results):
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Stock Analysis Dashboard")
-    parser.add_argument('--debug', action='store_true', help="Run in debug mode")
+    parser.add_argument('--debug', action='store_true', help="Run in debug mode (also enables debug logging)")
     parser.add_argument('--scan', action='store_true', help="Scan all tickers for BUY signals")
+    parser.add_argument('--prefetch', action='store_true', help="Fetch fundamentals (name, P/E, beta) for every ticker in tickers.json")
+    parser.add_argument('--batch-size', type=int, default=50, help="Tickers per batched download when scanning (1 = one at a time)")
+    parser.add_argument('--workers', type=int, default=4, help="Parallel fetch workers when scanning")
+    parser.add_argument('--processes', type=int, default=0, help="Worker processes for indicator calculation when scanning (0 = in the fetch threads)")
+    parser.add_argument('--rate', type=float, default=2.0, help="Max provider requests per second shared by all workers")
+    parser.add_argument('--timings', type=int, default=20, help="Show the N slowest tickers after a scan (0 = no timing table)")
+    parser.add_argument('--provider', choices=['yahoo', 'local'], help="Market data provider (local = offline fixtures/synthetic data, no network)")
+    parser.add_argument('--no-warm', action='store_true', help="Dashboard: don't pre-fetch the watchlist in the background at startup and after market close")
+    parser.add_argument('--prod', action='store_true', help="Dashboard: serve with gunicorn (several worker processes sharing an on-disk cache) instead of Flask's dev server")
+    parser.add_argument('--web-workers', type=int, default=3, help="Worker processes with --prod")
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help="Threads per worker process with --prod")
     args = parser.parse_args()
-
-    if args.scan:
+    setup_logging(debug=args.debug)
+    enable_copy_on_write()
+
+    if args.provider:
+        set_provider(create_provider(args.provider))
+    if get_provider().limiter is not None:
+        # Hver worker-proces har sin egen limiter; del raten, så de tilsammen holder --rate
+        serving = args.prod and not (args.scan or args.prefetch)
+        rate = args.rate / args.web_workers if serving else args.rate
+        get_provider().limiter.configure(rate=rate)
+
+    if args.prefetch:
+        fetched = prefetch_fundamentals(list(load_tickers()), workers=args.workers)
+        print(f"Nøgletal hentet for {fetched} tickers")
+    elif args.scan:
         with Tee("scan_results.txt"):
             print("\nFORKLARING AF KOLONNER:")
             print("-" * 60)
@@ -93,8 +122,15 @@ if __name__ == '__main__':
             print(f"{'VOLUMEN':<10} Er handelsvolumen usædvanlig høj? (HØJ/Normal)")
             print("-" * 60 + "\n")
 
-            results = scan_for_buy_signals()
+            results = scan_for_buy_signals(batch_size=args.batch_size, workers=args.workers, processes=args.processes,
+                                          timing_rows=args.timings)
             send_notification(results)
+    elif args.prod:
+        run_production(workers=args.web_workers, threads=args.threads,
+                       warm_workers=0 if args.no_warm else min(args.workers, 2))
     else:
         app = create_app()
+        # I debug-mode starter Flask's reloader processen to gange; kun barnet (WERKZEUG_RUN_MAIN) serverer
+        if not args.no_warm and (not args.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+            CacheWarmer(workers=min(args.workers, 2)).start()
         app.run(debug=args.debug, host='0.0.0.0')
\ No newline at end of file
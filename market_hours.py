@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Åbningstider for de børser vi har tickers fra.
+
+Bruges til at bestemme hvor længe cachede kurser er gyldige: kort tid mens
+markedet er åbent, og frem til næste åbning når det er lukket.
+Helligdage er ikke med - en lukket helligdag behandles som en almindelig handelsdag.
+"""
+from datetime import datetime, time as dtime, timedelta
+from zoneinfo import ZoneInfo
+
+WEEKDAYS = (0, 1, 2, 3, 4)
+SUN_TO_THU = (6, 0, 1, 2, 3)
+
+# Yahoo-suffix -> (tidszone, åbner, lukker, handelsdage). '' er amerikanske tickers uden suffix.
+EXCHANGES = {
+    '': ('America/New_York', dtime(9, 30), dtime(16, 0), WEEKDAYS),
+    'TO': ('America/Toronto', dtime(9, 30), dtime(16, 0), WEEKDAYS),
+    'CO': ('Europe/Copenhagen', dtime(9, 0), dtime(17, 0), WEEKDAYS),
+    'ST': ('Europe/Stockholm', dtime(9, 0), dtime(17, 30), WEEKDAYS),
+    'OL': ('Europe/Oslo', dtime(9, 0), dtime(16, 20), WEEKDAYS),
+    'HE': ('Europe/Helsinki', dtime(10, 0), dtime(18, 30), WEEKDAYS),
+    'DE': ('Europe/Berlin', dtime(9, 0), dtime(17, 30), WEEKDAYS),
+    'F': ('Europe/Berlin', dtime(8, 0), dtime(22, 0), WEEKDAYS),
+    'PA': ('Europe/Paris', dtime(9, 0), dtime(17, 30), WEEKDAYS),
+    'AS': ('Europe/Amsterdam', dtime(9, 0), dtime(17, 30), WEEKDAYS),
+    'BR': ('Europe/Brussels', dtime(9, 0), dtime(17, 30), WEEKDAYS),
+    'MI': ('Europe/Rome', dtime(9, 0), dtime(17, 30), WEEKDAYS),
+    'SW': ('Europe/Zurich', dtime(9, 0), dtime(17, 30), WEEKDAYS),
+    'L': ('Europe/London', dtime(8, 0), dtime(16, 30), WEEKDAYS),
+    'T': ('Asia/Tokyo', dtime(9, 0), dtime(15, 30), WEEKDAYS),
+    'KS': ('Asia/Seoul', dtime(9, 0), dtime(15, 30), WEEKDAYS),
+    'KQ': ('Asia/Seoul', dtime(9, 0), dtime(15, 30), WEEKDAYS),
+    'HK': ('Asia/Hong_Kong', dtime(9, 30), dtime(16, 0), WEEKDAYS),
+    'AX': ('Australia/Sydney', dtime(10, 0), dtime(16, 0), WEEKDAYS),
+    'SR': ('Asia/Riyadh', dtime(10, 0), dtime(15, 0), SUN_TO_THU),
+    'KW': ('Asia/Kuwait', dtime(9, 0), dtime(12, 40), SUN_TO_THU),
+}
+
+
+def exchange_for(ticker):
+    """Returnerer (tidszone, åbner, lukker, handelsdage) for ticker, eller None hvis den handles døgnet rundt."""
+    ticker = (ticker or '').upper()
+    # Valuta (EURUSD=X), futures (GC=F) og krypto (BTC-USD) har ingen fast lukketid
+    if '=' in ticker or ticker.endswith(('-USD', '-EUR', '-USDT')):
+        return None
+    suffix = ticker.rsplit('.', 1)[1] if '.' in ticker else ''
+    return EXCHANGES.get(suffix, EXCHANGES[''])
+
+
+def _now(tz_name, now):
+    tz = ZoneInfo(tz_name)
+    if now is None:
+        return datetime.now(tz)
+    return now.astimezone(tz)
+
+
+def is_market_open(ticker, now=None):
+    exchange = exchange_for(ticker)
+    if exchange is None:
+        return True
+    tz_name, opens, closes, days = exchange
+    local = _now(tz_name, now)
+    return local.weekday() in days and opens <= local.time() < closes
+
+
+def next_open(ticker, now=None):
+    """Næste åbningstidspunkt (tidszone-bevidst datetime). Er markedet åbent, returneres nu."""
+    exchange = exchange_for(ticker)
+    if exchange is None or is_market_open(ticker, now):
+        return now or datetime.now().astimezone()
+    tz_name, opens, closes, days = exchange
+    local = _now(tz_name, now)
+    day = local.date()
+    if local.time() >= opens:
+        day += timedelta(days=1)
+    while day.weekday() not in days:
+        day += timedelta(days=1)
+    return datetime.combine(day, opens, tzinfo=local.tzinfo)
+
+
+def next_close(ticker, now=None):
+    """Næste lukketidspunkt (tidszone-bevidst datetime), eller None for markeder uden lukketid."""
+    exchange = exchange_for(ticker)
+    if exchange is None:
+        return None
+    tz_name, opens, closes, days = exchange
+    local = _now(tz_name, now)
+    day = local.date()
+    if local.weekday() not in days or local.time() >= closes:
+        day += timedelta(days=1)
+        while day.weekday() not in days:
+            day += timedelta(days=1)
+    return datetime.combine(day, closes, tzinfo=local.tzinfo)
+
+
+def market_ttl(ticker, open_ttl=300, now=None):
+    """
+    Levetid i sekunder for cachede markedsdata:
+    open_ttl mens markedet er åbent, ellers frem til næste åbning.
+    """
+    if is_market_open(ticker, now):
+        return open_ttl
+    local = now or datetime.now().astimezone()
+    seconds = (next_open(ticker, now) - local).total_seconds()
+    return max(seconds, open_ttl)
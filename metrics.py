@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Tidsmålinger og tællere for de varme stier.
+
+span("navn") måler en blok, @timed("navn") en hel funktion. For hvert navn
+gemmes antal, samlet tid og længste tid, og render_prometheus() skriver det
+hele (plus cache-tællere) i Prometheus' tekstformat til /metrics.
+"""
+import threading
+import time
+from functools import wraps
+
+
+class Timer:
+    """Resultatet af en span; seconds er sat når blokken er færdig."""
+    __slots__ = ('seconds',)
+
+    def __init__(self):
+        self.seconds = 0.0
+
+
+class Metrics:
+    def __init__(self):
+        self._spans = {}  # navn -> [antal, samlet tid, længste tid]
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            entry = self._spans.get(name)
+            if entry is None:
+                self._spans[name] = [1, seconds, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+                if seconds > entry[2]:
+                    entry[2] = seconds
+
+    def inc(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def timed(self, name=None):
+        """Dekorator der måler hvert kald af funktionen (navn: name eller funktionens navn)."""
+        def decorator(func):
+            span_name = name or func.__name__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(span_name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """{'spans': {navn: {'count', 'total', 'max'}}, 'counters': {navn: værdi}}"""
+        with self._lock:
+            return {
+                'spans': {name: {'count': c, 'total': t, 'max': m} for name, (c, t, m) in self._spans.items()},
+                'counters': dict(self._counters),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+
+class _Span:
+    __slots__ = ('metrics', 'name', 'timer', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.timer = Timer()
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.timer
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timer.seconds = time.perf_counter() - self.start
+        self.metrics.observe(self.name, self.timer.seconds)
+        return False
+
+
+registry = Metrics()
+span = registry.span
+timed = registry.timed
+inc = registry.inc
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(cache_stats=(), metrics=None):
+    """
+    Prometheus-tekstformat for alle spans og tællere.
+    cache_stats: dicts som TTLCache.stats()/cache_info() (name, hits, misses, ...).
+    """
+    snapshot = (metrics or registry).snapshot()
+    lines = [
+        "# HELP stocksdash_span_seconds Tid brugt i målte kodeafsnit.",
+        "# TYPE stocksdash_span_seconds summary",
+    ]
+    spans = sorted(snapshot['spans'].items())
+    for name, span_stats in spans:
+        lines.append(f'stocksdash_span_seconds_count{{span="{_label(name)}"}} {span_stats["count"]}')
+        lines.append(f'stocksdash_span_seconds_sum{{span="{_label(name)}"}} {span_stats["total"]:.6f}')
+    lines += [
+        "# HELP stocksdash_span_seconds_max Længste enkelte måling.",
+        "# TYPE stocksdash_span_seconds_max gauge",
+    ]
+    for name, span_stats in spans:
+        lines.append(f'stocksdash_span_seconds_max{{span="{_label(name)}"}} {span_stats["max"]:.6f}')
+
+    lines += [
+        "# HELP stocksdash_events_total Hændelser talt i koden.",
+        "# TYPE stocksdash_events_total counter",
+    ]
+    for name, value in sorted(snapshot['counters'].items()):
+        lines.append(f'stocksdash_events_total{{event="{_label(name)}"}} {value}')
+
+    for key, kind in (('hits', 'counter'), ('misses', 'counter'), ('evictions', 'counter'),
+                      ('coalesced', 'counter'), ('size', 'gauge')):
+        metric = f"stocksdash_cache_{key}" + ("_total" if kind == 'counter' else "")
+        lines.append(f"# TYPE {metric} {kind}")
+        for stats in cache_stats:
+            if key in stats:
+                lines.append(f'{metric}{{cache="{_label(stats.get("name"))}"}} {stats[key]}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Mindre og hurtigere svar fra Dash-callbacks.
+
+compact_figure() gør en færdig figur JSON-klar én gang, inden den caches:
+numeriske NumPy-arrays bliver base64 typed arrays (plotly.js' "bdata"),
+datoer bliver ISO-strenge, og plotly-objekter bliver almindelige dicts. Så
+koster en cachet figur kun en hurtig json.dumps pr. svar, og NaN i data
+tvinger ikke plotly's encoder til at parse og skrive hele svaret igen.
+
+compress_response() komprimerer JSON-svar med brotli (hvis installeret) eller
+gzip, når browseren accepterer det. Er orjson installeret, bruger plotly (og
+dermed Dash) den automatisk til serialiseringen; den håndterer de rene dicts
+fra compact_figure() uden plotly's langsomme fallback.
+"""
+import base64
+import datetime
+import gzip
+
+import numpy as np
+
+from logger import get_logger
+from metrics import inc
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+log = get_logger(__name__)
+
+# Mindre svar end dette komprimeres ikke (gzip-headeren æder gevinsten)
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 5  # God balance mellem størrelse og CPU på en Raspberry Pi
+BROTLI_QUALITY = 4
+COMPRESSED_MIMETYPES = ('application/json', 'text/plain', 'text/html')
+
+
+def _typed_array(values):
+    # plotly.js typed array: {'dtype': 'f8', 'bdata': base64 af de rå little-endian bytes}
+    if values.dtype.kind in 'iu' and len(values) and values.min() >= -2**31 and values.max() < 2**31:
+        values, dtype = values.astype('<i4'), 'i4'
+    else:
+        values, dtype = values.astype('<f8'), 'f8'
+    return {'dtype': dtype, 'bdata': base64.b64encode(np.ascontiguousarray(values)).decode('ascii')}
+
+
+def _iso(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def _compact_array(values):
+    if values.ndim != 1 or values.size == 0:
+        return values.tolist()
+    kind = values.dtype.kind
+    if kind in 'iuf':
+        return _typed_array(values)
+    if kind == 'M':
+        return np.datetime_as_string(values, unit='s').tolist()
+    if kind == 'O':
+        return [_iso(value) for value in values.tolist()]
+    return values.tolist()
+
+
+def _compact(value):
+    if isinstance(value, np.ndarray):
+        return _compact_array(value)
+    if isinstance(value, dict):
+        compacted = {}
+        for key, item in value.items():
+            if key == 'range' and item is not None:
+                # Akse-intervaller skal være almindelige lister; plotly.js læser ikke typed arrays der
+                compacted[key] = [_iso(v) for v in np.asarray(item, dtype=object).tolist()]
+            else:
+                compacted[key] = _compact(item)
+        return compacted
+    if isinstance(value, (list, tuple)):
+        return [_compact(item) for item in value]
+    if hasattr(value, 'to_plotly_json'):
+        return _compact(value.to_plotly_json())
+    if isinstance(value, np.generic):
+        return value.item()
+    return _iso(value)
+
+
+def compact_figure(figure):
+    """{'data': [...], 'layout': {...}} som rene dicts/lister med typed arrays og ISO-datoer."""
+    return {'data': [_compact(trace) for trace in figure['data']], 'layout': _compact(figure['layout'])}
+
+
+def compress_response(response, accept_encodings):
+    """
+    Komprimerer et JSON/tekst-svar med br eller gzip efter Accept-Encoding. Returnerer response.
+    accept_encodings er den fortolkede header (flask.request.accept_encodings): den kodning
+    browseren vægter højest vælges, og q=0 betyder afvist.
+    """
+    if (response.direct_passthrough or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSED_MIMETYPES):
+        return response
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+    # Ved samme vægt foretrækkes br (mindre svar)
+    encoding = accept_encodings.best_match(['br', 'gzip'] if brotli is not None else ['gzip'])
+    if encoding == 'br':
+        body = brotli.compress(data, quality=BROTLI_QUALITY)
+    elif encoding == 'gzip':
+        body = gzip.compress(data, compresslevel=GZIP_LEVEL)
+    else:
+        return response
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    inc('http.bytes_raw', len(data))
+    inc('http.bytes_sent', len(body))
+    return response
@@ -1,154 +1,201 @@
 # -*- coding: utf-8 -*-
 import plotly.graph_objs as go
+import numpy as np
 import pandas as pd
+from indicators import rolling_means, sma_column, macd
+from downsample import lttb_indices
+from logger import get_logger
+from metrics import timed
 
-def plot_trends(data, trend_days_list):
+log = get_logger(__name__)
+
+# Over så mange punkter pr. trace tegnes linjer med WebGL (Scattergl) i stedet for SVG,
+# så panorering og hover stadig er flydende på 'max' og '10y'
+WEBGL_POINTS = 1000
+
+def use_webgl(points, preference="auto"):
+    """preference true/false fra user_preferences.json vinder; ellers WebGL over WEBGL_POINTS punkter."""
+    if isinstance(preference, bool):
+        return preference
+    return points > WEBGL_POINTS
+
+def line_trace(webgl=False, **kwargs):
+    """go.Scattergl eller go.Scatter med samme argumenter."""
+    return go.Scattergl(**kwargs) if webgl else go.Scatter(**kwargs)
+
+def _sampled(index, values, max_points=None):
+    """(x, y) for en linje, nedsamplet med LTTB til højst max_points punkter (None = alle)."""
+    values = np.asarray(values, dtype=np.float64)
+    if not max_points or len(values) <= max_points:
+        return index, values
+    positions = lttb_indices(values, max_points)
+    return index[positions], values[positions]
+
+@timed("plot.plot_trends")
+def plot_trends(data, trend_days_list, max_points=None, webgl=False):
+    # Brug de beregnede sma<n>-kolonner; kun manglende vinduer beregnes (uden at ændre data)
+    missing = [days for days in trend_days_list if sma_column(days) not in data]
+    computed = rolling_means(data['Close'].to_numpy(), missing) if missing else {}
     trends = []
     for days in trend_days_list:
-        # Genbrug eventuelt allerede beregnede SMA-kolonner for at undgå dobbel-beregning.
-        col_name = f'SMA{days}'
-        if col_name in data:
-            trend_data = data[col_name]
-        else:
-            trend_data = data['Close'].rolling(window=days, min_periods=1).mean()
-            # Gem beregningen i DataFrame så andre funktioner kan genbruge den
-            try:
-                data[col_name] = trend_data
-            except Exception:
-                # Hvis data er en view eller lign., spring gem-step over
-                pass
-        trends.append(go.Scatter(x=data.index, y=trend_data, mode='lines', name=f'{days}-Day MA'))
+        trend_data = data[sma_column(days)] if days not in computed else computed[days]
+        x, y = _sampled(data.index, trend_data, max_points)
+        trends.append(line_trace(webgl, x=x, y=y, mode='lines', name=f'{days}-Day MA'))
     return trends
 
-def plot_bollinger_bands(data):
+@timed("plot.plot_bollinger_bands")
+def plot_bollinger_bands(data, max_points=None, webgl=False):
     rolling_mean = data['Close'].rolling(window=20).mean()
     rolling_std = data['Close'].rolling(window=20).std()
     upper_band = rolling_mean + (rolling_std * 2)
     lower_band = rolling_mean - (rolling_std * 2)
     upper_band = upper_band.dropna()
     lower_band = lower_band.dropna()
-    upper_band_trace = go.Scatter(x=upper_band.index, y=upper_band, fill='tonexty', name='Upper Bollinger Band')
-    lower_band_trace = go.Scatter(x=lower_band.index, y=lower_band, fill='tonexty', name='Lower Bollinger Band')
+    if max_points and len(upper_band) > max_points:
+        # Samme datoer i begge bånd, så udfyldningen imellem dem passer
+        positions = np.union1d(lttb_indices(upper_band.to_numpy(), max_points // 2),
+                               lttb_indices(lower_band.to_numpy(), max_points // 2))
+        upper_band, lower_band = upper_band.iloc[positions], lower_band.iloc[positions]
+    upper_band_trace = line_trace(webgl, x=upper_band.index, y=upper_band, fill='tonexty', name='Upper Bollinger Band')
+    lower_band_trace = line_trace(webgl, x=lower_band.index, y=lower_band, fill='tonexty', name='Lower Bollinger Band')
     return upper_band_trace, lower_band_trace
 
-def plot_macd(data):
-    ema12 = data['Close'].ewm(span=12, adjust=False).mean()
-    ema26 = data['Close'].ewm(span=26, adjust=False).mean()
-    macd = ema12 - ema26
-    signal = macd.ewm(span=9, adjust=False).mean()
-    histogram = macd - signal
-    macd_trace = go.Scatter(x=data.index, y=macd, mode='lines', name='MACD')
-    signal_trace = go.Scatter(x=data.index, y=signal, mode='lines', name='Signal')
+def _column_or(data, column, compute):
+    # Genbrug kolonnen fra get_stock_data, hvis den findes; ellers beregn på udsnittet
+    return data[column] if column in data else compute()
+
+def _macd_series(data):
+    if 'macd' in data:
+        return data['macd'], data['macd_signal'], data['macd_hist']
+    return macd(data['Close'])
+
+@timed("plot.plot_macd")
+def plot_macd(data, max_points=None, webgl=False):
+    macd_line, signal, histogram = _macd_series(data)
+    macd_x, macd_y = _sampled(data.index, macd_line, max_points)
+    signal_x, signal_y = _sampled(data.index, signal, max_points)
+    histogram_x, histogram_y = _sampled(data.index, histogram, max_points)
+    macd_trace = line_trace(webgl, x=macd_x, y=macd_y, mode='lines', name='MACD')
+    signal_trace = line_trace(webgl, x=signal_x, y=signal_y, mode='lines', name='Signal')
     histogram_trace = go.Bar(
-        x=data.index,
-        y=histogram,
+        x=histogram_x,
+        y=histogram_y,
         name='Histogram',
         marker=dict(
-            color=['green' if h >= 0 else 'red' for h in histogram],
+            color=np.where(histogram_y >= 0, 'green', 'red'),
             opacity=0.5
         )
     )
     return [macd_trace, signal_trace, histogram_trace]
 
+def _breakout_inputs(data):
+    close = data['Close']
+    volume = data['Volume']
+    macd_line, signal, _ = _macd_series(data)
+    return {
+        'MA10': _column_or(data, 'sma10', lambda: close.rolling(window=10).mean()),
+        'MA20': _column_or(data, 'sma20', lambda: close.rolling(window=20).mean()),
+        'MA50': _column_or(data, 'sma50', lambda: close.rolling(window=50).mean()),
+        'AvgVol': _column_or(data, 'vol_avg_20', lambda: volume.rolling(window=20).mean()),
+        'MACD': macd_line,
+        'Signal': signal,
+    }
+
+def breakout_mask(data, inputs=None):
+    """Boolsk array med True for hver række hvor alle breakout-betingelser er opfyldt (aldrig de første 50)."""
+    inputs = inputs or _breakout_inputs(data)
+    close = data['Close']
+    ma10, ma20 = inputs['MA10'], inputs['MA20']
+    mask = (
+        (inputs['MACD'] > inputs['Signal'] + 0.01) &       # MACD over Signal med lille tærskel
+        (data['Volume'] > 1.1 * inputs['AvgVol']) &        # Volumen-spike
+        (ma10 > ma20) &
+        (ma10 > ma10.shift(1)) &                           # 10MA opadgående
+        (ma20 > ma20.shift(1)) &                           # 20MA opadgående
+        (close > inputs['MA50'])
+    ).to_numpy(dtype=bool, copy=True)
+    mask[:50] = False
+    return mask
+
+@timed("plot.plot_breakout")
 def plot_breakout(data):
+    empty = go.Scatter(x=[], y=[], mode='markers', name='Breakout'), [], False
     if len(data) < 50:
-        print(f"Debug: For faa data til breakout ({len(data)} raekker). Kraever mindst 50.")
-        return go.Scatter(x=[], y=[], mode='markers', name='Breakout'), [], False
-
-    # Beregn glidende gennemsnit og volumen-gennemsnit
-    ma10 = data['Close'].rolling(window=10).mean()
-    ma20 = data['Close'].rolling(window=20).mean()
-    ma50 = data['Close'].rolling(window=50).mean()
-    avg_volume = data['Volume'].rolling(window=20).mean()
-
-    # Beregn MACD og Signal
-    ema12 = data['Close'].ewm(span=12, adjust=False).mean()
-    ema26 = data['Close'].ewm(span=26, adjust=False).mean()
-    macd = ema12 - ema26
-    signal = macd.ewm(span=9, adjust=False).mean()
-
-    # Tjek for NaN-v�rdier
-    if any(pd.isna([ma10.iloc[-1], ma20.iloc[-1], ma50.iloc[-1], avg_volume.iloc[-1], macd.iloc[-1], signal.iloc[-1]])):
-        print(f"Debug: NaN-vaerdier fundet i beregninger: MA10={ma10.iloc[-1]}, MA20={ma20.iloc[-1]}, "
-              f"MA50={ma50.iloc[-1]}, AvgVol={avg_volume.iloc[-1]}, MACD={macd.iloc[-1]}, Signal={signal.iloc[-1]}")
-        return go.Scatter(x=[], y=[], mode='markers', name='Breakout'), [], False
-
-    print(f"Debug: MA10 (sidste 5): {ma10[-5:].to_dict()}")
-    print(f"Debug: MA20 (sidste 5): {ma20[-5:].to_dict()}")
-    print(f"Debug: MA50 (sidste 5): {ma50[-5:].to_dict()}")
-    print(f"Debug: Gennemsnitlig volumen (sidste 5): {avg_volume[-5:].to_dict()}")
-    print(f"Debug: MACD (sidste 5): {macd[-5:].to_dict()}")
-    print(f"Debug: Signal (sidste 5): {signal[-5:].to_dict()}")
-
-    breakout_points = []
-    for i in range(50, len(data)):
-        try:
-            # Tjek MACD over Signal med lille t�rskel
-            is_macd_above_signal = macd.iloc[i] > signal.iloc[i] + 0.01
-            # Tjek volumen-spike
-            is_volume_spike = data['Volume'].iloc[i] > 1.1 * avg_volume.iloc[i]
-            # Tjek MA-betingelser
-            is_10ma_above_20ma = ma10.iloc[i] > ma20.iloc[i]
-            is_10ma_upward = ma10.iloc[i] > ma10.iloc[i-1]
-            is_20ma_upward = ma20.iloc[i] > ma20.iloc[i-1]
-            is_close_above_50ma = data['Close'].iloc[i] > ma50.iloc[i]
-            # Fjernet is_50ma_upward for at g�re betingelserne mindre strenge
-
-            # Log betingelser for debugging
-            if not is_macd_above_signal:
-                print(f"Debug: MACD-betingelse fejlet ved index {i}: MACD={macd.iloc[i]}, Signal={signal.iloc[i]}")
-            if not is_volume_spike:
-                print(f"Debug: Volumen-betingelse fejlet ved index {i}: Volumen={data['Volume'].iloc[i]}, "
-                      f"AvgVol={avg_volume.iloc[i]}, Taerskel={1.1 * avg_volume.iloc[i]}")
-            if not is_10ma_above_20ma:
-                print(f"Debug: 10MA > 20MA fejlet ved index {i}: MA10={ma10.iloc[i]}, MA20={ma20.iloc[i]}")
-            if not is_close_above_50ma:
-                print(f"Debug: Close > 50MA fejlet ved index {i}: Close={data['Close'].iloc[i]}, MA50={ma50.iloc[i]}")
-            if not is_10ma_upward:
-                print(f"Debug: 10MA opadgaaende fejlet ved index {i}: MA10={ma10.iloc[i]}, MA10_prev={ma10.iloc[i-1]}")
-            if not is_20ma_upward:
-                print(f"Debug: 20MA opadgaaende fejlet ved index {i}: MA20={ma20.iloc[i]}, MA20_prev={ma20.iloc[i-1]}")
-
-            # Hvis alle betingelser er opfyldt, mark�r som breakout
-            if (is_macd_above_signal and is_volume_spike and is_10ma_above_20ma and
-                is_10ma_upward and is_20ma_upward and is_close_above_50ma):
-                print(f"Debug: Breakout detekteret ved index {i}, dato {data.index[i]}: "
-                      f"Close={data['Close'].iloc[i]}, MA10={ma10.iloc[i]}, MA20={ma20.iloc[i]}, "
-                      f"MA50={ma50.iloc[i]}, Volumen={data['Volume'].iloc[i]}, AvgVol={avg_volume.iloc[i]}, "
-                      f"MACD={macd.iloc[i]}, Signal={signal.iloc[i]}")
-                breakout_points.append({
-                    'x': data.index[i],
-                    'y': data['Close'].iloc[i] * 0.95,  # Placer under grafen (5% under Close)
-                    'close': data['Close'].iloc[i],
-                    'text': 'Breakout'
-                })
-        except Exception as e:
-            print(f"Debug: Fejl ved breakout-detektion for index {i}: {e}")
-            continue
+        log.debug("For faa data til breakout (%s raekker). Kraever mindst 50.", len(data))
+        return empty
+
+    inputs = _breakout_inputs(data)
+
+    # Tjek for NaN-værdier i de seneste beregninger
+    latest = {name: series.iloc[-1] for name, series in inputs.items()}
+    if any(pd.isna(list(latest.values()))):
+        log.debug("NaN-vaerdier fundet i beregninger: %s", latest)
+        return empty
+
+    points = data['Close'][breakout_mask(data, inputs)]
+    x = points.index
+    y = points.to_numpy() * 0.95  # Placer under grafen (5% under Close)
 
     breakout_trace = go.Scatter(
-        x=[p['x'] for p in breakout_points],
-        y=[p['y'] for p in breakout_points],
+        x=x,
+        y=y,
         mode='markers',
         name='Breakout',
         marker=dict(symbol='triangle-up', size=10, color='green'),
-        text=[p['text'] for p in breakout_points],
+        text=['Breakout'] * len(points),
         hovertemplate='Breakout<br>Date: %{x}<br>Price: %{customdata:.2f}<extra></extra>',
-        customdata=[p['close'] for p in breakout_points]
+        customdata=points.to_numpy()
     )
 
     annotations = [
         dict(
-            x=p['x'],
-            y=p['y'],
+            x=px,
+            y=py,
             xref="x",
             yref="y",
             text="Breakout",
             showarrow=False,
             font=dict(size=10, color='green'),
             yshift=-15  # Flyt tekst under trekant
-        ) for p in breakout_points
+        ) for px, py in zip(x, y)
     ]
 
-    print(f"Debug: Breakout-trace genereret med {len(breakout_points)} punkter")
-    return breakout_trace, annotations, len(breakout_points) > 0
\ No newline at end of file
+    log.debug("Breakout-trace genereret med %s punkter", len(points))
+    return breakout_trace, annotations, len(points) > 0
+
+# Usynlig akse over hele plotområdet (0 = bund, 1 = top) til signal-linjer og -pile,
+# så de kan tegnes som traces i stedet for en layout-shape/annotation pr. skift
+SIGNAL_AXIS = dict(overlaying='y', range=[0, 1], visible=False, fixedrange=True)
+
+@timed("plot.plot_signal_overlay")
+def plot_signal_overlay(signal_lines, signal_arrows, arrows=True):
+    """
+    Lodrette signal-linjer (én trace pr. signaltype) og evt. alle pile i én tekst-trace,
+    på yaxis2 (SIGNAL_AXIS). Antallet af traces afhænger ikke af antal skift.
+    """
+    traces = []
+    for (code, name, _, _, _, color, width, *_), x, y in signal_lines:
+        traces.append(go.Scatter(
+            x=x,
+            y=y,
+            yaxis='y2',
+            mode='lines',
+            name=f'{name} Lines',
+            line=dict(color=color, width=width, dash='dot'),
+            hoverinfo='skip',
+            showlegend=False,
+            legendgroup=name
+        ))
+    if arrows and signal_arrows is not None:
+        traces.append(go.Scatter(
+            x=signal_arrows['x'],
+            y=signal_arrows['y'],
+            yaxis='y2',
+            mode='text',
+            name='Signal Arrows',
+            text=signal_arrows['text'],
+            textfont=dict(color=signal_arrows['colors'], size=signal_arrows['sizes']),
+            hoverinfo='skip',
+            showlegend=False
+        ))
+    return traces
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Brugerpræferencer i hukommelsen med forsinket skrivning til disk.
+
+Callbacks læser og opdaterer præferencer ved hver graf-tegning. PreferencesStore
+holder dem i hukommelsen, så det ikke koster fil-I/O: en ændring skrives først
+efter delay sekunders ro (flere ændringer samles til én skrivning), uændrede
+præferencer skrives aldrig, og filen erstattes atomisk (temp-fil + rename).
+
+Som TickerRegistry læses filen igen, når dens mtime/størrelse ændrer sig (f.eks.
+når en anden worker-proces har gemt), og egne ikke-skrevne ændringer lægges
+oven på den nye fil i stedet for at overskrive andres.
+"""
+import atexit
+import copy
+import json
+import os
+import threading
+
+from logger import get_logger
+
+log = get_logger(__name__)
+
+
+class PreferencesStore:
+    def __init__(self, path, defaults, delay=2.0):
+        self.path = path
+        self.defaults = defaults
+        self.delay = delay
+        self._preferences = None
+        self._saved = None  # sidst skrevne eller indlæste version
+        self._signature = None  # (mtime_ns, størrelse) for den version der er indlæst/skrevet
+        self._pending = {}  # egne ændrede nøgler, der endnu ikke er skrevet
+        self._timer = None
+        self._lock = threading.Lock()
+        self.writes = 0
+        atexit.register(self.flush)
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self, schedule=True):
+        """
+        Læser filen første gang og igen, når den er ændret udefra; manglende eller
+        ugyldig fil giver standardpræferencer. Kaldes med låsen holdt.
+        schedule=False: planlæg ingen skrivning (flush skriver selv med det samme).
+        """
+        signature = self._file_signature()
+        if self._preferences is not None and signature == self._signature:
+            return
+        preferences = copy.deepcopy(self.defaults)
+        saved = None
+        if signature is not None:
+            try:
+                with open(self.path, 'r') as file:
+                    preferences.update(json.load(file))
+                saved = copy.deepcopy(preferences)
+                log.debug("Præferencer indlæst fra %s: %s", self.path, preferences)
+            except (json.JSONDecodeError, ValueError, IOError) as e:
+                if self._preferences is not None:
+                    # Halvskrevet fil fra en anden proces: behold det vi har og prøv igen ved næste kald
+                    return
+                log.warning("Fejl ved indlæsning af %s: %s. Opretter ny fil med standardpræferencer.", self.path, e)
+                preferences = copy.deepcopy(self.defaults)
+        else:
+            log.debug("%s findes ikke. Opretter ny fil med standardpræferencer.", self.path)
+        self._signature = signature
+        self._saved = saved
+        preferences.update(copy.deepcopy(self._pending))
+        self._preferences = preferences
+        if schedule and self._saved != preferences:
+            self._schedule()
+
+    def get(self):
+        """En kopi af de aktuelle præferencer, som kalderen frit kan ændre."""
+        with self._lock:
+            self._refresh()
+            return copy.deepcopy(self._preferences)
+
+    def update(self, preferences):
+        """Opdaterer præferencerne. Returnerer True hvis noget ændrede sig (og en skrivning er planlagt)."""
+        with self._lock:
+            self._refresh()
+            # Kun de nøgler der faktisk ændres huskes, så de kan lægges oven på en nyere fil
+            changed = {key: value for key, value in preferences.items() if self._preferences.get(key) != value}
+            if not changed:
+                return False
+            self._pending.update(copy.deepcopy(changed))
+            self._preferences.update(copy.deepcopy(changed))
+            self._schedule()
+            return True
+
+    def _schedule(self):
+        # Kaldes med låsen holdt: ny ændring udskyder skrivningen (debounce)
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self):
+        """Skriver præferencerne nu, hvis de afviger fra det sidst skrevne."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._preferences is None:
+                return False
+            # En anden proces kan have gemt siden; skriv vores ændringer oven på dens
+            self._refresh(schedule=False)
+            if self._preferences == self._saved:
+                self._pending.clear()
+                return False
+            preferences = copy.deepcopy(self._preferences)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"  # Pr. proces og tråd: flere workers kan gemme samtidig
+            try:
+                with open(tmp_path, 'w') as file:
+                    json.dump(preferences, file, indent=4)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                # Prøv igen efter næste forsinkelse; præferencerne er stadig i hukommelsen
+                log.warning("Kunne ikke gemme præferencer i %s: %s. Prøver igen om %.0f sekunder.", self.path, e, self.delay)
+                self._schedule()
+                return False
+            self._saved = preferences
+            self._signature = self._file_signature()
+            self._pending.clear()
+            self.writes += 1
+            log.debug("Præferencer gemt i %s: %s", self.path, preferences)
+            return True
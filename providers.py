@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Udbydere af markedsdata (historik, nøgletal, søgning).
+
+YahooProvider er standard. LocalProvider serverer optagede eller syntetiske
+data fra disk, så get_stock_data, scanneren og Dash-callbacks kan køres og
+belastningstestes deterministisk uden netværk.
+
+Vælg udbyder med set_provider(), main.py --provider eller miljøvariablen
+STOCKSDASH_PROVIDER ('yahoo' eller 'local').
+"""
+import json
+import os
+import threading
+import zlib
+
+import numpy as np
+import pandas as pd
+import requests
+import yfinance as yf
+from yfinance.exceptions import YFRateLimitError
+
+from market_hours import exchange_for
+from ratelimit import RateLimiter
+
+
+class RateLimitExceeded(Exception):
+    """
+    Udbyderen har afvist et kald pga. rate limit (uanset hvilken udbyder).
+    Ved et download der kun delvist blev afvist er partial de data der kom
+    igennem ({ticker: DataFrame}) og failed de tickers der skal prøves igen.
+    """
+    def __init__(self, message='', partial=None, failed=()):
+        super().__init__(message)
+        self.partial = partial
+        self.failed = list(failed)
+
+
+class MarketDataProvider:
+    """Grænseflade for markedsdata. Historik returneres som OHLCV-DataFrame med DatetimeIndex."""
+    name = 'base'
+    # Undtagelser der betyder at udbyderen har ramt en rate limit
+    rate_limit_errors = ()
+    # Fælles RateLimiter for alle kald til udbyderen (None = ingen begrænsning)
+    limiter = None
+    # Undermappe til udbyderens disk-lagre (historik, nøgletal), så data fra forskellige udbydere aldrig blandes
+    cache_namespace = 'base'
+
+    def history(self, ticker, period=None, start=None):
+        raise NotImplementedError
+
+    def download(self, tickers, period=None, start=None):
+        """Historik for mange tickers. Returnerer {ticker: DataFrame}; tickers uden data udelades."""
+        frames = {}
+        for ticker in tickers:
+            df = self.history(ticker, period=period, start=start)
+            if df is not None and not df.empty:
+                frames[ticker] = df
+        return frames
+
+    def info(self, ticker):
+        """Nøgletal i samme format som yfinance' Ticker.info."""
+        raise NotImplementedError
+
+    def search(self, query):
+        """Liste af quotes med nøglerne symbol, longname/shortname og exchange."""
+        raise NotImplementedError
+
+
+class YahooProvider(MarketDataProvider):
+    name = 'yahoo'
+    rate_limit_errors = (YFRateLimitError,)
+    # Standard-udbyderen bruger lagrenes rod, så eksisterende caches stadig gælder
+    cache_namespace = ''
+
+    # yf.download nulstiller og fylder det modul-globale yf.shared._ERRORS; samtidige
+    # downloads fra scannerens tråde ville ellers læse hinandens fejl
+    _download_lock = threading.Lock()
+
+    def __init__(self, limiter=None):
+        self.limiter = limiter or RateLimiter(rate=2.0, burst=5, name='yahoo')
+
+    def history(self, ticker, period=None, start=None):
+        stock = yf.Ticker(ticker)
+        if start is not None:
+            return stock.history(start=start)
+        return stock.history(period=period or "max")
+
+    def download(self, tickers, period=None, start=None):
+        kwargs = {'start': start} if start is not None else {'period': period or "max"}
+        with self._download_lock:
+            raw = yf.download(list(tickers), group_by='ticker', actions=True, auto_adjust=True,
+                              ignore_tz=False, progress=False, **kwargs)
+            errors = dict(getattr(yf.shared, '_ERRORS', None) or {})
+        frames = {}
+        if raw is not None and not raw.empty:
+            for ticker in tickers:
+                if ticker not in raw.columns.get_level_values(0):
+                    continue
+                df = raw[ticker].dropna(how='all', subset=['Close'])
+                if not df.empty:
+                    frames[ticker] = df
+        failed = self._rate_limited(tickers, errors)
+        if failed:
+            # yf.download sluger YFRateLimitError; send den videre, så limiteren sætter tempoet ned,
+            # med de data der kom igennem og de tickers der skal prøves igen
+            error = YFRateLimitError()
+            error.partial = {ticker: df for ticker, df in frames.items() if ticker not in failed}
+            error.failed = failed
+            raise error
+        return frames
+
+    @staticmethod
+    def _rate_limited(tickers, errors):
+        # yf.download gemmer fejl pr. ticker som tekst i yf.shared._ERRORS i stedet for at kaste dem
+        return [ticker for ticker in tickers
+                if any(marker in str(errors.get(ticker.upper(), '')) for marker in ('RateLimit', 'Too Many Requests'))]
+
+    def info(self, ticker):
+        return yf.Ticker(ticker).info
+
+    def search(self, query):
+        url = "https://query2.finance.yahoo.com/v1/finance/search"
+        headers = {'User-Agent': 'Mozilla/5.0'}
+        params = {'q': query, 'quotesCount': 10, 'newsCount': 0}
+        response = requests.get(url, headers=headers, params=params, timeout=5)
+        return response.json().get('quotes', [])
+
+
+class LocalProvider(MarketDataProvider):
+    """
+    Offline-udbyder. Læser <root>/<TICKER>.pkl eller .csv (f.eks. kopier af
+    history_cache) og <root>/<TICKER>.info.json. Findes der ingen fil, og
+    synthetic er slået til, genereres en deterministisk random walk pr. ticker.
+    """
+    name = 'local'
+    cache_namespace = 'local'
+
+    def __init__(self, root="fixtures", synthetic=True, years=25, end=None):
+        self.root = root
+        self.synthetic = synthetic
+        self.years = years
+        self.end = end
+
+    def _recorded(self, ticker):
+        for ext, reader in (('.pkl', pd.read_pickle), ('.csv', lambda p: pd.read_csv(p, index_col=0, parse_dates=True))):
+            path = os.path.join(self.root, f"{ticker}{ext}")
+            if os.path.exists(path):
+                return reader(path)
+        return None
+
+    def _synthetic(self, ticker):
+        # Seed fra tickerens navn, så samme ticker altid giver samme serie
+        rng = np.random.default_rng(zlib.crc32(ticker.encode('utf-8')))
+        exchange = exchange_for(ticker)
+        tz = exchange[0] if exchange else 'UTC'
+        end = pd.Timestamp(self.end) if self.end is not None else pd.Timestamp.now(tz=tz).normalize()
+        if end.tz is not None:
+            end = end.tz_localize(None)
+        # Hverdage filtreret ud af et dagligt interval (bdate_range er langsom ved mange år)
+        periods = self.years * 252
+        days = pd.date_range(end=end, periods=periods * 7 // 5 + 7, freq='D')
+        index = days[days.dayofweek < 5][-periods:].tz_localize(tz)
+        n = len(index)
+        close = 20 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, n)))
+        open_ = close * (1 + rng.normal(0, 0.005, n))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n)))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n)))
+        volume = rng.integers(100_000, 5_000_000, n).astype(float)
+        return pd.DataFrame({
+            'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume,
+            'Dividends': 0.0, 'Stock Splits': 0.0,
+        }, index=index)
+
+    def history(self, ticker, period=None, start=None):
+        df = self._recorded(ticker)
+        if df is None:
+            if not self.synthetic:
+                return pd.DataFrame()
+            df = self._synthetic(ticker)
+        if start is not None:
+            start = pd.Timestamp(start)
+            if df.index.tz is not None and start.tz is None:
+                start = start.tz_localize(df.index.tz)
+            return df.loc[df.index >= start]
+        if period and period != "max":
+            # Kun de perioder koden bruger: '<n>d', '<n>mo', '<n>y'
+            number = int(''.join(ch for ch in period if ch.isdigit()))
+            unit = period.lstrip('0123456789')
+            days = {'d': number * 7 / 5, 'mo': number * 30, 'y': number * 365}.get(unit)
+            if days is not None:
+                return df.loc[df.index >= df.index[-1] - pd.Timedelta(days=days)]
+        return df
+
+    def info(self, ticker):
+        path = os.path.join(self.root, f"{ticker}.info.json")
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        if not self.synthetic:
+            return {}
+        history = self.history(ticker)
+        rng = np.random.default_rng(zlib.crc32(ticker.encode('utf-8')))
+        return {
+            'symbol': ticker,
+            'longName': f"{ticker} (offline)",
+            'shortName': ticker,
+            'trailingPE': round(float(rng.uniform(5, 40)), 2),
+            'beta': round(float(rng.uniform(0.5, 2.0)), 2),
+            'currency': 'USD',
+            'currentPrice': float(history['Close'].iloc[-1]) if not history.empty else None,
+            'longBusinessSummary': "Syntetiske data fra LocalProvider.",
+        }
+
+    def search(self, query):
+        query = query.upper()
+        symbols = set()
+        if os.path.isdir(self.root):
+            for name in os.listdir(self.root):
+                for ext in ('.info.json', '.pkl', '.csv'):
+                    if name.endswith(ext):
+                        symbols.add(name[:-len(ext)])
+                        break
+        matches = sorted(s for s in symbols if query in s.upper())
+        if not matches and self.synthetic:
+            matches = [query]
+        return [{'symbol': s, 'shortname': s, 'exchange': self.name.upper()} for s in matches[:10]]
+
+
+_provider = None
+
+
+def get_provider():
+    """Den aktive udbyder. Oprettes ved første kald ud fra STOCKSDASH_PROVIDER."""
+    global _provider
+    if _provider is None:
+        name = os.environ.get('STOCKSDASH_PROVIDER', 'yahoo')
+        _provider = create_provider(name)
+    return _provider
+
+
+def set_provider(provider):
+    global _provider
+    _provider = provider
+    return provider
+
+
+def create_provider(name, root=None):
+    if name == 'local':
+        return LocalProvider(root=root or os.environ.get('STOCKSDASH_FIXTURES', 'fixtures'))
+    if name == 'yahoo':
+        return YahooProvider()
+    raise ValueError(f"Ukendt udbyder: {name}")
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Token bucket rate limiter delt af alle tråde der taler med samme udbyder.
+
+Når udbyderen melder rate limit, halveres raten og alle kald sættes på pause
+(eksponentielt stigende). Efter succesfulde kald kravler raten langsomt op igen.
+Et kald der dækker mange requests (f.eks. yf.download for en hel gruppe) betaler
+for dem alle med acquire(n); spanden går i minus, og de næste kald venter.
+"""
+import threading
+import time
+
+
+class RateLimiter:
+    def __init__(self, rate=2.0, burst=5, min_rate=0.2, max_pause=60.0, name=None):
+        self.name = name
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min_rate
+        self.burst = burst
+        self.max_pause = max_pause
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._failures = 0
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+    def configure(self, rate=None, burst=None):
+        with self._lock:
+            if rate is not None:
+                self.max_rate = self.rate = float(rate)
+            if burst is not None:
+                self.burst = burst
+                self._tokens = min(self._tokens, float(burst))
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, n=1):
+        """
+        Blokerer indtil der er n tokens (og en evt. pause er overstået). Er n større
+        end burst, ventes kun på en fuld spand, og resten trækkes som gæld.
+        """
+        need = min(n, self.burst)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= need:
+                    self._tokens -= n
+                    self.requests += n
+                    return
+                else:
+                    wait = (need - self._tokens) / self.rate
+                self.waited += wait
+            time.sleep(wait)
+
+    def backoff(self):
+        """Kaldes når udbyderen har meldt rate limit. Returnerer pausens længde i sekunder."""
+        with self._lock:
+            self._failures += 1
+            self.throttled += 1
+            self.rate = max(self.rate / 2, self.min_rate)
+            pause = min(2 ** self._failures, self.max_pause)
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            self._tokens = 0.0
+            return pause
+
+    def success(self):
+        """Kaldes efter et vellykket kald; raten øges gradvist tilbage mod max_rate."""
+        with self._lock:
+            self._failures = 0
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'rate': self.rate,
+                'max_rate': self.max_rate,
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'waited': self.waited,
+            }
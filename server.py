@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Produktionsserver: dashboardet under gunicorn med flere worker-processer.
+
+Flasks udviklingsserver kører alle callbacks i én proces, så samtidige
+brugere (og de tre graf-callbacks pr. side) deler én GIL og venter på
+hinanden under tunge beregninger. run_production() starter gunicorn med
+flere processer, hver med et par tråde (gthread), og slår den delte
+disk-cache (shared_cache.SharedCache) til, så en ticker kun hentes og
+beriges af én worker; de andre læser resultatet fra disken.
+
+Cache-opvarmningen (warmer.CacheWarmer) kører kun i én worker: den der får
+låsefilen i den delte cache-mappe. Dør den worker, tager dens afløser låsen.
+gunicorn er valgfri og installeres kun til produktion: uv sync --extra prod.
+"""
+from data import enable_copy_on_write, enable_shared_cache
+from logger import get_logger
+from shared_cache import shared_cache_dir, try_exclusive
+from warmer import CacheWarmer
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+log = get_logger(__name__)
+
+DEFAULT_THREADS = 4
+# Første visning af en ukendt ticker henter hele historikken; giv den tid før gunicorn dræber workeren
+WORKER_TIMEOUT = 120
+WARMER_LOCK = "warmer.lock"
+
+
+def _start_warmer(worker, warm_workers):
+    lock = try_exclusive(shared_cache_dir, WARMER_LOCK)
+    if lock is None:
+        return
+    # Låsen holdes så længe workeren lever
+    worker.warmer_lock = lock
+    log.info("Worker %s varmer cachen", worker.pid)
+    CacheWarmer(workers=warm_workers).start()
+
+
+if BaseApplication is not None:
+    class DashboardServer(BaseApplication):
+        def __init__(self, options, warm_workers=0):
+            self.options = options
+            self.warm_workers = warm_workers
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+            if self.warm_workers:
+                self.cfg.set('post_worker_init', lambda worker: _start_warmer(worker, self.warm_workers))
+
+        def load(self):
+            # Hver worker bygger sin egen app efter fork (Dash-callbacks og caches pr. proces)
+            from app import create_app
+            return create_app().server
+
+
+def run_production(host='0.0.0.0', port=8050, workers=3, threads=DEFAULT_THREADS, warm_workers=2):
+    """Starter gunicorn (blokerer). warm_workers=0 slår cache-opvarmningen fra."""
+    if BaseApplication is None:
+        raise SystemExit("Produktions-mode kræver gunicorn: uv sync --extra prod (eller pip install gunicorn)")
+    # Sættes før fork, så alle workers arver dem
+    enable_copy_on_write()
+    enable_shared_cache()
+    options = {
+        'bind': f"{host}:{port}",
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread',
+        'timeout': WORKER_TIMEOUT,
+    }
+    log.info("Starter produktionsserver på %s med %s workers x %s tråde", options['bind'], workers, threads)
+    DashboardServer(options, warm_workers=warm_workers).run()
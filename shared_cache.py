@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Cache på disk, som deles af flere processer (produktion med flere workers).
+
+Hver proces har sine egne TTLCache'er i hukommelsen; SharedCache ligger bag
+dem, så et datasæt som én worker har hentet og beriget, kan læses af de
+andre i stedet for at blive hentet fra Yahoo og beregnet igen. Hver værdi er
+en pickle-fil med udløbstidspunkt (time.time(), så alle processer er enige),
+skrevet atomisk (temp-fil + rename).
+
+get_or_compute() tager en fil-lås pr. nøgle (fcntl.flock), så når flere
+workers mangler samme ticker på én gang, beregner kun én af dem; de andre
+venter og læser resultatet fra disk. Uden fcntl (Windows) springes låsen over.
+"""
+import hashlib
+import os
+import pickle
+import threading
+import time
+from contextlib import contextmanager
+
+from logger import get_logger
+from metrics import inc
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+log = get_logger(__name__)
+
+shared_cache_dir = "shared_cache"
+
+_MISSING = object()
+
+
+class SharedCache:
+    def __init__(self, directory=shared_cache_dir, name='shared'):
+        self.directory = directory
+        self.name = name
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, suffix='.pkl'):
+        # Nøglen kan være en tuple af argumenter; filnavnet er et hash af dens repr
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:20]
+        return os.path.join(self.directory, f"{digest}{suffix}")
+
+    def _count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+        inc(f'{self.name}.{field}')
+
+    def _read(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                expires, stored_key, value = pickle.load(file)
+        except FileNotFoundError:
+            return _MISSING
+        except Exception as e:
+            # Halv eller forældet fil (f.eks. efter en opdatering af pandas); beregnes igen
+            log.warning("Kunne ikke læse delt cache-post %s: %s", path, e)
+            self._count('errors')
+            return _MISSING
+        if stored_key != key or expires <= time.time():
+            return _MISSING
+        return value
+
+    def get(self, key, default=_MISSING):
+        """Værdien for key hvis den findes og ikke er udløbet, ellers default."""
+        value = self._read(key)
+        if value is _MISSING:
+            self._count('misses')
+            return default
+        self._count('hits')
+        return value
+
+    def set(self, key, value, ttl):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as file:
+                pickle.dump((time.time() + ttl, key, value), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            log.warning("Kunne ikke gemme delt cache-post %s: %s", path, e)
+            self._count('errors')
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def invalidate(self, key):
+        """Fjerner posten for key. Returnerer True hvis den fandtes."""
+        try:
+            os.remove(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    @contextmanager
+    def lock(self, key):
+        """Eksklusiv lås på key på tværs af processer (blokerer til den er fri)."""
+        if fcntl is None:
+            yield
+            return
+        with open(self._path(key, '.lock'), 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def get_or_compute(self, key, compute, ttl, cache_if=None):
+        """
+        Værdien fra disken, eller compute() under låsen for key. Resultatet gemmes
+        i ttl sekunder, hvis cache_if(værdi) tillader det.
+        """
+        value = self.get(key)
+        if value is not _MISSING:
+            return value
+        with self.lock(key):
+            # En anden proces kan have beregnet værdien, mens vi ventede på låsen
+            value = self._read(key)
+            if value is not _MISSING:
+                self._count('coalesced')
+                return value
+            value = compute()
+            if cache_if is None or cache_if(value):
+                self.set(key, value, ttl)
+            return value
+
+    def stats(self):
+        with self._lock:
+            size = sum(1 for entry in os.scandir(self.directory) if entry.name.endswith('.pkl'))
+            return {
+                'name': self.name,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+                'size': size,
+            }
+
+
+def try_exclusive(directory, name):
+    """
+    Tager låsefilen name uden at vente. Returnerer den åbne fil, som holder låsen
+    så længe den er åben (eller processen lever), eller None hvis en anden har den.
+    """
+    os.makedirs(directory, exist_ok=True)
+    file = open(os.path.join(directory, name), 'a')
+    if fcntl is not None:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return None
+    return file
@@ -0,0 +1,108 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+import yfinance as yf
+from yfinance.exceptions import YFRateLimitError
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import data
+from history_store import save_history
+from providers import LocalProvider, YahooProvider, set_provider
+from ratelimit import RateLimiter
+
+
+class RateLimited(Exception):
+    pass
+
+
+class RecordingProvider(LocalProvider):
+    rate_limit_errors = (RateLimited,)
+
+    def __init__(self, *args, limited=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limiter = RateLimiter(rate=1000, burst=1000, max_pause=0.05, name='test')
+        self.limited = set(limited)
+        self.calls = []
+
+    def download(self, tickers, period=None, start=None):
+        self.calls.append((start or period, sorted(tickers)))
+        failed = sorted(self.limited & set(tickers))
+        if failed:
+            # Som YahooProvider: de andre tickers i kaldet kommer med i fejlen
+            error = RateLimited()
+            error.partial = super().download([t for t in tickers if t not in failed], period=period, start=start)
+            error.failed = failed
+            raise error
+        return super().download(tickers, period=period, start=start)
+
+
+@pytest.fixture
+def provider(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    def make(**kwargs):
+        provider = set_provider(RecordingProvider(root=str(tmp_path / "fixtures"), years=2, **kwargs))
+        full = provider.history('AAA')
+        # AAA og BBB er opdateret til i går; CCC er en måned bagud
+        for ticker, rows in (('AAA', 1), ('BBB', 1), ('CCC', 22)):
+            save_history(ticker, provider.history(ticker).iloc[:-rows])
+        provider.calls.clear()
+        return provider, full
+    yield make
+    set_provider(None)
+
+
+def test_incremental_tickers_are_grouped_by_start_date(provider):
+    provider, full = provider()
+    results = data.fetch_histories_batch(['AAA', 'BBB', 'CCC'])
+    assert sorted(results) == ['AAA', 'BBB', 'CCC']
+    starts = dict((tuple(tickers), start) for start, tickers in provider.calls)
+    # Den forældede ticker hentes for sig; de andre hentes kun fra deres egen næstsidste bar
+    assert starts[('AAA', 'BBB')] == full.index[-3].strftime('%Y-%m-%d')
+    assert starts[('CCC',)] == full.index[-24].strftime('%Y-%m-%d')
+
+
+def test_rate_limited_group_backs_off_and_keeps_other_groups(provider):
+    provider, _ = provider(limited={'CCC'})
+    results = data.fetch_histories_batch(['AAA', 'BBB', 'CCC'])
+    assert sorted(results) == ['AAA', 'BBB']
+    assert provider.limiter.stats()['throttled'] == 1
+
+
+def test_partially_rate_limited_group_keeps_the_tickers_that_came_through(provider):
+    provider, full = provider(limited={'BBB'})
+    results = data.fetch_histories_batch(['AAA', 'BBB', 'CCC'])
+    assert sorted(results) == ['AAA', 'CCC']
+    assert results['AAA'].index[-1] == full.index[-1]
+    assert provider.limiter.stats()['throttled'] == 1
+
+
+def test_yahoo_download_raises_swallowed_rate_limit(monkeypatch):
+    monkeypatch.setattr(yf.shared, '_ERRORS', {})
+
+    def download(tickers, **kwargs):
+        yf.shared._ERRORS = {'AAPL': "YFRateLimitError('Too Many Requests. Rate limited. Try after a while.')"}
+        return pd.DataFrame()
+    monkeypatch.setattr(yf, 'download', download)
+    with pytest.raises(YFRateLimitError):
+        YahooProvider().download(['AAPL', 'MSFT'])
+
+
+def test_yahoo_download_raises_when_some_tickers_are_rate_limited(monkeypatch):
+    monkeypatch.setattr(yf.shared, '_ERRORS', {})
+    index = pd.date_range('2024-01-02', periods=3, tz='America/New_York')
+    columns = pd.MultiIndex.from_product([['AAPL', 'MSFT'], ['Open', 'High', 'Low', 'Close', 'Volume']])
+    raw = pd.DataFrame(float('nan'), index=index, columns=columns)
+    raw['MSFT'] = 1.0
+
+    def download(tickers, **kwargs):
+        yf.shared._ERRORS = {'AAPL': "YFRateLimitError('Too Many Requests. Rate limited. Try after a while.')"}
+        return raw
+    monkeypatch.setattr(yf, 'download', download)
+    with pytest.raises(YFRateLimitError) as info:
+        YahooProvider().download(['AAPL', 'MSFT'])
+    assert info.value.failed == ['AAPL']
+    assert sorted(info.value.partial) == ['MSFT']
@@ -0,0 +1,123 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cache import SingleFlight, ttl_cache
+
+
+def test_key_function_shares_one_entry_per_normalized_argument():
+    calls = []
+
+    @ttl_cache(ttl=60, key=lambda ticker: ticker.upper())
+    def lookup(ticker):
+        calls.append(ticker)
+        return {'symbol': ticker.upper()}
+
+    assert lookup('novo-b.co') == lookup('NOVO-B.CO') == {'symbol': 'NOVO-B.CO'}
+    assert calls == ['novo-b.co']
+    assert lookup.cache_info()['size'] == 1
+
+    assert lookup.invalidate('Novo-B.Co')
+    lookup('NOVO-B.CO')
+    assert calls == ['novo-b.co', 'NOVO-B.CO']
+
+
+def run_concurrently(target, count):
+    results = [None] * count
+
+    def run(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            results[i] = e
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timeout"
+        time.sleep(0.001)
+
+
+def test_concurrent_misses_run_the_function_once():
+    release = threading.Event()
+    calls = []
+
+    @ttl_cache(ttl=60)
+    def load(ticker):
+        calls.append(ticker)
+        release.wait(5)
+        return {'ticker': ticker}
+
+    threads, results = run_concurrently(lambda: load('AAA'), 8)
+    # Alle andre end den første venter på dens kald, før det får lov at blive færdigt
+    wait_for(lambda: load.cache_info()['coalesced'] == 7)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == ['AAA']
+    assert all(result is results[0] for result in results)
+    assert load.cache_info()['size'] == 1
+
+
+def test_different_keys_are_not_coalesced():
+    flight = SingleFlight()
+    release = threading.Event()
+    started = []
+
+    def work(key):
+        started.append(key)
+        release.wait(5)
+        return key
+
+    threads, results = run_concurrently(lambda: flight.do(threading.current_thread().name, work, threading.current_thread().name), 3)
+    wait_for(lambda: len(started) == 3)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert flight.shared == 0
+    assert sorted(results) == sorted(thread.name for thread in threads)
+
+
+def test_leader_error_reaches_every_waiter_and_is_not_cached():
+    release = threading.Event()
+    calls = []
+
+    @ttl_cache(ttl=60)
+    def load(ticker):
+        calls.append(ticker)
+        if len(calls) == 1:
+            release.wait(5)
+            raise RuntimeError("udbyder nede")
+        return 'ok'
+
+    threads, results = run_concurrently(lambda: load('AAA'), 5)
+    wait_for(lambda: load.cache_info()['coalesced'] == 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == ['AAA']
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert all(result is results[0] for result in results)
+    # Nøglen er frigivet og fejlen ikke gemt: næste kald prøver igen
+    assert load('AAA') == 'ok'
+    assert calls == ['AAA', 'AAA']
+
+
+def test_single_flight_releases_the_key_after_an_error():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("fejl")
+    with pytest.raises(ValueError):
+        flight.do('key', fail)
+    assert flight.do('key', lambda: 42) == 42
@@ -0,0 +1,55 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import data
+from providers import LocalProvider, set_provider
+
+
+@pytest.fixture
+def offline(tmp_path, monkeypatch):
+    # Lagrene (history_cache, fundamentals_cache) skrives relativt til arbejdsmappen
+    monkeypatch.chdir(tmp_path)
+    set_provider(LocalProvider(root=str(tmp_path / "fixtures"), years=3))
+    data.cached_get_full_stock_data.cache_clear()
+    data.recent_frames.clear()
+    # Som i main.py/server.py; kun for disse tests, så andre moduler beholder pandas' standard
+    with pd.option_context('mode.copy_on_write', True):
+        yield
+    set_provider(None)
+    data.cached_get_full_stock_data.cache_clear()
+    data.recent_frames.clear()
+
+
+def test_cached_frame_is_read_only(offline):
+    full, _ = data.cached_get_full_stock_data('TEST')
+    assert not full.empty
+    with pytest.raises(ValueError):
+        full.loc[full.index[-1], 'Close'] = 0.0
+
+
+def test_writes_to_slices_do_not_reach_cache(offline):
+    full, _ = data.cached_get_full_stock_data('TEST')
+    last_close = full['Close'].iloc[-1]
+
+    view, _ = data.cached_get_stock_data('TEST', '1mo')
+    view.loc[view.index[-1], 'Close'] = 0.0
+    view['percent_change'] = 1.0
+
+    copy, _ = data.get_stock_data('TEST', '1y')
+    copy.iloc[-1, copy.columns.get_loc('Close')] = -1.0
+
+    assert full['Close'].iloc[-1] == last_close
+    assert 'percent_change' not in full
+    assert data.cached_get_full_stock_data('TEST')[0] is full
+
+
+def test_shared_frame_has_its_index_lookup_built(offline):
+    # Bygges den dovent, kan samtidige .loc-opslag fra flere tråde fejle med KeyError
+    full, _ = data.cached_get_full_stock_data('TEST')
+    assert full.index._engine.mapping is not None
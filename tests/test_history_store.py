@@ -0,0 +1,48 @@
+import os
+import sys
+import threading
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from history_store import history_is_consistent, load_history, merge_history, save_history
+
+
+def bars(index, close):
+    return pd.DataFrame({'Close': close, 'Dividends': 0.0, 'Stock Splits': 0.0}, index=index)
+
+
+def test_merge_aligns_utc_download_with_exchange_history():
+    days = pd.date_range('2024-03-04', periods=5, freq='B', tz='America/Chicago')
+    stored = bars(days[:4], [1.0, 2.0, 3.0, 4.0])
+    # yf.download(ignore_tz=False) giver samme handelsdage som UTC-tidspunkter
+    new = bars(days[2:].tz_convert('UTC'), [3.0, 4.5, 5.0])
+    merged = merge_history(stored, new)
+    assert str(merged.index.tz) == 'America/Chicago'
+    assert list(merged.index) == list(days)
+    assert list(merged['Close']) == [1.0, 2.0, 3.0, 4.5, 5.0]
+    assert history_is_consistent(stored, new)
+
+
+def test_merge_keys_on_calendar_date():
+    # Historik gemt med et gættet UTC-midnat; enkelt-kaldet giver børsens midnat for de samme dage
+    stored = bars(pd.date_range('2024-03-04', periods=3, freq='B', tz='UTC'), [1.0, 2.0, 3.0])
+    new = bars(pd.date_range('2024-03-05', periods=3, freq='B', tz='America/Chicago'), [2.0, 3.5, 4.0])
+    merged = merge_history(stored, new)
+    assert merged.index.is_unique
+    assert len(merged) == 4
+    assert list(merged['Close']) == [1.0, 2.0, 3.5, 4.0]
+
+
+def test_concurrent_saves_use_their_own_temp_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    frames = [bars(pd.date_range('2024-03-04', periods=200 + i, freq='B', tz='UTC'), 1.0) for i in range(8)]
+    threads = [threading.Thread(target=save_history, args=('AAA', df)) for df in frames]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Én af skrivningerne vinder helt; ingen halve filer eller efterladte temp-filer
+    assert len(load_history('AAA')) in {len(df) for df in frames}
+    assert not [name for _, _, files in os.walk(tmp_path) for name in files if name.endswith('.tmp')]
@@ -0,0 +1,73 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from indicators import SMA_WINDOWS, add_sma, rolling_means
+
+
+def random_walk(n, seed=0, level=100.0):
+    rng = np.random.default_rng(seed)
+    return level + np.cumsum(rng.normal(0, 1, n))
+
+
+def assert_matches_rolling(values, windows, min_periods=None):
+    series = pd.Series(values)
+    means = rolling_means(series.to_numpy(), windows, min_periods=min_periods)
+    for window in windows:
+        expected = series.rolling(window, min_periods=min_periods).mean().to_numpy()
+        np.testing.assert_allclose(means[window], expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize('min_periods', [None, 1, 3])
+def test_matches_pandas_rolling_on_long_random_series(min_periods):
+    assert_matches_rolling(random_walk(20000), SMA_WINDOWS, min_periods)
+
+
+@pytest.mark.parametrize('min_periods', [None, 1, 3])
+def test_matches_pandas_rolling_with_nans(min_periods):
+    values = random_walk(5000, seed=1)
+    rng = np.random.default_rng(2)
+    values[rng.random(len(values)) < 0.02] = np.nan
+    values[:30] = np.nan
+    values[2000:2250] = np.nan
+    assert_matches_rolling(values, SMA_WINDOWS, min_periods)
+
+
+def test_no_float_drift_over_long_series():
+    # Højt kursniveau og en lang historik: de kumulative summer må ikke løbe fra de præcise gennemsnit
+    values = random_walk(1_000_000, seed=3, level=50_000.0)
+    means = rolling_means(values, (5, 200))
+    for window in (5, 200):
+        tail = values[-window:]
+        assert means[window][-1] == pytest.approx(tail.mean(), rel=1e-12)
+        middle = values[500_000 - window + 1:500_001]
+        assert means[window][500_000] == pytest.approx(middle.mean(), rel=1e-12)
+
+
+def test_leading_nans_delay_the_first_value():
+    values = np.concatenate((np.full(7, np.nan), np.arange(1.0, 11.0)))
+    means = rolling_means(values, (5,))[5]
+    assert np.isnan(means[:11]).all()
+    assert means[11] == pytest.approx(3.0)
+    assert means[-1] == pytest.approx(8.0)
+
+
+def test_window_longer_than_series():
+    values = np.arange(1.0, 4.0)
+    assert np.isnan(rolling_means(values, (200,))[200]).all()
+    np.testing.assert_allclose(rolling_means(values, (200,), min_periods=1)[200], [1.0, 1.5, 2.0])
+    assert rolling_means(np.array([]), (5,))[5].size == 0
+
+
+def test_add_sma_only_adds_missing_columns():
+    df = pd.DataFrame({'Close': random_walk(300, seed=4)})
+    df['sma5'] = 0.0
+    add_sma(df, (5, 20, 20))
+    assert (df['sma5'] == 0.0).all()
+    expected = df['Close'].rolling(20).mean()
+    np.testing.assert_allclose(df['sma20'], expected, rtol=1e-9, equal_nan=True)
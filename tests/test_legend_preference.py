@@ -0,0 +1,31 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from providers import LocalProvider, set_provider
+
+
+def test_legend_toggle_never_calls_the_server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open('tickers.json', 'w') as file:
+        json.dump({'AAA': 'A'}, file)
+    set_provider(LocalProvider(root=str(tmp_path / "fixtures"), years=2))
+    try:
+        from app import create_app
+        app = create_app()
+        client = app.server.test_client()
+        client.get('/')
+        dependencies = client.get('/_dash-dependencies').get_json()
+    finally:
+        set_provider(None)
+
+    legend = [d for d in dependencies
+              if any(i['id'] == 'legend-checkbox' for i in d['inputs']) or d['output'].startswith('legend-')]
+    # Graferne, localStorage-posten og gendannelsen ved sideload - alt sammen i browseren
+    assert {d['output'].split('@')[0] for d in legend} == {
+        'stock-graph.figure', 'volume-graph.figure', 'macd-graph.figure', 'legend-store.data', 'legend-checkbox.value'}
+    assert all(d.get('clientside_function') for d in legend)
+    store = app.layout['legend-store']
+    assert store.storage_type == 'local'
@@ -0,0 +1,80 @@
+import os
+import sys
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cache
+import data
+from cache import ttl_cache
+from market_hours import is_market_open, market_ttl
+
+NEW_YORK = ZoneInfo('America/New_York')
+HOUR = 60 * 60
+
+
+def ny(day, hour, minute=0):
+    # Marts 2024: den 5. er en tirsdag, den 8. en fredag, den 9. en lørdag
+    return datetime(2024, 3, day, hour, minute, tzinfo=NEW_YORK)
+
+
+@pytest.mark.parametrize('now, expected', [
+    (ny(5, 15), 300),                       # Åbent: kort levetid
+    (ny(5, 8), 1.5 * HOUR),                 # Før åbning: til 9:30 samme dag
+    (ny(5, 17), 16.5 * HOUR),               # Efter lukning: til 9:30 næste dag
+    (ny(8, 17), 64.5 * HOUR),               # Fredag aften: til mandag morgen
+    (ny(9, 12), 45.5 * HOUR),               # Lørdag: til mandag morgen
+    (ny(5, 9, 29), 300),                    # Lige før åbning: aldrig under open_ttl
+])
+def test_us_ticker_ttl_follows_the_trading_session(now, expected):
+    assert market_ttl('AAPL', 300, now=now) == pytest.approx(expected)
+
+
+def test_ttl_uses_the_tickers_own_exchange():
+    # 10:00 i New York er 16:00 i København: begge børser har åbent
+    assert market_ttl('NOVO-B.CO', 300, now=ny(5, 10)) == 300
+    # 11:00 i New York er 17:00 i København: lukket til 9:00 næste morgen
+    assert not is_market_open('NOVO-B.CO', now=ny(5, 11))
+    assert market_ttl('NOVO-B.CO', 300, now=ny(5, 11)) == pytest.approx(16 * HOUR)
+
+
+def test_sunday_to_thursday_exchange_is_closed_on_friday():
+    riyadh = ZoneInfo('Asia/Riyadh')
+    friday = datetime(2024, 3, 8, 11, 0, tzinfo=riyadh)
+    assert not is_market_open('2222.SR', now=friday)
+    # Åbner søndag kl. 10
+    assert market_ttl('2222.SR', 300, now=friday) == pytest.approx(47 * HOUR)
+
+
+@pytest.mark.parametrize('ticker', ['BTC-USD', 'EURUSD=X', 'GC=F'])
+def test_round_the_clock_markets_always_use_the_open_ttl(ticker):
+    assert market_ttl(ticker, 300, now=ny(9, 12)) == 300
+
+
+def test_price_memory_ttl_is_capped_when_the_cache_is_shared(monkeypatch):
+    monkeypatch.setattr(data, 'market_ttl', lambda ticker, open_ttl: 10 * HOUR)
+    monkeypatch.setattr(data, 'shared_cache', None)
+    assert data._price_memory_ttl('AAPL') == 10 * HOUR
+    monkeypatch.setattr(data, 'shared_cache', object())
+    assert data._price_memory_ttl('AAPL') == data.SHARED_MEMORY_TTL
+
+
+def test_ttl_cache_uses_the_ttl_for_the_arguments(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: clock[0])
+    ttls = {'OPEN': 300, 'CLOSED': 10 * HOUR}
+    calls = []
+
+    @ttl_cache(ttl=lambda ticker: ttls[ticker])
+    def price(ticker):
+        calls.append(ticker)
+        return len(calls)
+
+    price('OPEN'), price('CLOSED')
+    clock[0] += 301
+    price('OPEN'), price('CLOSED')
+    # Kun den åbne ticker er udløbet og hentet igen
+    assert calls == ['OPEN', 'CLOSED', 'OPEN']
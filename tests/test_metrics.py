@@ -0,0 +1,110 @@
+import json
+import os
+import re
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import data
+from metrics import Metrics, registry, render_prometheus
+from providers import LocalProvider, set_provider
+
+
+def test_spans_record_count_total_and_max():
+    metrics = Metrics()
+    for seconds in (0.25, 1.0, 0.5):
+        metrics.observe('load', seconds)
+    with metrics.span('block') as timer:
+        pass
+    spans = metrics.snapshot()['spans']
+    assert spans['load'] == {'count': 3, 'total': 1.75, 'max': 1.0}
+    assert spans['block']['count'] == 1
+    assert spans['block']['total'] == timer.seconds >= 0
+
+
+def test_timed_records_calls_that_raise():
+    metrics = Metrics()
+
+    @metrics.timed()
+    def fail():
+        raise ValueError("fejl")
+    with pytest.raises(ValueError):
+        fail()
+    assert metrics.snapshot()['spans']['fail']['count'] == 1
+
+
+def test_counters_are_thread_safe():
+    metrics = Metrics()
+
+    def work():
+        for _ in range(2000):
+            metrics.inc('hits')
+            metrics.observe('work', 0.001)
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    snapshot = metrics.snapshot()
+    assert snapshot['counters']['hits'] == 16000
+    assert snapshot['spans']['work']['count'] == 16000
+    metrics.reset()
+    assert metrics.snapshot() == {'spans': {}, 'counters': {}}
+
+
+def test_prometheus_text_format():
+    metrics = Metrics()
+    metrics.observe('data.fetch', 0.5)
+    metrics.inc('say "hi"\n', 2)
+    text = render_prometheus([{'name': 'prices', 'hits': 3, 'misses': 1, 'size': 2}], metrics)
+    lines = text.splitlines()
+    assert 'stocksdash_span_seconds_count{span="data.fetch"} 1' in lines
+    assert 'stocksdash_span_seconds_sum{span="data.fetch"} 0.500000' in lines
+    assert 'stocksdash_span_seconds_max{span="data.fetch"} 0.500000' in lines
+    assert 'stocksdash_events_total{event="say \\"hi\\"\\n"} 2' in lines
+    assert 'stocksdash_cache_hits_total{cache="prices"} 3' in lines
+    assert 'stocksdash_cache_size{cache="prices"} 2' in lines
+    # Tællere uden værdi i statistikken udelades
+    assert not any(line.startswith('stocksdash_cache_evictions_total{') for line in lines)
+    assert text.endswith('\n')
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open('tickers.json', 'w') as file:
+        json.dump({'AAA': 'A'}, file)
+    set_provider(LocalProvider(root=str(tmp_path / "fixtures"), years=2))
+    data.cached_get_full_stock_data.cache_clear()
+    from app import create_app
+    yield create_app().server.test_client()
+    data.cached_get_full_stock_data.cache_clear()
+    set_provider(None)
+
+
+def sample(text, metric, label):
+    match = re.search(rf'^{re.escape(metric)}{{{label}}} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_metrics_endpoint_reports_spans_and_cache_counters(client):
+    before = client.get('/metrics').get_data(as_text=True)
+    data.cached_get_stock_data('AAA', '1y')
+    data.cached_get_stock_data('AAA', '3mo')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+
+    span = 'span="data.cached_get_stock_data"'
+    assert sample(text, 'stocksdash_span_seconds_count', span) - sample(before, 'stocksdash_span_seconds_count', span) == 2
+    assert sample(text, 'stocksdash_span_seconds_sum', span) > 0
+    cache = 'cache="cached_get_full_stock_data"'
+    # Første kald henter og beriger; det andet skærer ud af det cachede datasæt
+    assert sample(text, 'stocksdash_cache_misses_total', cache) - sample(before, 'stocksdash_cache_misses_total', cache) == 1
+    assert sample(text, 'stocksdash_cache_hits_total', cache) - sample(before, 'stocksdash_cache_hits_total', cache) == 1
+    assert sample(text, 'stocksdash_cache_size', cache) == 1
+    assert registry.snapshot()['spans']['data.indicators']['count'] >= 1
@@ -0,0 +1,61 @@
+import base64
+import gzip
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+from flask import Flask
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from payload import compact_figure, compress_response
+
+
+def accept(header):
+    return parse_accept_header(header, Accept)
+
+
+def decode(spec):
+    return np.frombuffer(base64.b64decode(spec['bdata']), dtype='<' + spec['dtype'])
+
+
+def test_compact_figure_uses_typed_arrays_and_iso_dates():
+    index = pd.date_range('2024-01-01', periods=5, freq='D', tz='America/New_York')
+    y = np.array([1.0, np.nan, 3.0, 4.0, 5.0])
+    figure = {
+        'data': [go.Scatter(x=index, y=y, name='Close'), go.Bar(x=index, y=np.arange(5), customdata=y)],
+        'layout': go.Layout(title='T', xaxis={'range': [index[0], index[-1]]}).to_plotly_json(),
+    }
+    compact = compact_figure(figure)
+    line, bar = compact['data']
+    assert line['x'][0] == index[0].isoformat()
+    assert np.array_equal(decode(line['y']), y, equal_nan=True)
+    assert bar['y']['dtype'] == 'i4' and list(decode(bar['y'])) == [0, 1, 2, 3, 4]
+    assert compact['layout']['xaxis']['range'] == [index[0].isoformat(), index[-1].isoformat()]
+    # Rene JSON-typer: ingen NaN-literal i svaret
+    assert 'NaN' not in json.dumps(compact)
+
+
+def test_compress_response_gzip_only_when_accepted():
+    app = Flask(__name__)
+    body = json.dumps({'data': list(range(2000))})
+    with app.app_context():
+        response = compress_response(app.response_class(body, mimetype='application/json'), accept('gzip, deflate'))
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.get_data()).decode() == body
+
+        plain = compress_response(app.response_class(body, mimetype='application/json'), accept(''))
+        assert 'Content-Encoding' not in plain.headers
+
+        small = compress_response(app.response_class('{}', mimetype='application/json'), accept('gzip'))
+        assert 'Content-Encoding' not in small.headers
+
+        # q=0 betyder afvist, og navne der blot indeholder 'gzip' tæller ikke
+        for header in ('gzip;q=0, identity', 'x-gzip-custom'):
+            refused = compress_response(app.response_class(body, mimetype='application/json'), accept(header))
+            assert 'Content-Encoding' not in refused.headers
@@ -0,0 +1,76 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from indicators import add_sma, add_macd
+from plotting import breakout_mask, plot_breakout
+
+
+def make_data(n=600, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 50 * np.exp(np.cumsum(rng.normal(0.001, 0.02, n)))
+    volume = rng.integers(1_000, 10_000, n).astype(float)
+    index = pd.bdate_range("2020-01-01", periods=n)
+    return pd.DataFrame({'Close': close, 'Volume': volume}, index=index)
+
+
+def loop_breakouts(data):
+    """Den oprindelige række-for-række-løkke fra plot_breakout (uden debug-print)."""
+    ma10 = data['Close'].rolling(window=10).mean()
+    ma20 = data['Close'].rolling(window=20).mean()
+    ma50 = data['Close'].rolling(window=50).mean()
+    avg_volume = data['Volume'].rolling(window=20).mean()
+    ema12 = data['Close'].ewm(span=12, adjust=False).mean()
+    ema26 = data['Close'].ewm(span=26, adjust=False).mean()
+    macd = ema12 - ema26
+    signal = macd.ewm(span=9, adjust=False).mean()
+
+    points = []
+    for i in range(50, len(data)):
+        if (macd.iloc[i] > signal.iloc[i] + 0.01 and
+                data['Volume'].iloc[i] > 1.1 * avg_volume.iloc[i] and
+                ma10.iloc[i] > ma20.iloc[i] and
+                ma10.iloc[i] > ma10.iloc[i-1] and
+                ma20.iloc[i] > ma20.iloc[i-1] and
+                data['Close'].iloc[i] > ma50.iloc[i]):
+            points.append(data.index[i])
+    return points
+
+
+def test_mask_matches_loop():
+    for seed in range(5):
+        data = make_data(seed=seed)
+        expected = loop_breakouts(data)
+        assert expected, "testdata skal give breakouts"
+        assert list(data.index[breakout_mask(data)]) == expected
+
+
+def test_plot_breakout_points_and_prices():
+    data = make_data()
+    trace, annotations, has_breakout = plot_breakout(data)
+    expected = loop_breakouts(data)
+    assert has_breakout
+    assert list(pd.DatetimeIndex(trace.x)) == expected
+    np.testing.assert_allclose(trace.customdata, data.loc[expected, 'Close'])
+    np.testing.assert_allclose(trace.y, data.loc[expected, 'Close'] * 0.95)
+    assert len(annotations) == len(expected)
+
+
+def test_reuses_precomputed_columns():
+    data = make_data()
+    enriched = add_macd(add_sma(data.copy(), (10, 20, 50)))
+    enriched['vol_avg_20'] = enriched['Volume'].rolling(window=20).mean()
+    # Beregnet på hele datasættet er kolonnerne de samme som udsnits-beregningen
+    assert (breakout_mask(enriched) == breakout_mask(data)).all()
+    # ... og en ændret kolonne slår igennem, dvs. den bliver ikke genberegnet
+    enriched['sma50'] = np.inf
+    assert not breakout_mask(enriched).any()
+
+
+def test_short_data_has_no_breakouts():
+    _, annotations, has_breakout = plot_breakout(make_data(n=40))
+    assert annotations == [] and not has_breakout
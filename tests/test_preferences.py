@@ -0,0 +1,42 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from preferences import PreferencesStore
+
+DEFAULTS = {'last_ticker': 'TSLA', 'timespan': '1y', 'trend_days': [20]}
+
+
+def _bump_mtime(path):
+    # Samme sekund kan give samme mtime på grove filsystemer; tving en ny signatur
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def test_reloads_changes_from_another_process(tmp_path):
+    path = str(tmp_path / 'prefs.json')
+    first, second = PreferencesStore(path, DEFAULTS, delay=60), PreferencesStore(path, DEFAULTS, delay=60)
+    first.update({**first.get(), 'last_ticker': 'AAPL'})
+    first.flush()
+    _bump_mtime(path)
+    assert second.get()['last_ticker'] == 'AAPL'
+
+
+def test_pending_changes_are_merged_not_overwritten(tmp_path):
+    path = str(tmp_path / 'prefs.json')
+    first, second = PreferencesStore(path, DEFAULTS, delay=60), PreferencesStore(path, DEFAULTS, delay=60)
+    first.flush()
+    second.get()
+
+    # Begge workers har ændringer, der endnu ikke er skrevet
+    first.update({**first.get(), 'last_ticker': 'AAPL'})
+    assert second.update({**second.get(), 'timespan': '5y'})
+    first.flush()
+    _bump_mtime(path)
+    # second skriver sin ændring oven på first's fil i stedet for sin gamle kopi
+    second.flush()
+    _bump_mtime(path)
+
+    assert first.get() == {**DEFAULTS, 'last_ticker': 'AAPL', 'timespan': '5y'}
+    assert second.get() == first.get()
@@ -0,0 +1,31 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import data
+from fundamentals import load_fundamentals
+from history_store import load_history
+from providers import LocalProvider, YahooProvider, set_provider
+
+
+def test_offline_data_stays_out_of_yahoo_caches(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    set_provider(LocalProvider(root=str(tmp_path / "fixtures"), years=2))
+    data.cached_get_full_stock_data.cache_clear()
+    data.get_fundamentals.cache_clear()
+    try:
+        data.cached_get_full_stock_data('TEST')
+        data.get_fundamentals('TEST')
+        assert os.path.exists(os.path.join('history_cache', 'local', 'TEST.pkl'))
+        assert os.path.exists(os.path.join('fundamentals_cache', 'local', 'TEST.json'))
+
+        # Yahoo læser rod-mapperne og ser intet fra offline-kørslen
+        set_provider(YahooProvider())
+        assert load_history('TEST') is None
+        assert load_fundamentals('TEST') == (None, None)
+    finally:
+        set_provider(None)
+        data.cached_get_full_stock_data.cache_clear()
+        data.get_fundamentals.cache_clear()
+        data.recent_frames.clear()
@@ -0,0 +1,18 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ratelimit import RateLimiter
+
+
+def test_acquire_many_tokens_is_paid_back_before_the_next_call():
+    limiter = RateLimiter(rate=100, burst=5)
+    start = time.monotonic()
+    limiter.acquire(10)
+    assert time.monotonic() - start < 0.02  # Fuld spand: første kald venter ikke
+    limiter.acquire()
+    # Spanden stod i -5 og skal op på 1 igen: 6 tokens ved 100/s
+    assert time.monotonic() - start >= 0.05
+    assert limiter.stats()['requests'] == 11
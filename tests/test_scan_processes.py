@@ -0,0 +1,25 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import data
+from providers import LocalProvider, set_provider
+
+
+def test_process_pool_uses_the_parent_provider(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open('tickers.json', 'w') as file:
+        json.dump({'AAA': 'A', 'BBB': 'B', 'CCC': 'C'}, file)
+    set_provider(LocalProvider(root=str(tmp_path / "fixtures"), years=2))
+    try:
+        threaded = data.scan_for_buy_signals(batch_size=1, workers=1, processes=0, timing_rows=0)
+        processed = data.scan_for_buy_signals(batch_size=1, workers=1, processes=2, timing_rows=0)
+    finally:
+        set_provider(None)
+    assert processed == threaded
+    # Worker-processerne skriver i offline-udbyderens mappe, ikke i Yahoo's rod
+    root_files = [name for name in os.listdir('history_cache') if os.path.isfile(os.path.join('history_cache', name))]
+    assert root_files == []
+    assert os.path.exists(os.path.join('history_cache', 'local', 'AAA.state.pkl'))
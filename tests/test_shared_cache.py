@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import sys
+import time
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import data
+import shared_cache
+from shared_cache import SharedCache, try_exclusive
+
+
+def test_get_set_and_expiry(tmp_path):
+    cache = SharedCache(str(tmp_path))
+    assert cache.get('AAPL', None) is None
+    cache.set('AAPL', {'close': 1.5}, ttl=60)
+    assert cache.get('AAPL') == {'close': 1.5}
+    # En anden proces ser det samme (ny instans på samme mappe)
+    assert SharedCache(str(tmp_path)).get('AAPL') == {'close': 1.5}
+    cache.set('MSFT', 1, ttl=-1)
+    assert cache.get('MSFT', None) is None
+    assert cache.invalidate('AAPL') and cache.get('AAPL', None) is None
+
+
+def _compute_in_process(directory, counter):
+    def compute():
+        with open(counter, 'a') as file:
+            file.write('x')
+        time.sleep(0.3)
+        return 42
+    return SharedCache(directory).get_or_compute('AAPL', compute, ttl=60)
+
+
+@pytest.mark.skipif(shared_cache.fcntl is None, reason="kræver fcntl")
+def test_get_or_compute_runs_once_across_processes(tmp_path):
+    counter = str(tmp_path / 'calls.txt')
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(3) as pool:
+        results = pool.starmap(_compute_in_process, [(str(tmp_path), counter)] * 3)
+    assert results == [42, 42, 42]
+    with open(counter) as file:
+        assert file.read() == 'x'
+
+
+@pytest.mark.skipif(shared_cache.fcntl is None, reason="kræver fcntl")
+def test_try_exclusive_only_one_holder(tmp_path):
+    first = try_exclusive(str(tmp_path), 'warmer.lock')
+    assert first is not None
+    # flock gælder pr. åben fil, så en ny åbning i samme proces ser låsen som optaget
+    assert try_exclusive(str(tmp_path), 'warmer.lock') is None
+    first.close()
+    second = try_exclusive(str(tmp_path), 'warmer.lock')
+    assert second is not None
+    second.close()
+
+
+def test_full_stock_data_read_from_shared_cache(tmp_path, monkeypatch):
+    calls = []
+    frame = pd.DataFrame({'Close': [1.0, 2.0]}, index=pd.date_range('2024-01-01', periods=2))
+
+    def fetch(ticker):
+        calls.append(ticker)
+        return frame, 'Test A/S'
+
+    monkeypatch.setattr(data, 'get_full_stock_data', fetch)
+    monkeypatch.setattr(data, 'shared_cache', SharedCache(str(tmp_path)))
+    data.cached_get_full_stock_data.cache_clear()
+    try:
+        data.cached_get_full_stock_data('TEST')
+        # En anden worker har kun disken: hukommelses-cachen er tom
+        data.cached_get_full_stock_data.cache_clear()
+        cached, ticker_long = data.cached_get_full_stock_data('TEST')
+        assert calls == ['TEST'] and ticker_long == 'Test A/S'
+        assert cached['Close'].tolist() == [1.0, 2.0]
+        assert not cached['Close'].to_numpy().flags.writeable
+
+        data.invalidate_prices('TEST')
+        data.cached_get_full_stock_data('TEST')
+        assert calls == ['TEST', 'TEST']
+    finally:
+        data.cached_get_full_stock_data.cache_clear()
@@ -0,0 +1,76 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import data
+from history_store import load_indicator_state, save_indicator_state
+from providers import LocalProvider, set_provider
+
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    provider = set_provider(LocalProvider(root=str(tmp_path / "fixtures"), years=3))
+    data.recent_frames.clear()
+    yield provider.history('AAA')
+    data.recent_frames.clear()
+    set_provider(None)
+
+
+def full(history):
+    return data.compute_indicators(history.copy(), 'AAA')
+
+
+@pytest.mark.parametrize('new_bars', [1, 2, 5])
+def test_extension_matches_full_recompute(history, new_bars):
+    data.save_indicator_checkpoint('AAA', full(history.iloc[:-new_bars]))
+    rows = data.extend_indicators('AAA', history)
+    expected = full(history).iloc[-(new_bars + 1):]
+    # Den sidste gemte bar (måske ufærdig) beregnes igen sammen med de nye
+    assert list(rows.index) == list(expected.index)
+    assert list(rows.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(rows, expected, check_dtype=False, rtol=1e-7)
+
+
+def test_extension_checkpoint_continues_the_stream(history):
+    data.save_indicator_checkpoint('AAA', full(history.iloc[:-6]))
+    data.extend_indicators('AAA', history.iloc[:-3])
+    rows = data.extend_indicators('AAA', history)
+    pd.testing.assert_frame_equal(rows, full(history).iloc[-4:], check_dtype=False, rtol=1e-7)
+
+
+def rewrite_checkpoint(**changes):
+    record = load_indicator_state('AAA')
+    record.update(changes)
+    save_indicator_state('AAA', record)
+
+
+def test_checkpoint_from_another_version_falls_back_to_full_recompute(history):
+    data.save_indicator_checkpoint('AAA', full(history.iloc[:-2]))
+    rewrite_checkpoint(version=0)
+    assert data.extend_indicators('AAA', history) is None
+
+
+@pytest.mark.parametrize('change', ['missing', 'stale'])
+def test_checkpoint_with_other_columns_falls_back_to_full_recompute(history, change):
+    data.save_indicator_checkpoint('AAA', full(history.iloc[:-2]))
+    row = load_indicator_state('AAA')['row']
+    if change == 'missing':
+        # Gemt før beregningen fik en ny kolonne
+        row = row.drop(columns=['perfect_trend'])
+    else:
+        # Gemt med en kolonne som beregningen ikke laver længere
+        row = row.assign(old_signal=1.0)
+    rewrite_checkpoint(row=row)
+    assert data.extend_indicators('AAA', history) is None
+
+
+def test_enrich_history_recomputes_when_checkpoint_is_unusable(history):
+    data.enrich_history('AAA', history.iloc[:-2].copy(), 'AAA')
+    rewrite_checkpoint(version=0)
+    frame = data.enrich_history('AAA', history.copy(), 'AAA')
+    pd.testing.assert_frame_equal(frame, full(history), check_dtype=False)
@@ -0,0 +1,65 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ticker_registry import TickerRegistry
+
+
+def write_file(path, tickers):
+    with open(path, 'w') as file:
+        json.dump(tickers, file)
+    # Sikr ny mtime selv på filsystemer med grov tidsopløsning
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def read_file(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def test_reads_file_once_until_it_changes(tmp_path):
+    path = tmp_path / "tickers.json"
+    write_file(path, {'AAPL': 'Apple'})
+    registry = TickerRegistry(str(path), delay=60)
+
+    assert registry.all() == {'AAPL': 'Apple'}
+    assert 'AAPL' in registry and len(registry) == 1
+    assert registry.reloads == 1
+
+    write_file(path, {'AAPL': 'Apple', 'MSFT': 'Microsoft'})
+    assert registry.get('MSFT') == 'Microsoft'
+    assert registry.reloads == 2
+
+
+def test_changes_are_batched_into_one_atomic_write(tmp_path):
+    path = tmp_path / "tickers.json"
+    registry = TickerRegistry(str(path), normalize=str.upper, delay=60)
+
+    assert registry.add('aapl', 'Apple')
+    assert not registry.add('AAPL', 'Apple')
+    assert registry.add('MSFT', 'Microsoft')
+    assert registry.remove('MSFT')
+    assert not registry.remove('MSFT')
+    assert not path.exists()
+
+    assert registry.flush()
+    assert read_file(path) == {'AAPL': 'Apple'}
+    assert registry.writes == 1
+    assert not registry.flush()
+    assert not os.path.exists(f"{path}.tmp")
+
+
+def test_pending_changes_survive_external_edit(tmp_path):
+    path = tmp_path / "tickers.json"
+    write_file(path, {'AAPL': 'Apple'})
+    registry = TickerRegistry(str(path), delay=60)
+    registry.add('NVO', 'Novo Nordisk')
+
+    write_file(path, {'AAPL': 'Apple', 'TSLA': 'Tesla'})
+    assert registry.all() == {'AAPL': 'Apple', 'TSLA': 'Tesla', 'NVO': 'Novo Nordisk'}
+
+    registry.flush()
+    assert read_file(path) == {'AAPL': 'Apple', 'NVO': 'Novo Nordisk', 'TSLA': 'Tesla'}
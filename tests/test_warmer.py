@@ -0,0 +1,60 @@
+import os
+import sys
+from datetime import datetime, timezone
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import warmer
+from warmer import CacheWarmer
+
+
+def test_watchlist_puts_last_ticker_first(monkeypatch):
+    monkeypatch.setattr(warmer, 'load_tickers', lambda: {'AAPL': 'Apple', 'msft': 'Microsoft', 'NOVO-B.CO': 'Novo'})
+    monkeypatch.setattr(warmer, 'load_preferences', lambda: {'last_ticker': 'MSFT'})
+    assert CacheWarmer().watchlist() == ['MSFT', 'AAPL', 'NOVO-B.CO']
+
+
+def test_whole_watchlist_is_warmed_but_only_the_first_tickers_in_memory(monkeypatch):
+    tickers = {f'T{i}': f'Ticker {i}' for i in range(7)}
+    monkeypatch.setattr(warmer, 'load_tickers', lambda: tickers)
+    monkeypatch.setattr(warmer, 'load_preferences', lambda: {'last_ticker': 'T5'})
+    memory, batches, fundamentals = [], [], []
+    monkeypatch.setattr(warmer, 'cached_get_full_stock_data', lambda ticker: memory.append(ticker) or (pd.DataFrame({'Close': [1.0]}), ticker))
+    monkeypatch.setattr(warmer, 'fetch_histories_batch', lambda batch: batches.append(batch) or {t: None for t in batch})
+    monkeypatch.setattr(warmer, 'get_fundamentals', lambda ticker: fundamentals.append(ticker) or {})
+    monkeypatch.setattr(warmer, 'DISK_BATCH', 3)
+
+    cache_warmer = CacheWarmer(workers=1, memory_size=3)
+    watchlist = cache_warmer.watchlist()
+    assert len(watchlist) == 7
+    assert cache_warmer.warm(watchlist) == 7
+    # last_ticker og de næste to i hukommelsen; resten opdateres kun på disk i batches
+    assert memory == ['T5', 'T0', 'T1']
+    assert batches == [['T2', 'T3', 'T4'], ['T6']]
+    assert sorted(fundamentals) == sorted(tickers)
+
+    # En genhentning efter lukketid holder samme fordeling
+    memory.clear(), batches.clear()
+    monkeypatch.setattr(warmer, 'invalidate_prices', lambda ticker: True)
+    cache_warmer.warm(['T1', 'T6'], refresh=True)
+    assert memory == ['T1']
+    assert batches == [['T6']]
+
+
+def test_refresh_schedule_after_each_close():
+    # Mandag kl. 15 UTC: København (lukker 17:00 CEST = 15:00 UTC) er lige lukket, New York lukker 20:00 UTC
+    now = datetime(2026, 10, 19, 15, 0, 30, tzinfo=timezone.utc)
+    schedule = CacheWarmer(refresh_delay=600).refresh_schedule(['AAPL', 'NOVO-B.CO', 'MSFT', 'BTC-USD'], now=now)
+    times = [datetime.fromtimestamp(when, timezone.utc) for when, _ in schedule]
+    groups = [group for _, group in schedule]
+    assert groups == [['NOVO-B.CO'], ['AAPL', 'MSFT']]
+    # København er netop lukket; genhentningen efter dagens lukning ligger stadig foran
+    assert times[0] == datetime(2026, 10, 19, 15, 10, tzinfo=timezone.utc)
+    assert times[1] == datetime(2026, 10, 19, 20, 10, tzinfo=timezone.utc)
+
+    # Efter genhentningen er næste gang efter morgendagens lukning
+    later = datetime(2026, 10, 19, 15, 11, tzinfo=timezone.utc)
+    when, group = CacheWarmer(refresh_delay=600).refresh_schedule(['NOVO-B.CO'], now=later)[0]
+    assert datetime.fromtimestamp(when, timezone.utc) == datetime(2026, 10, 20, 15, 10, tzinfo=timezone.utc)
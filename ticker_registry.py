@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Watchlisten (tickers.json) i hukommelsen.
+
+TickerRegistry læser kun filen igen, når dens mtime/størrelse ændrer sig (f.eks.
+når scanner-containeren eller en editor har skrevet den). Tilføjelser og
+sletninger lægges i hukommelsen med det samme og skrives samlet efter delay
+sekunder, atomisk (temp-fil + fsync + rename). Ændres filen udefra, mens der
+venter egne ændringer, lægges de oven på den nye fil i stedet for at overskrive den.
+"""
+import atexit
+import json
+import os
+import threading
+
+from logger import get_logger
+
+log = get_logger(__name__)
+
+
+class TickerRegistry:
+    def __init__(self, path, normalize=lambda ticker: ticker, delay=1.0):
+        self.path = path
+        self.normalize = normalize
+        self.delay = delay
+        self._tickers = {}
+        self._signature = None  # (mtime_ns, størrelse) for den version der er indlæst/skrevet
+        self._pending = []  # ændringer der endnu ikke er skrevet: ('add', t, navn), ('remove', t), ('replace', dict)
+        self._timer = None
+        self._lock = threading.Lock()
+        self.reloads = 0
+        self.writes = 0
+        atexit.register(self.flush)
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read_file(self):
+        try:
+            with open(self.path, 'r') as file:
+                tickers = json.load(file)
+            if isinstance(tickers, list):
+                tickers = {ticker[0]: ticker[1] for ticker in tickers}
+            return tickers
+        except Exception as e:
+            log.warning("Fejl ved indlæsning af %s: %s", self.path, e)
+            return None
+
+    def _refresh(self):
+        # Kaldes med låsen holdt
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        tickers = self._read_file() if signature is not None else {}
+        if tickers is None:
+            # Halvskrevet eller ugyldig fil: behold det vi har og prøv igen ved næste kald
+            return
+        self._signature = signature
+        for change in self._pending:
+            self._apply(tickers, change)
+        self._tickers = tickers
+        self.reloads += 1
+        log.debug("Tickers indlæst fra %s (%s stk.)", self.path, len(tickers))
+
+    def _apply(self, tickers, change):
+        if change[0] == 'add':
+            tickers[change[1]] = change[2]
+        elif change[0] == 'remove':
+            tickers.pop(change[1], None)
+        else:
+            tickers.clear()
+            tickers.update(change[1])
+
+    def _change(self, change):
+        # Kaldes med låsen holdt: ændringen gælder straks i hukommelsen og skrives forsinket
+        self._apply(self._tickers, change)
+        self._pending.append(change)
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def all(self):
+        """En kopi af watchlisten {ticker: navn}."""
+        with self._lock:
+            self._refresh()
+            return dict(self._tickers)
+
+    def get(self, ticker, default=None):
+        with self._lock:
+            self._refresh()
+            return self._tickers.get(ticker, default)
+
+    def __contains__(self, ticker):
+        with self._lock:
+            self._refresh()
+            return ticker in self._tickers
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._tickers)
+
+    def add(self, ticker, name):
+        """Tilføjer ticker. Returnerer False hvis den allerede findes."""
+        ticker = self.normalize(ticker)
+        with self._lock:
+            self._refresh()
+            if ticker in self._tickers:
+                return False
+            self._change(('add', ticker, name))
+            return True
+
+    def remove(self, ticker):
+        """Sletter ticker. Returnerer False hvis den ikke findes."""
+        ticker = self.normalize(ticker)
+        with self._lock:
+            self._refresh()
+            if ticker not in self._tickers:
+                return False
+            self._change(('remove', ticker))
+            return True
+
+    def replace(self, tickers):
+        """Erstatter hele watchlisten (som den gamle save_tickers)."""
+        tickers = {self.normalize(ticker): name for ticker, name in tickers.items()}
+        with self._lock:
+            self._refresh()
+            if tickers == self._tickers:
+                return False
+            self._change(('replace', tickers))
+            return True
+
+    def flush(self):
+        """Skriver ventende ændringer nu. Returnerer True hvis filen blev skrevet."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return False
+            # Få evt. ændringer udefra med, før filen overskrives
+            self._refresh()
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"  # Pr. proces og tråd: flere workers kan gemme samtidig
+            try:
+                with open(tmp_path, 'w') as file:
+                    json.dump(self._tickers, file, indent=4, sort_keys=True)
+                    file.flush()
+                    os.fsync(file.fileno())  # Tving skrivning til disk (vigtigt for Docker)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                log.warning("Kunne ikke gemme tickers i %s: %s. Prøver igen om %.0f sekunder.", self.path, e, self.delay)
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+                return False
+            self._pending.clear()
+            self._signature = self._file_signature()
+            self.writes += 1
+            log.debug("Tickers gemt i %s (%s stk.)", self.path, len(self._tickers))
+            return True
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Fælles datagrundlag for de tre grafer (kurs, volumen, MACD).
+
+prepare_view() henter udsnittet for (ticker, timespan) én gang og forbereder
+alt det figurerne deler: x-akse, procentændring, signal-markører, volumen-farver
+og nøgletal. Resultatet gemmes på serveren i views under et id; app.py sender
+kun referencen (id, ticker, timespan) gennem en dcc.Store, og figur-callbacks
+slår den op med get_view(). Udløber viewet, bygges det igen ud fra referencen.
+"""
+import logging
+
+import numpy as np
+
+from cache import TTLCache
+from downsample import lttb_indices, sum_buckets
+from data import cached_get_stock_data, get_pe_ratio, get_beta, normalize_ticker, prime_index
+from logger import get_logger
+from metrics import timed
+
+log = get_logger(__name__)
+
+VIEW_TTL = 600
+views = TTLCache(maxsize=64, name='views')
+# Færdige figurer (uden tema/legend) pr. (view-nøgle, graf, indikator-valg, antal punkter)
+figures = TTLCache(maxsize=128, name='figures')
+
+# signal-kode: (navn, hover-tekst, symbol, størrelse, farve, linjebredde, pil-y, pil, pil-størrelse)
+SIGNAL_STYLES = (
+    (1, 'Buy Signal', 'Buy', 'triangle-up', 12, 'green', 2, 0.98, '▲', 14),
+    (2, 'Cautious Buy', 'Cautious Buy', 'triangle-up', 10, 'orange', 1, 0.95, '▲', 12),
+    (-2, 'Cautious Sell', 'Cautious Sell', 'triangle-down', 10, 'darkorange', 1, 0.05, '▼', 12),
+    (-1, 'Sell Signal', 'Sell', 'triangle-down', 12, 'red', 2, 0.02, '▼', 14),
+)
+
+
+class ChartView:
+    """
+    Forberedte data for én (ticker, timespan). data er et udsnit af det delte
+    cache-datasæt og må ikke ændres; alt afledt ligger i egne felter.
+    """
+    def __init__(self, key, ticker, timespan, data, ticker_long):
+        self.key = key
+        self.ticker = ticker
+        self.timespan = timespan
+        self.data = data
+        self.ticker_long = ticker_long
+        self.empty = data.empty or 'Close' not in data
+        self.x_range = None
+        self.percent_text = None
+        self.signals = []  # (stil, datoer, priser) for hver signaltype med skift
+        self.signal_positions = np.empty(0, dtype=np.int64)  # rækker med signal-skift (nedsamples aldrig væk)
+        self.signal_lines = []  # (stil, x, y) med én lodret linje pr. skift, adskilt af None
+        self.signal_arrows = None  # pile for alle skift: x, y, text, colors, sizes
+        self.volume = None
+        self.volume_error = None
+        self._sampled = {}  # nedsamplede serier pr. (navn, max punkter)
+        self.pe_ratio = None
+        self.beta = None
+
+
+def _data_version(data):
+    """Skifter når datasættet får nye eller ændrede bars."""
+    if data.empty or 'Close' not in data:
+        return 'empty'
+    return f"{len(data)}-{data.index[-1].value}-{float(data['Close'].iloc[-1])!r}"
+
+
+def view_reference(view):
+    """Det der sendes til browseren: kun id og nok til at bygge viewet igen."""
+    return {'id': view.key, 'ticker': view.ticker, 'timespan': view.timespan}
+
+
+@timed("view.prepare")
+def prepare_view(ticker, timespan):
+    """Returnerer ChartView for (ticker, timespan); genbruges så længe data er uændret."""
+    ticker = normalize_ticker(ticker)
+    data, ticker_long = cached_get_stock_data(ticker, timespan)
+    key = f"{ticker}|{timespan}|{_data_version(data)}"
+    view = views.get(key, None)
+    if view is not None:
+        return view
+
+    # Viewet (og dets datasæt) deles af graf-callbacks i andre tråde
+    view = ChartView(key, ticker, timespan, prime_index(data), ticker_long)
+    if not view.empty:
+        view.x_range = [data.index.min(), data.index.max()]
+        close = data['Close'].to_numpy(dtype=np.float64)
+        percent_change = (close - close[0]) / close[0] * 100
+        view.percent_text = np.char.mod('%.2f%%', percent_change).tolist()
+        _prepare_signals(view)
+        _prepare_volume(view)
+        view.pe_ratio = get_pe_ratio(ticker)
+        view.beta = get_beta(ticker)
+    views.set(key, view, VIEW_TTL)
+    log.debug("View forberedt for %s (%s): %s", ticker, timespan, key)
+    return view
+
+
+def get_view(reference):
+    """Slår viewet op ud fra referencen fra dcc.Store (eller bygger det igen). None uden reference."""
+    if not reference:
+        return None
+    view = views.get(reference['id'], None)
+    if view is None:
+        view = prepare_view(reference['ticker'], reference['timespan'])
+    return view
+
+
+def _prepare_signals(view):
+    data = view.data
+    if 'signal' not in data:
+        return
+    try:
+        sig = data['signal']
+        # find steder hvor signal ændrer sig
+        changes = sig[sig != sig.shift(1)]
+        changed = changes.index[np.isin(changes.to_numpy(), [code for code, *_ in SIGNAL_STYLES])]
+        view.signal_positions = data.index.get_indexer(changed)
+        arrows = []
+        for style in SIGNAL_STYLES:
+            code, _, _, _, _, color, width, arrow_y, arrow, arrow_size = style
+            dates = changes.index[changes.to_numpy() == code]
+            if dates.empty:
+                continue
+            view.signals.append((style, dates, data.loc[dates, 'Close']))
+            # Alle skift af samme type som én trace: (d, 0) - (d, 1) - afbrydelse, gentaget.
+            # Datoerne som færdige ISO-strenge (samme som plotly's JSON), da plotly validerer
+            # og serialiserer et object-array af strenge langt hurtigere end af Timestamps
+            stamps = np.array([d.isoformat() for d in dates], dtype=object)
+            x = np.empty(len(dates) * 3, dtype=object)
+            x[0::3] = stamps
+            x[1::3] = stamps
+            y = np.tile([0.0, 1.0, np.nan], len(dates))
+            view.signal_lines.append((style, x, y))
+            arrows.append((stamps, arrow_y, arrow, color, arrow_size))
+        if arrows:
+            counts = [len(stamps) for stamps, *_ in arrows]
+            view.signal_arrows = {
+                'x': np.concatenate([stamps for stamps, *_ in arrows]),
+                'y': np.repeat([a[1] for a in arrows], counts),
+                'text': np.repeat([a[2] for a in arrows], counts).tolist(),
+                'colors': np.repeat([a[3] for a in arrows], counts).tolist(),
+                'sizes': np.repeat([a[4] for a in arrows], counts),
+            }
+        _log_new_signal(view)
+    except Exception as e:
+        log.warning("Fejl ved forberedelse af trade-signaler for %s: %s", view.ticker_long, e)
+
+
+def _log_new_signal(view):
+    # Besked ved ny ændring i sidste række (én gang pr. nyt datasæt, ikke pr. graf)
+    if len(view.data) < 2:
+        return
+    last, prev = int(view.data['signal'].iloc[-1]), int(view.data['signal'].iloc[-2])
+    if last == prev:
+        return
+    if last == 1:
+        log.info("🚀 NYT KØB: Trenden er nu i Perfect Order for %s!", view.ticker_long)
+    elif last == 2:
+        log.info("⚠️ NYT FORSIGTIGT KØB: Pris over SMA50 for %s.", view.ticker_long)
+    elif last == -2:
+        log.info("⚠️ NYT FORSIGTIGT SALG: Pris under SMA 5/10 for %s.", view.ticker_long)
+    elif last == -1:
+        log.info("⚠️ SÆLG/ADVARSEL: Trenden er brudt for %s.", view.ticker_long)
+
+
+def _prepare_volume(view):
+    data = view.data
+    if 'Volume' not in data:
+        view.volume_error = f'Kunne ikke hente data for {view.ticker_long} Volume'
+        return
+    # Tillad nul-værdier i volumen (nogle tickers/intervals bruger 0 ved ingen aktivitet).
+    # Afvis kun, hvis der findes negative værdier eller datasættet er tomt.
+    volume_data = data['Volume'].dropna()
+    if volume_data.empty or (volume_data < 0).any():
+        log.debug("Ugyldige volumen-data for %s: Tomt eller negative værdier", view.ticker_long)
+        view.volume_error = f'Ugyldige volumen-data for {view.ticker_long}'
+        return
+
+    frame = data[['Volume', 'Close']]
+    if frame.isna().any().any():
+        log.debug("NaN-værdier fundet i volumen- eller Close-data for %s. Fjerner NaN.", view.ticker_long)
+        frame = frame.dropna()
+        if frame.empty:
+            view.volume_error = f'Utilstrækkelige data for {view.ticker_long} Volume'
+            return
+
+    view.volume = {
+        'x': frame.index,
+        'volume': frame['Volume'].to_numpy(dtype=np.float64),
+        'close': frame['Close'].to_numpy(dtype=np.float64),
+        'x_range': [frame.index.min(), frame.index.max()],
+    }
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Volumen-data for %s: Startdato=%s, Slutdato=%s, Længde=%s, Min=%s, Max=%s",
+                  view.ticker_long, frame.index.min(), frame.index.max(), len(frame),
+                  view.volume['volume'].min(), view.volume['volume'].max())
+
+
+def volume_bars(view, max_bars=None):
+    """
+    Søjler til volumen-grafen: volumen summeret i højst max_bars spande (None = én pr. dag),
+    farve efter om lukkekursen steg fra forrige søjle, og epsilon/opacity for nul-volumen.
+    """
+    cache_key = ('volume', max_bars)
+    if cache_key in view._sampled:
+        return view._sampled[cache_key]
+    x, volume, close = view.volume['x'], view.volume['volume'], view.volume['close']
+    if max_bars and len(volume) > max_bars:
+        starts, volume = sum_buckets(volume, max_bars)
+        # Lukkekursen for en spand er dens sidste dag
+        close = close[np.append(starts[1:], len(close)) - 1]
+        x = x[starts]
+    # Grøn når lukkekursen stiger fra søjlen før; første søjle får standardfarve
+    colors = np.where(np.concatenate(([True], close[1:] > close[:-1])), 'green', 'red')
+    # Tegn nul-volumen som en meget lille epsilon (usynlig effekt på skala),
+    # men behold original værdi i hover via customdata, og med lav opacity.
+    max_vol = volume.max() if volume.max() > 0 else 1
+    eps = max(1, int(max_vol * 1e-6))
+    bars = {
+        'x': x,
+        'y': np.where(volume == 0, eps, volume),
+        'original': volume,
+        'colors': colors.tolist(),
+        'opacities': np.where(volume == 0, 0.35, 1.0).tolist(),
+    }
+    view._sampled[cache_key] = bars
+    return bars
+
+
+def close_line(view, max_points=None):
+    """
+    (x, close, hover-tekst) for kurslinjen, nedsamplet med LTTB til højst
+    max_points punkter. Rækker med signal-skift kommer altid med, så markørerne ligger på linjen.
+    """
+    cache_key = ('close', max_points)
+    if cache_key in view._sampled:
+        return view._sampled[cache_key]
+    close = view.data['Close'].to_numpy(dtype=np.float64)
+    if max_points and len(close) > max_points:
+        # Signal-rækkerne tæller med i budgettet, men linjen får mindst halvdelen selv
+        budget = max(max_points - len(view.signal_positions), max_points // 2)
+        positions = lttb_indices(close, budget, keep=view.signal_positions)
+        line = (view.data.index[positions], close[positions], [view.percent_text[i] for i in positions])
+    else:
+        line = (view.data.index, close, view.percent_text)
+    view._sampled[cache_key] = line
+    return line
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Varmer caches op i baggrunden, så dashboardets første visning af en ticker
+ikke betaler for hentning af hele historikken, nøgletal og indikatorer.
+
+CacheWarmer henter ved opstart last_ticker først (og forbereder dens view),
+derefter resten af watchlisten. Kun så mange tickers som pris-cachen rummer
+lægges i hukommelsen; for resten opdateres historik og nøgletal på disk (i
+batch-downloads), så de også åbner uden at hente hele historikken. Bagefter genhentes hver børs' tickers
+REFRESH_DELAY efter dens lukketid, så dagens sidste bar er i cachen, før
+nogen åbner dashboardet. Kaldene går gennem den fælles rate limiter.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from data import (cached_get_full_stock_data, fetch_histories_batch, get_fundamentals, invalidate_prices,
+                  load_preferences, load_tickers, normalize_ticker)
+from logger import get_logger
+from market_hours import exchange_for, next_close
+from metrics import inc, span
+from viewmodel import prepare_view
+
+log = get_logger(__name__)
+
+# Ventetid efter lukketid før genhentning (Yahoo færdiggør dagens bar lidt efter lukning,
+# og cachede kurser fra åbningstiden skal være udløbet, se data.PRICE_TTL_OPEN)
+REFRESH_DELAY = 20 * 60
+# Tickers pr. download når historik kun varmes på disk
+DISK_BATCH = 50
+
+
+class CacheWarmer:
+    def __init__(self, workers=2, refresh_delay=REFRESH_DELAY, memory_size=None):
+        self.workers = workers
+        self.refresh_delay = refresh_delay
+        # Antal tickers der varmes i hukommelsen (standard: hvad pris-cachen rummer)
+        self.memory_size = memory_size or cached_get_full_stock_data.cache.maxsize
+        self._stop = threading.Event()
+        self._thread = None
+        self.warmed = 0
+
+    def start(self):
+        """Starter baggrundstråden (daemon, så den ikke holder processen i live)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='cache-warmer', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def watchlist(self):
+        """Alle tickers i den rækkefølge de varmes: last_ticker først."""
+        last_ticker = load_preferences().get('last_ticker')
+        tickers = [normalize_ticker(ticker) for ticker in load_tickers()]
+        if last_ticker:
+            tickers = [last_ticker] + [ticker for ticker in tickers if ticker != last_ticker]
+        return tickers
+
+    def in_memory(self, watchlist):
+        """De første tickers i watchlisten, som der er plads til i pris-cachen."""
+        return set(watchlist[:self.memory_size])
+
+    def warm_ticker(self, ticker, refresh=False):
+        if self._stop.is_set():
+            return False
+        try:
+            with span('warm.ticker'):
+                if refresh:
+                    # Kurser hentet lige efter lukning lever til næste åbning; smid dem væk, så dagens
+                    # endelige bar hentes. recent_frames beholdes, så kun de nye bars beriges.
+                    invalidate_prices(ticker)
+                data, _ = cached_get_full_stock_data(ticker)
+                get_fundamentals(ticker)
+        except Exception as e:
+            log.warning("Kunne ikke varme cachen for %s: %s", ticker, e)
+            return False
+        inc('warm.tickers')
+        return not data.empty
+
+    def warm_on_disk(self, tickers):
+        """Opdaterer historik og nøgletal på disk uden at fylde pris-cachen. Returnerer antal med historik."""
+        if self._stop.is_set():
+            return 0
+        try:
+            with span('warm.disk'):
+                histories = fetch_histories_batch(tickers)
+                for ticker in tickers:
+                    get_fundamentals(ticker)
+        except Exception as e:
+            log.warning("Kunne ikke varme disk-lageret for %s tickers: %s", len(tickers), e)
+            return 0
+        inc('warm.disk_tickers', len(histories))
+        return len(histories)
+
+    def warm(self, tickers, refresh=False, memory=None):
+        """
+        Henter tickers (parallelt); returnerer antal med data. refresh: hent kurser selv om de er cachet.
+        memory: de tickers der må ligge i pris-cachen (standard: de første i watchlisten); resten varmes på disk.
+        """
+        start = time.perf_counter()
+        if memory is None:
+            memory = self.in_memory(self.watchlist())
+        on_disk = [ticker for ticker in tickers if ticker not in memory]
+        batches = [on_disk[i:i + DISK_BATCH] for i in range(0, len(on_disk), DISK_BATCH)]
+        with ThreadPoolExecutor(max_workers=max(self.workers, 1)) as executor:
+            warmed = sum(executor.map(lambda ticker: self.warm_ticker(ticker, refresh),
+                                      [ticker for ticker in tickers if ticker in memory]))
+            warmed += sum(executor.map(self.warm_on_disk, batches))
+        self.warmed += warmed
+        log.info("Cache varmet for %s af %s tickers (%s kun på disk) på %.1f s",
+                 warmed, len(tickers), len(on_disk), time.perf_counter() - start)
+        return warmed
+
+    def _warm_last_view(self, tickers):
+        # last_ticker først, og dens view med den gemte timespan, så første side er klar
+        preferences = load_preferences()
+        last_ticker = preferences.get('last_ticker')
+        if last_ticker and self.warm_ticker(last_ticker):
+            prepare_view(last_ticker, preferences.get('timespan', '1y'))
+        return [ticker for ticker in tickers if ticker != last_ticker]
+
+    def refresh_schedule(self, tickers, now=None):
+        """
+        [(tidspunkt, [tickers])] for næste genhentning pr. børs, tidligste først.
+        En lukning for under refresh_delay siden tæller stadig, så genhentningen ikke springes over.
+        """
+        now = now or datetime.now().astimezone()
+        since = now - timedelta(seconds=self.refresh_delay)
+        groups = {}
+        for ticker in tickers:
+            exchange = exchange_for(ticker)
+            if exchange is None:
+                continue  # Handles døgnet rundt; kort cache-levetid i forvejen
+            groups.setdefault(exchange, []).append(ticker)
+        schedule = [(next_close(group[0], since).timestamp() + self.refresh_delay, group) for group in groups.values()]
+        return sorted(schedule, key=lambda entry: entry[0])
+
+    def _run(self):
+        try:
+            tickers = self.watchlist()
+            if len(tickers) > self.memory_size:
+                log.info("Watchlisten har %s tickers; pris-cachen rummer %s, resten varmes kun på disk",
+                         len(tickers), self.memory_size)
+            self.warm(self._warm_last_view(tickers), memory=self.in_memory(tickers))
+        except Exception as e:
+            log.warning("Cache-opvarmning fejlede: %s", e)
+        while not self._stop.is_set():
+            try:
+                schedule = self.refresh_schedule(self.watchlist())
+            except Exception as e:
+                log.warning("Kunne ikke planlægge genhentning: %s", e)
+                schedule = []
+            if not schedule:
+                self._stop.wait(60 * 60)
+                continue
+            when, group = schedule[0]
+            log.debug("Næste genhentning af %s tickers kl. %s", len(group), datetime.fromtimestamp(when))
+            if self._stop.wait(max(when - time.time(), 0)):
+                break
+            self.warm(group, refresh=True)